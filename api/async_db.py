@@ -0,0 +1,223 @@
+import time
+from contextlib import asynccontextmanager
+from os import environ
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+from fastapi import HTTPException, status
+
+from globals import GameResult, env_int
+from http_models import NewPlayer, Game as HTTPGame
+from changes import PLAYER, GAME
+from games import game_result, finished_results
+from ratings import ELO_K_FACTOR, rate_results
+from stats import COUNT_FIELDS, count_links
+from metrics import record_query
+
+ASYNC_POOL_MIN_SIZE = env_int("ASYNC_POOL_MIN_SIZE", 10)
+ASYNC_POOL_MAX_SIZE = env_int("ASYNC_POOL_MAX_SIZE", 100)
+
+STATS_COLUMNS = [field.column_name for field in COUNT_FIELDS]
+STATS_UPSERT_SQL = (
+    f"INSERT INTO playerstats (player_id, {', '.join(STATS_COLUMNS)}) "
+    f"SELECT * FROM unnest({', '.join(f'${index}::int[]' for index in range(1, len(STATS_COLUMNS) + 2))}) "
+    f"ON CONFLICT (player_id) DO UPDATE SET {', '.join(f'{column} = playerstats.{column} + EXCLUDED.{column}' for column in STATS_COLUMNS)}"
+)
+LINKS_SQL = ("SELECT link.game_id, link.result, player.id, player.name, player.elo FROM playergame AS link "
+             "JOIN player ON player.id = link.player_id WHERE link.game_id = ANY($1::int[]) ORDER BY link.id")
+
+
+class AsyncDatabase:
+    # asyncpg pool on the database configured for peewee, which still creates and migrates the schema
+    def __init__(self):
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self) -> None:
+        self.pool = await asyncpg.create_pool(database=environ.get("DB_NAME"), user=environ.get("DB_USER"),
+                                              password=environ.get("DB_PASS"), host=environ.get("DB_HOST", "localhost"),
+                                              port=env_int("DB_PORT", 5432),
+                                              min_size=ASYNC_POOL_MIN_SIZE, max_size=ASYNC_POOL_MAX_SIZE)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        async with self.pool.acquire() as connection:
+            yield connection
+
+
+async_db = AsyncDatabase()
+
+
+# Query helpers report to the same metrics as the peewee queries
+async def fetch(connection: asyncpg.Connection, sql: str, *args) -> List[asyncpg.Record]:
+    start = time.perf_counter()
+    try:
+        return await connection.fetch(sql, *args)
+    finally:
+        record_query(time.perf_counter() - start, sql, args)
+
+
+async def fetchrow(connection: asyncpg.Connection, sql: str, *args) -> Optional[asyncpg.Record]:
+    start = time.perf_counter()
+    try:
+        return await connection.fetchrow(sql, *args)
+    finally:
+        record_query(time.perf_counter() - start, sql, args)
+
+
+async def fetchval(connection: asyncpg.Connection, sql: str, *args):
+    start = time.perf_counter()
+    try:
+        return await connection.fetchval(sql, *args)
+    finally:
+        record_query(time.perf_counter() - start, sql, args)
+
+
+async def execute(connection: asyncpg.Connection, sql: str, *args) -> str:
+    start = time.perf_counter()
+    try:
+        return await connection.execute(sql, *args)
+    finally:
+        record_query(time.perf_counter() - start, sql, args)
+
+
+async def current_version(connection: asyncpg.Connection, entity: str) -> int:
+    return await fetchval(connection, "SELECT COALESCE(MAX(version), 0) FROM change WHERE entity = $1", entity)
+
+
+async def record_changes(connection: asyncpg.Connection, entity: str, row_ids: Iterable[int],
+                         version: Optional[int] = None) -> Optional[int]:
+    # Expects to run at the end of the transaction writing the rows, like changes.record_changes
+    row_ids = list(dict.fromkeys(row_ids))
+    if len(row_ids) == 0:
+        return None
+    if version is None:
+        version = await fetchval(connection, "UPDATE changeversion SET version = version + 1 RETURNING version")
+    await execute(connection, "INSERT INTO change (version, entity, row_id) SELECT $1, $2, unnest($3::int[]) "
+                              "ON CONFLICT (entity, row_id) DO UPDATE SET version = EXCLUDED.version",
+                  version, entity, row_ids)
+    return version
+
+
+def select_sql(table: str, columns: List[str]) -> str:
+    # Columns come from the peewee models, never from the request
+    return f"SELECT {', '.join(columns)} FROM {table}"
+
+
+async def list_rows(connection: asyncpg.Connection, table: str, columns: List[str], limit: Optional[int],
+                    after: Optional[int]) -> List[dict]:
+    sql, args = select_sql(table, columns), []
+    if after is not None:
+        args.append(after)
+        sql += f" WHERE id > ${len(args)}"
+    sql += " ORDER BY id"
+    if limit is not None:
+        # One extra row tells whether there is a next page
+        args.append(limit + 1)
+        sql += f" LIMIT ${len(args)}"
+    return [dict(row) for row in await fetch(connection, sql, *args)]
+
+
+async def delta(connection: asyncpg.Connection, table: str, columns: List[str], entity: str, since: int,
+                version: int) -> dict:
+    changes = await fetch(connection, "SELECT row_id FROM change WHERE entity = $1 AND version > $2", entity, since)
+    row_ids = [row_id for row_id, in changes]
+    rows: List[dict] = []
+    if len(row_ids) != 0:
+        sql = f"{select_sql(table, columns)} WHERE id = ANY($1::int[]) ORDER BY id"
+        rows = [dict(row) for row in await fetch(connection, sql, row_ids)]
+    existing_ids = {row["id"] for row in rows}
+    return {"version": version, "upserted": rows, "deleted": [row_id for row_id in row_ids if row_id not in existing_ids]}
+
+
+async def attach_players(connection: asyncpg.Connection, games: List[dict], relations: Tuple[str, ...]) -> List[dict]:
+    games_by_id = {game["id"]: game for game in games}
+    for game in games:
+        if "players" in relations:
+            game["players"] = []
+        if "winner" in relations:
+            game["winner"] = None
+    for game_id, result, player_id, player_name, player_elo in await fetch(connection, LINKS_SQL, list(games_by_id)):
+        game = games_by_id[game_id]
+        player = {"id": player_id, "name": player_name, "elo": player_elo}
+        if "players" in relations:
+            game["players"].append(player)
+        if "winner" in relations and result == GameResult.WON.value:
+            game["winner"] = player
+    return games
+
+
+async def apply_counts(connection: asyncpg.Connection, counts: Dict[int, Dict[str, int]]) -> None:
+    if len(counts) == 0:
+        return
+    # Rows are locked in player order like stats.apply_counts
+    player_ids = sorted(counts)
+    await execute(connection, STATS_UPSERT_SQL, player_ids,
+                  *[[counts[player_id][column] for player_id in player_ids] for column in STATS_COLUMNS])
+
+
+async def apply_results(connection: asyncpg.Connection, results: List[Tuple[int, int]],
+                        k_factor: int = ELO_K_FACTOR) -> Dict[int, int]:
+    # Same rating update as ratings.apply_results, rows are locked in id order and the caller records the changes
+    if len(results) == 0:
+        return {}
+    player_ids = sorted({player_id for result in results for player_id in result})
+    rows = await fetch(connection, "SELECT id, elo FROM player WHERE id = ANY($1::int[]) ORDER BY id FOR NO KEY UPDATE", player_ids)
+    ratings = rate_results({player_id: elo for player_id, elo in rows}, results, k_factor)
+    await execute(connection, "UPDATE player SET elo = rating.elo FROM unnest($1::int[], $2::int[]) AS rating(id, elo) "
+                              "WHERE player.id = rating.id", list(ratings), list(ratings.values()))
+    return ratings
+
+
+async def create_player(connection: asyncpg.Connection, player: NewPlayer) -> Tuple[dict, Optional[int]]:
+    async with connection.transaction():
+        created_player = await fetchrow(connection, "INSERT INTO player (name, elo, base_elo) VALUES ($1, $2, $2) "
+                                                    "RETURNING id, name, elo, base_elo", player.name, player.elo)
+        version = await record_changes(connection, PLAYER, [created_player["id"]])
+    return dict(created_player), version
+
+
+async def create_game(connection: asyncpg.Connection, game: HTTPGame) -> Tuple[dict, Dict[int, int], Optional[int]]:
+    # Expects a game that passed check_game_consistency
+    player_ids = [player.id for player in game.players]
+    results = [game_result(game.state, game.winner is not None and player.id == game.winner.id).value for player in game.players]
+    async with connection.transaction():
+        existing_players = await fetch(connection, "SELECT id FROM player WHERE id = ANY($1::int[])", player_ids)
+        if len(existing_players) != len(player_ids):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player(s) do not exist!")
+        game_id = await fetchval(connection, "INSERT INTO game (state) VALUES ($1) RETURNING id", game.state.value)
+        await execute(connection, "INSERT INTO playergame (player_id, game_id, result) "
+                                  "SELECT link.player_id, $2, link.result FROM unnest($1::int[], $3::int[]) AS link(player_id, result)",
+                      player_ids, game_id, results)
+        await apply_counts(connection, count_links((player_id, result, 1) for player_id, result in zip(player_ids, results)))
+        new_ratings = await apply_results(connection, finished_results([game]))
+        version = await record_changes(connection, GAME, [game_id])
+        await record_changes(connection, PLAYER, new_ratings.keys(), version)
+    return {"id": game_id, "state": game.state.value}, new_ratings, version
+
+
+async def delete_players(connection: asyncpg.Connection, player_ids: List[int]) -> Tuple[List[int], Optional[int], Optional[int]]:
+    # Same cascade as the peewee delete, the games of deleted players are kept without their links
+    async with connection.transaction():
+        games = await fetch(connection, "SELECT DISTINCT game_id FROM playergame WHERE player_id = ANY($1::int[])", player_ids)
+        game_ids = [game_id for game_id, in games]
+        await execute(connection, "DELETE FROM playergame WHERE player_id = ANY($1::int[])", player_ids)
+        await execute(connection, "DELETE FROM playerstats WHERE player_id = ANY($1::int[])", player_ids)
+        await execute(connection, "DELETE FROM player WHERE id = ANY($1::int[])", player_ids)
+        version = await record_changes(connection, PLAYER, player_ids)
+        games_version = await record_changes(connection, GAME, game_ids, version)
+    return game_ids, version, games_version
+
+
+async def delete_games(connection: asyncpg.Connection, game_ids: List[int]) -> Optional[int]:
+    async with connection.transaction():
+        links = await fetch(connection, "SELECT player_id, result, COUNT(*) FROM playergame "
+                                        "WHERE game_id = ANY($1::int[]) GROUP BY player_id, result", game_ids)
+        await apply_counts(connection, count_links((player_id, result, -links_count) for player_id, result, links_count in links))
+        await execute(connection, "DELETE FROM playergame WHERE game_id = ANY($1::int[])", game_ids)
+        await execute(connection, "DELETE FROM game WHERE id = ANY($1::int[])", game_ids)
+        return await record_changes(connection, GAME, game_ids)
@@ -0,0 +1,133 @@
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from fastapi import APIRouter, Request, Response, Query as QueryParam, HTTPException, status
+from fastapi.responses import ORJSONResponse
+
+from db_models import Player, Game
+from http_models import NewPlayer, Game as HTTPGame
+from changes import PLAYER, GAME
+from events import hub
+from leaderboard import leaderboard
+from jobs import DELETE_JOB_THRESHOLD, delete_in_chunks_async, start_delete_job
+from games import check_game_consistency, publish_created_games
+from ingest import WRITE_BEHIND
+from responses import (STREAM_PAGE_SIZE, MAX_PAGE_SIZE, GAME_RELATIONS, field_names, projection, not_modified,
+                       fast_json, wants_ndjson, next_page, ndjson_lines, ndjson_response)
+import async_db
+from async_db import async_db as database
+
+async def ndjson_pages(table: str, columns: List[str], limit: Optional[int], after: Optional[int],
+                       relations: Tuple[str, ...] = ()) -> AsyncIterator[bytes]:
+    # Same paging as responses.ndjson_pages, the connection goes back to the pool between pages
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = STREAM_PAGE_SIZE if remaining is None else min(STREAM_PAGE_SIZE, remaining)
+        async with database.acquire() as connection:
+            rows = (await async_db.list_rows(connection, table, columns, page_size, after))[:page_size]
+            if len(relations) != 0 and len(rows) != 0:
+                await async_db.attach_players(connection, rows, relations)
+        if len(rows) == 0:
+            return
+        yield ndjson_lines(rows)
+        after = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < page_size:
+            return
+
+
+def create_async_router(forget_players: Callable[[List[int]], None]) -> APIRouter:
+    # Serves the hot paths of main.py with asyncpg when DB_BACKEND=asyncpg, every other route stays on peewee.
+    # forget_players drops deleted players from the in-memory state owned by main.py.
+    router = APIRouter()
+
+    @router.get("/players")
+    async def get_players(request: Request, response: Response, limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE),
+                          after: Optional[int] = None, fields: Optional[str] = None, since: Optional[int] = QueryParam(None, ge=0)):
+        columns = [field.column_name for field in projection(Player, field_names(fields))]
+        async with database.acquire() as connection:
+            version = await async_db.current_version(connection, PLAYER)
+            not_modified_response = not_modified(request, response, PLAYER, version)
+            if not_modified_response is not None:
+                return not_modified_response
+            if since is not None:
+                return fast_json(await async_db.delta(connection, "player", columns, PLAYER, since, version), response)
+            if not wants_ndjson(request):
+                rows = await async_db.list_rows(connection, "player", columns, limit, after)
+                return fast_json(next_page(rows, response, limit), response)
+        return ndjson_response(ndjson_pages("player", columns, limit, after), response)
+
+    @router.get("/games")
+    async def get_games(request: Request, response: Response, limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE),
+                        after: Optional[int] = None, fields: Optional[str] = None, since: Optional[int] = QueryParam(None, ge=0)):
+        names = field_names(fields)
+        relations = GAME_RELATIONS if names is None else tuple(name for name in names if name in GAME_RELATIONS)
+        columns = [field.column_name for field in projection(Game, names, GAME_RELATIONS)]
+        async with database.acquire() as connection:
+            version = await async_db.current_version(connection, GAME)
+            not_modified_response = not_modified(request, response, GAME, version)
+            if not_modified_response is not None:
+                return not_modified_response
+            if since is not None:
+                games_delta = await async_db.delta(connection, "game", columns, GAME, since, version)
+                if len(relations) != 0 and len(games_delta["upserted"]) != 0:
+                    await async_db.attach_players(connection, games_delta["upserted"], relations)
+                return fast_json(games_delta, response)
+            if not wants_ndjson(request):
+                games = next_page(await async_db.list_rows(connection, "game", columns, limit, after), response, limit)
+                if len(relations) != 0 and len(games) != 0:
+                    await async_db.attach_players(connection, games, relations)
+                return fast_json(games, response)
+        return ndjson_response(ndjson_pages("game", columns, limit, after, relations), response)
+
+    @router.post("/player")
+    async def create_player(player: NewPlayer):
+        if player.name is None or player.name == "":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A new player should have a name!")
+        async with database.acquire() as connection:
+            created_player, version = await async_db.create_player(connection, player)
+        leaderboard.upsert(created_player["id"], created_player["name"], created_player["elo"])
+        hub.publish(PLAYER, "upserted", [created_player["id"]], version)
+        return ORJSONResponse(created_player)
+
+    async def create_game(game: HTTPGame):
+        check_game_consistency(game)
+        async with database.acquire() as connection:
+            created_game, new_ratings, version = await async_db.create_game(connection, game)
+        leaderboard.update_ratings(new_ratings)
+        publish_created_games([created_game["id"]], new_ratings, version)
+        return ORJSONResponse(created_game)
+
+    if not WRITE_BEHIND:
+        # With write behind, main.py queues the games without touching the database
+        router.add_api_route("/game", create_game, methods=["POST"])
+
+    # Each chunk takes a connection of the pool and gives it back before the next one
+    async def delete_players_chunk(player_ids: List[int]) -> None:
+        async with database.acquire() as connection:
+            game_ids, version, games_version = await async_db.delete_players(connection, player_ids)
+        forget_players(player_ids)
+        hub.publish(PLAYER, "deleted", player_ids, version)
+        if len(game_ids) != 0:
+            hub.publish(GAME, "upserted", game_ids, games_version)
+
+    async def delete_games_chunk(game_ids: List[int]) -> None:
+        async with database.acquire() as connection:
+            version = await async_db.delete_games(connection, game_ids)
+        hub.publish(GAME, "deleted", game_ids, version)
+
+    @router.delete("/players")
+    async def delete_players(player_ids: List[int], response: Response):
+        if len(player_ids) > DELETE_JOB_THRESHOLD:
+            return start_delete_job("delete_players", delete_players_chunk, player_ids, response)
+        await delete_in_chunks_async(delete_players_chunk, player_ids)
+        return {"Deleted players": player_ids}
+
+    @router.delete("/games")
+    async def delete_games(game_ids: List[int], response: Response):
+        if len(game_ids) > DELETE_JOB_THRESHOLD:
+            return start_delete_job("delete_games", delete_games_chunk, game_ids, response)
+        await delete_in_chunks_async(delete_games_chunk, game_ids)
+        return {"Deleted games": game_ids}
+
+    return router
@@ -0,0 +1,156 @@
+# Seeds players and games then drives every endpoint at a target rate, reporting throughput and latency percentiles.
+# Postgres is configured through .env like the API, prefer a throwaway database: seeded rows are not cleaned up.
+# Run from the api directory: python -m benchmarks.api --engine sqlite --players 10000 --games 50000 --output before.json
+# Comparing against a previous report exits with 1 on regressions: python -m benchmarks.api --baseline before.json
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load import API_DIR, hammer, serve
+from globals import GameState
+
+SEED_CHUNK_SIZE = 1000
+
+
+async def create_players(client: httpx.AsyncClient, count: int, prefix: str, concurrency: int) -> List[dict]:
+    names = iter(range(count))
+    players: List[dict] = []
+
+    async def worker():
+        for i in names:
+            response = await client.post("/player", json={"name": f"{prefix}-{i}", "elo": random.randint(800, 1600)})
+            response.raise_for_status()
+            players.append(response.json())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return players
+
+
+def random_game(players: List[dict]) -> dict:
+    first, second = random.sample(players, 2)
+    state = random.choice(list(GameState))
+    game = {"state": int(state), "players": [first, second]}
+    if state == GameState.FINISHED:
+        game["winner"] = random.choice([first, second])
+    return game
+
+
+async def create_games(client: httpx.AsyncClient, count: int, players: List[dict]) -> List[int]:
+    game_ids: List[int] = []
+    for start in range(0, count, SEED_CHUNK_SIZE):
+        games = [random_game(players) for _ in range(min(SEED_CHUNK_SIZE, count - start))]
+        response = await client.post("/games/batch", json=games)
+        response.raise_for_status()
+        game_ids.extend(result["id"] for result in response.json()["results"] if "id" in result)
+    return game_ids
+
+
+async def run(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    # Every delete removes one row, enough spare rows are seeded for the whole run
+    spare = int(args.rate * args.duration) + args.concurrency
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        players = await create_players(client, args.players, prefix, args.concurrency)
+        # Players without games, deleting them does not depend on how games are removed
+        spare_players = await create_players(client, spare, f"{prefix}-spare", args.concurrency)
+        game_ids = await create_games(client, args.games + spare, players)
+        seed_seconds = time.perf_counter() - start
+
+        spare_player_ids = iter([player["id"] for player in spare_players])
+        spare_game_ids = iter(game_ids[args.games:])
+        names = itertools.count()
+        scenarios = [
+            ("GET /players", "GET", f"/players?limit={args.page_size}", None),
+            ("GET /games", "GET", f"/games?limit={args.page_size}", None),
+            ("POST /player", "POST", "/player",
+             lambda: {"name": f"{prefix}-new-{next(names)}", "elo": random.randint(800, 1600)}),
+            ("POST /game", "POST", "/game", lambda: random_game(players)),
+            ("DELETE /games", "DELETE", "/games", lambda: [next(spare_game_ids)]),
+            ("DELETE /players", "DELETE", "/players", lambda: [next(spare_player_ids)]),
+        ]
+        endpoints = {}
+        for name, method, path, body in scenarios:
+            endpoints[name] = await hammer(client, method, path, args.concurrency, args.duration, json=body, rate=args.rate)
+    return {"seed_seconds": round(seed_seconds, 2), "endpoints": endpoints}
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    found: List[str] = []
+    for name, current in report["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            found.append(f"{name}: throughput {previous['rps']} -> {current['rps']} requests/s")
+        if current["errors"] > previous["errors"]:
+            found.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=["postgres", "sqlite"], default="postgres")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--rate", type=float, default=200, help="requests per second sent to each endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        env: Dict[str, str] = {}
+        if args.engine == "sqlite":
+            env = {"DB_ENGINE": "sqlite", "DB_NAME": str(Path(directory) / "benchmark.db")}
+        with serve(env, workers=args.workers) as base_url:
+            results = asyncio.run(run(base_url, args))
+
+    report = {
+        "commit": current_commit(),
+        "settings": {key: vars(args)[key] for key in ("engine", "players", "games", "rate", "concurrency",
+                                                      "duration", "page_size", "workers")},
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output is not None:
+        args.output.write_text(output)
+    if args.baseline is not None:
+        found = regressions(report, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in found:
+            print(f"Regression {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
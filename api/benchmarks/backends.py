@@ -0,0 +1,34 @@
+# Compares the peewee and asyncpg backends with one worker process on the Postgres configured in .env
+# Run from the api directory: python -m benchmarks.backends --concurrency 256 --rate 2000 --duration 10
+import argparse
+import asyncio
+import json
+import random
+
+from benchmarks.api import run
+from benchmarks.load import serve
+
+BACKENDS = ["peewee", "asyncpg"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--rate", type=float, default=2000, help="requests per second sent to each endpoint")
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = {}
+    for backend in BACKENDS:
+        random.seed(args.seed)
+        with serve({"DB_BACKEND": backend, "DB_ENGINE": "postgres"}) as base_url:
+            report[backend] = asyncio.run(run(base_url, args))["endpoints"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any
+
+import httpx
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(samples: List[float], ratio: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(ratio * len(ordered)))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def hammer(client: httpx.AsyncClient, method: str, path: str, concurrency: int, duration: float,
+                 json: Optional[Any | Callable[[], Any]] = None, rate: Optional[float] = None) -> Dict[str, float]:
+    # Without a rate every worker fires as soon as its previous request is answered. With a rate, request n is due
+    # at start + n / rate and its latency counts from that moment, so a slow server cannot hide its queueing delay.
+    latencies: List[float] = []
+    errors = 0
+    sent = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        nonlocal errors, sent
+        while True:
+            if rate is None:
+                start = time.perf_counter()
+                if start >= deadline:
+                    return
+            else:
+                start = started + sent / rate
+                if start >= deadline:
+                    return
+                sent += 1
+                await asyncio.sleep(max(0.0, start - time.perf_counter()))
+            try:
+                response = await client.request(method, path, json=json() if callable(json) else json)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+@contextmanager
+def serve(env: Dict[str, str], port: int = 8077, workers: int = 1):
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--workers", str(workers), "--log-level", "warning"],
+                               cwd=API_DIR, env={**os.environ, **env})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/docs", timeout=1)
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None:
+                    raise RuntimeError("The API server exited during startup")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,77 @@
+# Simulates players joining the matchmaking queue on a virtual clock, no database needed
+# Run from the api directory: python -m benchmarks.matchmaking --players 50000 --rate 2000
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.load import percentile
+from http_models import ExistingPlayer
+from matchmaking import MatchmakingQueue, MATCHMAKING_INTERVAL_MS
+
+
+def distribution(samples: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(samples) / len(samples), 4) if samples else 0.0,
+        "p50": round(percentile(samples, 0.50), 4),
+        "p95": round(percentile(samples, 0.95), 4),
+        "p99": round(percentile(samples, 0.99), 4),
+        "max": round(max(samples), 4) if samples else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=50_000)
+    parser.add_argument("--rate", type=float, default=2_000, help="players joining per simulated second")
+    parser.add_argument("--interval", type=float, default=MATCHMAKING_INTERVAL_MS / 1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(args.seed)
+    elos = np.clip(generator.normal(1200, 250, size=args.players), 0, 3000).astype(int).tolist()
+    arrivals = np.cumsum(generator.exponential(1 / args.rate, size=args.players)).tolist()
+    players = [ExistingPlayer(id=player_id, name=f"player{player_id}", elo=elo) for player_id, elo in enumerate(elos)]
+
+    queue = MatchmakingQueue()
+    enqueue_times, sweep_times, waits, gaps = [], [], [], []
+    enqueued_at = {}
+
+    def record(pairs, now):
+        for first, second in pairs:
+            waits.append(now - min(enqueued_at[first.id], enqueued_at[second.id]))
+            gaps.append(abs(first.elo - second.elo))
+
+    next_sweep = args.interval
+    for player, now in zip(players, arrivals):
+        while next_sweep <= now:
+            start = time.perf_counter()
+            pairs = queue.sweep(next_sweep)
+            sweep_times.append(time.perf_counter() - start)
+            record(pairs, next_sweep)
+            queue.take_pairs(len(pairs))
+            next_sweep += args.interval
+        enqueued_at[player.id] = now
+        start = time.perf_counter()
+        pair = queue.enqueue(player, now)
+        enqueue_times.append(time.perf_counter() - start)
+        if pair is not None:
+            record([pair], now)
+            queue.take_pairs(1)
+
+    report = {
+        "players": args.players,
+        "matched_players": 2 * len(gaps),
+        "still_waiting": len(queue),
+        "enqueue_ms": distribution([elapsed * 1000 for elapsed in enqueue_times]),
+        "sweep_ms": distribution([elapsed * 1000 for elapsed in sweep_times]),
+        "wait_seconds": distribution(waits),
+        "elo_gap": distribution(gaps),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Compares direct connections against the pooled mode on a local Postgres configured in .env
+# Run from the api directory: python -m benchmarks.pool --concurrency 64 --duration 10
+import argparse
+import asyncio
+import itertools
+import json
+import uuid
+
+import httpx
+
+from benchmarks.load import hammer, serve
+
+MODES = {
+    "direct": {"DB_POOL": "false"},
+    "pooled": {"DB_POOL": "true"},
+}
+
+
+async def seed(base_url: str, players: int):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        prefix = uuid.uuid4().hex[:8]
+        for i in range(players):
+            await client.post("/player", json={"name": f"bench-{prefix}-{i}", "elo": i % 2000})
+
+
+async def measure(base_url: str, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    prefix = uuid.uuid4().hex[:8]
+    names = itertools.count()
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        return {
+            "GET /players": await hammer(client, "GET", "/players", concurrency, duration),
+            "POST /player": await hammer(client, "POST", "/player", concurrency, duration,
+                                         json=lambda: {"name": f"bench-{prefix}-new-{next(names)}", "elo": 0}),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--players", type=int, default=1000)
+    args = parser.parse_args()
+
+    report = {}
+    for index, (mode, env) in enumerate(MODES.items()):
+        with serve(env) as base_url:
+            if index == 0:
+                asyncio.run(seed(base_url, args.players))
+            report[mode] = asyncio.run(measure(base_url, args.concurrency, args.duration))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Measures the full rating replay throughput on synthetic game histories, no database needed
+# Run from the api directory: python -m benchmarks.ratings --games 1000000 --players 10000
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ratings import rating_delta, replay
+
+
+def sequential_replay(winners: np.ndarray, losers: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+    ratings = ratings.tolist()
+    for winner_id, loser_id in zip(winners.tolist(), losers.tolist()):
+        delta = rating_delta(ratings[winner_id], ratings[loser_id])
+        ratings[winner_id] += delta
+        ratings[loser_id] -= delta
+    return np.asarray(ratings, dtype=np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(args.seed)
+    winners = generator.integers(1, args.players + 1, size=args.games)
+    # Shifting by a non-zero offset guarantees that nobody plays against themselves
+    losers = (winners - 1 + generator.integers(1, args.players, size=args.games)) % args.players + 1
+    ratings = generator.integers(800, 1600, size=args.players + 1)
+
+    report = {}
+    for name, function in [("vectorized", replay), ("sequential", sequential_replay)]:
+        start = time.perf_counter()
+        final_ratings = function(winners, losers, ratings)
+        elapsed = time.perf_counter() - start
+        report[name] = {"seconds": round(elapsed, 3), "games_per_second": round(args.games / elapsed)}
+        report[name]["checksum"] = int(final_ratings.sum())
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Measures how long each uvicorn worker takes to be ready, on a first start and on a restart with the schema up to date
+# Run from the api directory: python -m benchmarks.startup --engine sqlite --workers 1 2 4
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.load import API_DIR
+
+READY_LINE = "Application startup complete."
+
+
+def start_workers(env: Dict[str, str], workers: int, port: int, timeout: float = 60) -> List[float]:
+    # Every worker logs READY_LINE once its lifespan has run, the times are counted from the server start
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+                                "--log-level", "info"], cwd=API_DIR, env={**os.environ, **env},
+                               stderr=subprocess.PIPE, text=True)
+    ready: List[float] = []
+    try:
+        while len(ready) < workers and time.perf_counter() - started < timeout:
+            line = process.stderr.readline()
+            if line == "":
+                raise RuntimeError("The API server exited during startup")
+            if READY_LINE in line:
+                ready.append(round(time.perf_counter() - started, 3))
+    finally:
+        process.terminate()
+        process.wait()
+    return ready
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", choices=["postgres", "sqlite"], default="postgres")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--port", type=int, default=8078)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in args.workers:
+            env: Dict[str, str] = {}
+            if args.engine == "sqlite":
+                env = {"DB_ENGINE": "sqlite", "DB_NAME": str(Path(directory) / f"startup-{workers}.db")}
+            # The first start may create or migrate the schema, the restart finds it current
+            first_start = start_workers(env, workers, args.port)
+            restart = start_workers(env, workers, args.port)
+            report[workers] = {"first_start_seconds": first_start, "restart_seconds": restart}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Posts single games with and without WRITE_BEHIND on the Postgres configured in .env and counts the commits they cost
+# Run from the api directory: python -m benchmarks.write_behind --rate 1000 --duration 10 --flush-ms 50
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+
+from benchmarks.api import create_players, random_game
+from benchmarks.load import hammer, serve
+from db_models import db
+
+MODES = {
+    "direct": {"WRITE_BEHIND": "false"},
+    "write_behind": {"WRITE_BEHIND": "true"},
+}
+# Postgres publishes its statistics at most once per second
+STATS_DELAY = 1.5
+
+
+def database_counters() -> dict:
+    measured_at = time.perf_counter()
+    time.sleep(STATS_DELAY)
+    with db.connection_context():
+        commits, = db.execute_sql("SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()").fetchone()
+        games, = db.execute_sql("SELECT COUNT(*) FROM game").fetchone()
+    return {"commits": commits, "games": games, "measured_at": measured_at}
+
+
+async def measure(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        players = await create_players(client, args.players, f"bench-{uuid.uuid4().hex[:8]}", args.concurrency)
+        before = database_counters()
+        load = await hammer(client, "POST", "/game", args.concurrency, args.duration,
+                            json=lambda: random_game(players), rate=args.rate)
+    # Waits for the queued games, their receipts are written by then
+    after = database_counters()
+    commits, games = after["commits"] - before["commits"], after["games"] - before["games"]
+    # Autocommitted reads count as commits too
+    return {**load, "games_written": games, "commits": commits,
+            "commits_per_second": round(commits / (after["measured_at"] - before["measured_at"]), 1),
+            "commits_per_game": round(commits / games, 3) if games else None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000, help="games posted per second")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--flush-ms", type=int, default=50, help="WRITE_BEHIND_FLUSH_MS of the write behind mode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = {}
+    for mode, env in MODES.items():
+        random.seed(args.seed)
+        with serve({**env, "DB_ENGINE": "postgres", "WRITE_BEHIND_FLUSH_MS": str(args.flush_ms)}) as base_url:
+            report[mode] = asyncio.run(measure(base_url, args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from typing import Iterable, List, Optional
+
+from peewee import EXCLUDED, fn, chunked
+
+from db_models import ChangeVersion, Change
+
+PLAYER = "player"
+GAME = "game"
+INSERT_CHUNK_SIZE = 1000
+
+
+def next_version() -> int:
+    # The counter row stays locked until the transaction commits, so versions become visible in increasing order.
+    # Writers wait on each other only from here to their commit, so changes are recorded by the last statement.
+    bumped = ChangeVersion.update(version=ChangeVersion.version + 1).returning(ChangeVersion.version).tuples().execute()
+    return list(bumped)[0][0]
+
+
+def record_changes(entity: str, row_ids: Iterable[int], version: Optional[int] = None) -> Optional[int]:
+    # Expects to run at the end of the transaction writing the rows, deleted rows are recorded the same way.
+    # A row keeps only its latest change, version reuses the one of another entity written by the same transaction.
+    row_ids = list(dict.fromkeys(row_ids))
+    if len(row_ids) == 0:
+        return None
+    if version is None:
+        version = next_version()
+    for row_ids_chunk in chunked(row_ids, INSERT_CHUNK_SIZE):
+        (Change.insert_many([(version, entity, row_id) for row_id in row_ids_chunk],
+                            fields=[Change.version, Change.entity, Change.row_id])
+         .on_conflict(conflict_target=[Change.entity, Change.row_id], update={Change.version: EXCLUDED.version})
+         .execute())
+    return version
+
+
+def current_version(entity: str) -> int:
+    return Change.select(fn.MAX(Change.version)).where(Change.entity == entity).scalar() or 0
+
+
+def changed_ids(entity: str, since: int) -> List[int]:
+    changes_query = (Change.select(Change.row_id)
+                     .where(Change.entity == entity, Change.version > since)
+                     .tuples())
+    return [row_id for row_id, in changes_query]
@@ -1,12 +1,76 @@
+import hashlib
+import logging
+import os
 from os import environ
+from typing import List, Optional
 
 from dotenv import load_dotenv
 
-from globals import GameState, GameResult
-from peewee import PostgresqlDatabase, Model, CharField, IntegerField, ForeignKeyField, AutoField
+from globals import GameState, GameResult, env_flag, env_int
+from replicas import read_routing
+from peewee import Database, DatabaseError, PostgresqlDatabase, SqliteDatabase, Model, CharField, IntegerField, BigIntegerField, ForeignKeyField, AutoField
+from playhouse.migrate import SchemaMigrator, migrate
+from playhouse.pool import PooledPostgresqlDatabase
 
 load_dotenv()
-db = PostgresqlDatabase(environ.get("DB_NAME"), user=environ.get("DB_USER"), password=environ.get("DB_PASS"), host=environ.get("DB_HOST", "localhost"))
+logger = logging.getLogger(__name__)
+# "asyncpg" serves the listing, creation and deletion routes with asyncpg, the schema stays managed by peewee
+DB_BACKEND = environ.get("DB_BACKEND", "peewee")
+
+
+def create_database(name: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None,
+                    routed: bool = False) -> Database:
+    # routed gives the primary its read routing, main.py attaches the replicas to its read_router
+    name = name or environ.get("DB_NAME")
+    if environ.get("DB_ENGINE", "postgres") == "sqlite":
+        # Stand-in for tests and local benchmarks, DB_NAME is the path of the database file
+        database_class, params = SqliteDatabase, dict(pragmas={"foreign_keys": 1, "journal_mode": "wal"})
+    else:
+        params = dict(user=environ.get("DB_USER"), password=environ.get("DB_PASS"),
+                      host=host or environ.get("DB_HOST", "localhost"), port=port or env_int("DB_PORT", 5432))
+        database_class = PostgresqlDatabase
+        if env_flag("DB_POOL"):
+            # stale_timeout recycles idle connections, timeout bounds how long a request waits for a free one
+            database_class = PooledPostgresqlDatabase
+            params.update(max_connections=env_int("DB_POOL_MAX_CONNECTIONS", 20),
+                          stale_timeout=env_int("DB_POOL_STALE_TIMEOUT", 300),
+                          timeout=env_int("DB_POOL_TIMEOUT", 10))
+    if routed:
+        database_class = read_routing(database_class)
+    return database_class(name, **params)
+
+
+def create_replicas() -> List[Database]:
+    # DB_REPLICAS lists read replicas of the primary as host[:port], or database file paths with sqlite
+    replicas = []
+    for replica in environ.get("DB_REPLICAS", "").split(","):
+        replica = replica.strip()
+        if replica == "":
+            continue
+        if environ.get("DB_ENGINE", "postgres") == "sqlite":
+            replicas.append(create_database(name=replica))
+        else:
+            host, _, port = replica.partition(":")
+            replicas.append(create_database(host=host, port=int(port) if port != "" else None))
+    return replicas
+
+
+db = create_database(routed=True)
+replicas = create_replicas()
+
+
+def forget_inherited_connections() -> None:
+    # A worker must neither use nor close the connections of its parent, they are dropped without closing
+    for database in [db, *replicas]:
+        database._state.reset()
+        if hasattr(database, "_in_use"):
+            database._in_use.clear()
+            database._connections = []
+
+
+# Only servers forking an imported app, like gunicorn --preload, hand connections down this way. uvicorn --workers spawns
+# workers that import the app again, the lifespan startup of main.py resets the connections for every server.
+os.register_at_fork(after_in_child=forget_inherited_connections)
 
 
 class BaseModel(Model):
@@ -17,7 +81,9 @@ class BaseModel(Model):
 class Player(BaseModel):
     id = AutoField(primary_key=True)
     name = CharField(unique=True)
-    elo = IntegerField(default=0)
+    elo = IntegerField(default=0, index=True)
+    # Rating the player was created with, the starting point of a full rating replay
+    base_elo = IntegerField(default=0)
 
 
 class Game(BaseModel):
@@ -34,5 +100,137 @@ class PlayerGame(BaseModel):
         indexes = (
             # Specify a unique multi-column index on from/to-user.
             (('player', 'game'), True),
+            # Game history of a player filtered by result, in game order
+            (('player', 'result', 'game'), False),
         )
 
+
+class PlayerStats(BaseModel):
+    # Per player result counts, maintained by the transactions creating and deleting games
+    player = ForeignKeyField(Player, primary_key=True, backref="stats")
+    games = IntegerField(default=0)
+    unplayed = IntegerField(default=0)
+    playing = IntegerField(default=0)
+    won = IntegerField(default=0)
+    lost = IntegerField(default=0)
+    aborted = IntegerField(default=0)
+
+
+class ChangeVersion(BaseModel):
+    # Single row counter, bumped by every write transaction that records changes
+    version = BigIntegerField(default=0)
+
+
+class Change(BaseModel):
+    # Latest change of every row, so the table grows with the rows ever written rather than with the writes
+    version = BigIntegerField()
+    entity = CharField()
+    row_id = IntegerField()
+
+    class Meta:
+        indexes = (
+            (('entity', 'version'), False),
+            (('entity', 'row_id'), True),
+        )
+
+
+class SchemaVersion(BaseModel):
+    # Fingerprint of the schema the database was last migrated to
+    fingerprint = CharField()
+
+
+MODELS = [Player, Game, PlayerGame, PlayerStats, ChangeVersion, Change, SchemaVersion]
+# Any number, shared by every process migrating the same database
+SCHEMA_LOCK_KEY = 4242
+# Expressions used to fill a column when it is added to an existing table
+COLUMN_BACKFILLS = {
+    Player.base_elo: Player.elo,
+}
+# Postgres indexes behind GET /players/search: trigrams serve substring queries, text_pattern_ops serves prefix queries
+SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS player_name_trgm ON player USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS player_name_prefix ON player (lower(name) text_pattern_ops)",
+]
+
+
+def create_schema() -> bool:
+    # False when optional indexes could not be created, the schema is then migrated again at the next start
+    for model in MODELS:
+        model._schema.create_table(safe=True)
+    # Tables that already exist are left untouched, so columns added to a model later are added here
+    migrator = SchemaMigrator.from_database(db)
+    operations = []
+    added_fields = []
+    for model in MODELS:
+        existing_columns = {column.name for column in db.get_columns(model._meta.table_name)}
+        for field in model._meta.sorted_fields:
+            if field.column_name not in existing_columns:
+                operations.append(migrator.add_column(model._meta.table_name, field.column_name, field))
+                added_fields.append(field)
+    if len(operations) != 0:
+        with db.atomic():
+            migrate(*operations)
+            for field in added_fields:
+                if field in COLUMN_BACKFILLS:
+                    field.model.update({field: COLUMN_BACKFILLS[field]}).execute()
+    # Indexes come last since they may cover the columns added above
+    for model in MODELS:
+        model._schema.create_indexes(safe=True)
+    complete = not isinstance(db, PostgresqlDatabase) or create_search_indexes()
+    if not ChangeVersion.select().exists():
+        ChangeVersion.create(version=0)
+    return complete
+
+
+def create_search_indexes() -> bool:
+    # In a savepoint, a server without pg_trgm or a role that may not create it leaves search to the in-memory index
+    try:
+        with db.atomic():
+            db.execute_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for index_sql in SEARCH_INDEXES:
+                db.execute_sql(index_sql)
+    except DatabaseError as error:
+        logger.warning("Player search indexes not created, search falls back to memory: %s", error)
+        return False
+    return True
+
+
+def schema_fingerprint() -> str:
+    # Hash of the DDL of every model, any change to a table or an index gives a new fingerprint
+    statements = []
+    for model in MODELS:
+        statements.append(db.get_sql_context().sql(model._schema._create_table(safe=True)).query()[0])
+        statements.extend(db.get_sql_context().sql(index).query()[0] for index in model._schema._create_indexes(safe=True))
+    if isinstance(db, PostgresqlDatabase):
+        statements.extend(SEARCH_INDEXES)
+    return hashlib.sha1("\n".join(statements).encode()).hexdigest()
+
+
+def schema_is_current(fingerprint: str) -> bool:
+    return (db.table_exists(SchemaVersion._meta.table_name)
+            and SchemaVersion.select().where(SchemaVersion.fingerprint == fingerprint).exists())
+
+
+def ensure_schema() -> bool:
+    # Run by every worker at startup: an up to date database costs two queries, otherwise the first worker
+    # to take the lock migrates while the others wait for it, then find the schema current
+    fingerprint = schema_fingerprint()
+    if schema_is_current(fingerprint):
+        return False
+    transaction = db.atomic("IMMEDIATE") if isinstance(db, SqliteDatabase) else db.atomic()
+    with transaction:
+        if isinstance(db, PostgresqlDatabase):
+            db.execute_sql("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+        if schema_is_current(fingerprint):
+            return False
+        complete = create_schema()
+        SchemaVersion.delete().execute()
+        if complete:
+            SchemaVersion.create(fingerprint=fingerprint)
+    return True
+
+
+if __name__ == "__main__":
+    # Migrates ahead of a deployment started with SCHEMA_INIT=false: python db_models.py
+    with db:
+        print("Schema migrated" if ensure_schema() else "Schema already up to date")
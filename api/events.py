@@ -0,0 +1,64 @@
+import asyncio
+import json
+from typing import AsyncIterator, Iterable, Optional, Set
+
+from globals import env_int
+
+EVENTS_QUEUE_SIZE = env_int("EVENTS_QUEUE_SIZE", 100)
+EVENTS_KEEP_ALIVE = env_int("EVENTS_KEEP_ALIVE", 15)
+
+
+class ChangeHub:
+    # Broadcasts change events of this process to its subscribers.
+    # Handlers publish from worker threads, events are handed over to the event loop owning the queues.
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def bind(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self._loop = loop
+
+    def subscribe(self) -> asyncio.Queue:
+        subscriber = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: asyncio.Queue) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(self, entity: str, action: str, ids: Iterable[int], version: Optional[int] = None) -> None:
+        if self._loop is None or len(self._subscribers) == 0:
+            return
+        event = {"type": "change", "entity": entity, "action": action, "ids": list(ids), "version": version}
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def publish_resync(self) -> None:
+        if self._loop is None or len(self._subscribers) == 0:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, {"type": "resync"})
+
+    def _dispatch(self, event: dict) -> None:
+        for subscriber in self._subscribers:
+            if subscriber.full():
+                # A slow consumer loses its backlog and is told to resync, instead of slowing everyone down
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait({"type": "resync"})
+            else:
+                subscriber.put_nowait(event)
+
+    async def stream(self, subscriber: asyncio.Queue) -> AsyncIterator[str]:
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=EVENTS_KEEP_ALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+hub = ChangeHub()
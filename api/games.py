@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from globals import GameState, GameResult
+from http_models import Game as HTTPGame
+from changes import PLAYER, GAME
+from events import hub
+
+
+def check_game_consistency(game: HTTPGame) -> None:
+    code400 = status.HTTP_400_BAD_REQUEST
+    if game.id is not None:
+        raise HTTPException(status_code=code400, detail="A new game should not already have an id!")
+    if len(game.players) == 0:
+        raise HTTPException(status_code=code400, detail="A game should have at least one player!")
+    if len({player.id for player in game.players}) != len(game.players):
+        raise HTTPException(status_code=code400, detail="A player cannot appear twice in the same game!")
+    if game.state not in GameState:
+        game_states = {i.name: i.value for i in GameState}
+        raise HTTPException(status_code=code400, detail=f"Unknown game state! The game state must be one of the following: {game_states}")
+    if game.state in [GameState.PLAYING, GameState.FINISHED] and len(game.players) != 2:
+        raise HTTPException(status_code=code400, detail="A game that is playing or has been played must have exactly two players!")
+    if game.state == GameState.FINISHED and game.winner is None:
+        raise HTTPException(status_code=code400, detail=f"A finished game should have exactly one winner!")
+    if game.winner is not None and game.winner not in game.players:
+        raise HTTPException(status_code=code400, detail="The winner of a game must the one who played it!")
+
+
+def game_result(state: GameState, is_winner: bool) -> GameResult:
+    winner_game_state = [state, is_winner]
+    match winner_game_state:
+        case [GameState.UNPLAYED, *_]:
+            return GameResult.UNPLAYED
+        case [GameState.PLAYING, *_]:
+            return GameResult.PLAYING
+        case [GameState.ABORTED, *_]:
+            return GameResult.ABORTED
+        case [GameState.FINISHED, True]:
+            return GameResult.WON
+        case [GameState.FINISHED, False]:
+            return GameResult.LOST
+        case _:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid game and winner state!")
+
+
+def finished_results(games: List[HTTPGame]) -> List[Tuple[int, int]]:
+    results: List[Tuple[int, int]] = []
+    for game in games:
+        if game.state == GameState.FINISHED and game.winner is not None:
+            loser_id = next(player.id for player in game.players if player.id != game.winner.id)
+            results.append((game.winner.id, loser_id))
+    return results
+
+
+def publish_created_games(game_ids: List[int], new_ratings: Dict[int, int], version: Optional[int]) -> None:
+    hub.publish(GAME, "upserted", game_ids, version)
+    if len(new_ratings) != 0:
+        # The rating changes are recorded with the version of the games
+        hub.publish(PLAYER, "upserted", new_ratings.keys(), version)
@@ -1,3 +1,4 @@
+from os import environ
 from enum import IntEnum, auto, unique
 
 
@@ -17,3 +18,14 @@ class GameResult(IntEnum):
     LOST = auto()
     ABORTED = auto()
 
+
+def env_flag(name: str, default: bool = False) -> bool:
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = environ.get(name)
+    return default if value is None or value == "" else int(value)
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from peewee import Query, fn
+
+from globals import GameState, GameResult
+from db_models import Game, PlayerGame
+
+Opponent = PlayerGame.alias()
+
+
+def player_games_query(player_id: int, state: Optional[GameState], result: Optional[GameResult], after: Optional[int],
+                       limit: int, opponent_id: Optional[int] = None) -> Query:
+    # Games of a player in game order, keyed on the link so that the (player, game) and (player, result, game)
+    # indexes serve both the filter and the order. Fetches one extra row for the next page.
+    games_query = (PlayerGame.select(Game.id, Game.state, PlayerGame.result)
+                   .join(Game)
+                   .where(PlayerGame.player == player_id)
+                   .order_by(PlayerGame.game)
+                   .limit(limit + 1))
+    if opponent_id is not None:
+        games_query = (games_query.switch(PlayerGame)
+                       .join(Opponent, on=(Opponent.game == PlayerGame.game))
+                       .where(Opponent.player == opponent_id))
+    if after is not None:
+        games_query = games_query.where(PlayerGame.game > after)
+    if state is not None:
+        games_query = games_query.where(Game.state == state.value)
+    if result is not None:
+        games_query = games_query.where(PlayerGame.result == result.value)
+    return games_query
+
+
+def head_to_head_query(player_id: int, opponent_id: int) -> Query:
+    # Result counts of a player over the games shared with the opponent
+    return (PlayerGame.select(PlayerGame.result, fn.COUNT(PlayerGame.id))
+            .join(Opponent, on=(Opponent.game == PlayerGame.game))
+            .where(PlayerGame.player == player_id, Opponent.player == opponent_id)
+            .group_by(PlayerGame.result)
+            .tuples())
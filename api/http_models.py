@@ -20,3 +20,6 @@ class Game(BaseModel):
     players: List[ExistingPlayer] = []
     winner: ExistingPlayer | None = None
 
+
+class MatchmakingRequest(BaseModel):
+    player_id: int
@@ -0,0 +1,140 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from threading import Condition, Thread
+from typing import Callable, Deque, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+
+from globals import env_flag, env_int
+from http_models import Game as HTTPGame
+
+# With WRITE_BEHIND, POST /game answers 202 with a receipt and games are written in batches by a background thread
+WRITE_BEHIND = env_flag("WRITE_BEHIND")
+WRITE_BEHIND_QUEUE_SIZE = env_int("WRITE_BEHIND_QUEUE_SIZE", 10000)
+WRITE_BEHIND_BATCH_SIZE = env_int("WRITE_BEHIND_BATCH_SIZE", 1000)
+WRITE_BEHIND_FLUSH_MS = env_int("WRITE_BEHIND_FLUSH_MS", 50)
+WRITE_BEHIND_HISTORY = env_int("WRITE_BEHIND_HISTORY", 100000)
+RETRY_AFTER_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+
+class Receipt:
+    def __init__(self, receipt_id: str):
+        self.id = receipt_id
+        self.status = "queued"
+        self.game: Optional[int] = None
+        self.status_code: Optional[int] = None
+        self.detail: Optional[str] = None
+        self.accepted_at = time.time()
+        self.written_at: Optional[float] = None
+
+    def finish(self, result: dict) -> None:
+        # result is a /games/batch result, with either the id of the created game or an error
+        self.game = result.get("id")
+        self.status = "created" if self.game is not None else "failed"
+        self.status_code = result.get("status_code")
+        self.detail = result.get("detail")
+        self.written_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "status": self.status, "game": self.game, "status_code": self.status_code,
+                "detail": self.detail, "accepted_at": self.accepted_at, "written_at": self.written_at}
+
+
+class WriteBehindQueue:
+    # Bounded queue of games checked for consistency, written by one thread in a transaction per batch.
+    # A batch is written once it has batch_size games or once its oldest game waited flush_ms.
+    # Receipts are kept in the memory of this process, the oldest written ones are forgotten past history.
+    # Their ids are random so that no other API worker knows them: a receipt is only found on the worker that issued it.
+    def __init__(self, create_games: Callable[[List[HTTPGame]], List[dict]], size: int = WRITE_BEHIND_QUEUE_SIZE,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE, flush_ms: int = WRITE_BEHIND_FLUSH_MS,
+                 history: int = WRITE_BEHIND_HISTORY):
+        self.create_games = create_games
+        self.size = size
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.history = history
+        self._condition = Condition()
+        self._pending: Deque[Tuple[float, Receipt, HTTPGame]] = deque()
+        self._receipts: "OrderedDict[str, Receipt]" = OrderedDict()
+        self._closed = True
+        self._thread: Optional[Thread] = None
+
+    def submit(self, game: HTTPGame) -> Optional[Receipt]:
+        # None when the queue is full or closed
+        with self._condition:
+            if self._closed or len(self._pending) >= self.size:
+                return None
+            receipt = Receipt(uuid.uuid4().hex)
+            self._receipts[receipt.id] = receipt
+            while len(self._receipts) > self.history and next(iter(self._receipts.values())).status != "queued":
+                self._receipts.popitem(last=False)
+            self._pending.append((time.monotonic(), receipt, game))
+            if len(self._pending) == 1 or len(self._pending) == self.batch_size:
+                self._condition.notify()
+            return receipt
+
+    def get(self, receipt_id: str) -> Optional[Receipt]:
+        with self._condition:
+            return self._receipts.get(receipt_id)
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def _next_batch(self) -> List[Tuple[float, Receipt, HTTPGame]]:
+        # Waits for a full batch or for the oldest game to be due, an empty batch means the queue is closed and drained
+        with self._condition:
+            while len(self._pending) == 0 and not self._closed:
+                self._condition.wait()
+            if len(self._pending) != 0:
+                due_at = self._pending[0][0] + self.flush_ms / 1000
+                while len(self._pending) < self.batch_size and not self._closed and time.monotonic() < due_at:
+                    self._condition.wait(due_at - time.monotonic())
+            return [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+
+    def flush(self, batch: List[Tuple[float, Receipt, HTTPGame]]) -> None:
+        try:
+            results = self.create_games([game for _, _, game in batch])
+        except Exception as e:
+            logger.exception("Could not write %d queued games", len(batch))
+            results = [{"status_code": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": str(e)}] * len(batch)
+        with self._condition:
+            for (_, receipt, _), result in zip(batch, results):
+                receipt.finish(result)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if len(batch) == 0:
+                return
+            self.flush(batch)
+
+    def start(self) -> None:
+        with self._condition:
+            self._closed = False
+        self._thread = Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # Refuses new games, then waits until every accepted one is written
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def accept_game(queue: WriteBehindQueue, game: HTTPGame, response: Response) -> dict:
+    # Expects a game that passed check_game_consistency, players are checked when the game is written
+    receipt = queue.submit(game)
+    if receipt is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many games waiting to be written, retry later!",
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"/games/receipts/{receipt.id}"
+    return receipt.to_dict()
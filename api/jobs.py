@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from fastapi import Response, status
+from peewee import chunked
+
+from globals import env_int
+
+JOBS_WORKERS = env_int("JOBS_WORKERS", 1)
+JOBS_HISTORY = env_int("JOBS_HISTORY", 100)
+# Deletes are made in chunks of DELETE_CHUNK_SIZE ids, requests above DELETE_JOB_THRESHOLD ids run as jobs
+DELETE_CHUNK_SIZE = env_int("DELETE_CHUNK_SIZE", 500)
+DELETE_JOB_THRESHOLD = env_int("DELETE_JOB_THRESHOLD", 5000)
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, job_id: str, kind: str, total: int):
+        self.id = job_id
+        self.kind = kind
+        self.total = total
+        self.done = 0
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def advance(self, count: int) -> None:
+        self.done += count
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "kind": self.kind, "status": self.status, "total": self.total, "done": self.done,
+                "error": self.error, "created_at": self.created_at, "started_at": self.started_at,
+                "finished_at": self.finished_at}
+
+
+class JobRunner:
+    # Runs long maintenance work off the request threads, one job at a time by default.
+    # Jobs are kept in the memory of this process, finished ones are forgotten past JOBS_HISTORY.
+    # Their ids are random so that no other API worker knows them: a job is only found on the worker that runs it.
+    def __init__(self, workers: int = JOBS_WORKERS, history: int = JOBS_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._lock = Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _register(self, kind: str, total: int) -> Job:
+        # Expects the lock to be held
+        job = Job(uuid.uuid4().hex, kind, total)
+        self._jobs[job.id] = job
+        finished_ids = [job_id for job_id, known_job in self._jobs.items() if known_job.finished_at is not None]
+        for job_id in finished_ids[:max(0, len(finished_ids) - self.history)]:
+            del self._jobs[job_id]
+        return job
+
+    def submit(self, kind: str, total: int, work: Callable[[Job], None]) -> Job:
+        with self._lock:
+            job = self._register(kind, total)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._executor.submit(self._run, job, work)
+        return job
+
+    def submit_async(self, kind: str, total: int, work: Callable[[Job], Awaitable[None]]) -> Job:
+        # Coroutine jobs run as tasks of the running event loop instead of taking a thread
+        with self._lock:
+            job = self._register(kind, total)
+        task = asyncio.get_running_loop().create_task(self._run_async(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _start(self, job: Job) -> None:
+        job.status, job.started_at = "running", time.time()
+
+    def _fail(self, job: Job, error: Exception) -> None:
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        job.status, job.error = "failed", str(error)
+
+    def _run(self, job: Job, work: Callable[[Job], None]) -> None:
+        self._start(job)
+        try:
+            work(job)
+            job.status = "done"
+        except Exception as e:
+            self._fail(job, e)
+        job.finished_at = time.time()
+
+    async def _run_async(self, job: Job, work: Callable[[Job], Awaitable[None]]) -> None:
+        self._start(job)
+        try:
+            await work(job)
+            job.status = "done"
+        except Exception as e:
+            self._fail(job, e)
+        job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        # Chunks already committed stay deleted, pending jobs are dropped with the process
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        for task in list(self._tasks):
+            task.cancel()
+
+
+jobs = JobRunner()
+
+
+def delete_in_chunks(delete_chunk: Callable[[List[int]], None], ids: List[int], job: Optional[Job] = None) -> None:
+    # One short transaction per chunk, the chunk takes its own connection so that live requests get their turn between chunks
+    for ids_chunk in chunked(ids, DELETE_CHUNK_SIZE):
+        delete_chunk(ids_chunk)
+        if job is not None:
+            job.advance(len(ids_chunk))
+
+
+async def delete_in_chunks_async(delete_chunk: Callable[[List[int]], Awaitable[None]], ids: List[int],
+                                 job: Optional[Job] = None) -> None:
+    for ids_chunk in chunked(ids, DELETE_CHUNK_SIZE):
+        await delete_chunk(ids_chunk)
+        if job is not None:
+            job.advance(len(ids_chunk))
+
+
+def start_delete_job(kind: str, delete_chunk: Callable[[List[int]], Union[None, Awaitable[None]]], ids: List[int],
+                     response: Response) -> dict:
+    # Coroutine chunks, from the asyncpg routes, run on the event loop, the others on the job threads
+    if asyncio.iscoroutinefunction(delete_chunk):
+        job = jobs.submit_async(kind, len(ids), lambda job: delete_in_chunks_async(delete_chunk, ids, job))
+    else:
+        job = jobs.submit(kind, len(ids), lambda job: delete_in_chunks(delete_chunk, ids, job))
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job.to_dict()
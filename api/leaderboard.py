@@ -0,0 +1,130 @@
+import time
+from bisect import bisect_left, insort
+from threading import Lock, RLock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from globals import env_int
+from db_models import db, Player
+
+LEADERBOARD_TTL = env_int("LEADERBOARD_TTL", 60)
+
+
+class Leaderboard:
+    # Players ranked by Elo, kept in memory so that reads never reach the database.
+    # Writes of this process patch it in place, the TTL bounds how long writes of other processes stay invisible.
+    # The players are loaded without holding the lock, writes made meanwhile are replayed on the loaded ones.
+    def __init__(self, ttl: int = LEADERBOARD_TTL):
+        self.ttl = ttl
+        self._lock = RLock()
+        self._load_lock = Lock()
+        self._keys: List[Tuple[int, int]] = []
+        self._players: Dict[int, dict] = {}
+        self._loaded_at: Optional[float] = None
+        self._replayed: Optional[List[Callable[[], None]]] = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._is_fresh():
+                return
+            # Expired players are still served while another thread loads them again
+            blocking = self._loaded_at is None
+        if not self._load_lock.acquire(blocking=blocking):
+            return
+        try:
+            with self._lock:
+                if self._is_fresh():
+                    return
+                self._replayed = []
+            try:
+                players = self._load()
+            except Exception:
+                with self._lock:
+                    self._replayed = None
+                raise
+            with self._lock:
+                self._keys = [(-player["elo"], player["id"]) for player in players]
+                self._players = {player["id"]: player for player in players}
+                self._loaded_at = time.monotonic()
+                replayed, self._replayed = self._replayed, None
+                for write in replayed:
+                    write()
+        finally:
+            self._load_lock.release()
+
+    def _load(self) -> List[dict]:
+        players_query = Player.select(Player.id, Player.name, Player.elo).order_by(Player.elo.desc(), Player.id)
+        if db.is_closed():
+            with db.connection_context():
+                return list(players_query.dicts())
+        return list(players_query.dicts())
+
+    def _write(self, write: Callable[[], None]) -> None:
+        # Expects the lock to be held
+        if self._replayed is not None:
+            self._replayed.append(write)
+        if self._loaded_at is not None:
+            write()
+
+    def _entry(self, player: dict) -> dict:
+        # Players with the same Elo share the same rank
+        return {"rank": bisect_left(self._keys, (-player["elo"],)) + 1, **player}
+
+    def top(self, limit: int, offset: int = 0) -> List[dict]:
+        self._ensure_loaded()
+        with self._lock:
+            return [self._entry(self._players[player_id]) for _, player_id in self._keys[offset:offset + limit]]
+
+    def rank(self, player_id: int) -> Optional[dict]:
+        self._ensure_loaded()
+        with self._lock:
+            player = self._players.get(player_id)
+            return None if player is None else self._entry(player)
+
+    def _discard(self, player_id: int) -> Optional[dict]:
+        player = self._players.pop(player_id, None)
+        if player is not None:
+            del self._keys[bisect_left(self._keys, (-player["elo"], player_id))]
+        return player
+
+    def _upsert(self, player_id: int, name: str, elo: int) -> None:
+        self._discard(player_id)
+        self._players[player_id] = {"id": player_id, "name": name, "elo": elo}
+        insort(self._keys, (-elo, player_id))
+
+    def _update_ratings(self, ratings: Dict[int, int]) -> None:
+        for player_id, elo in ratings.items():
+            player = self._discard(player_id)
+            if player is None:
+                # Unknown to this process yet, the next load will bring it in
+                self._loaded_at = None
+                return
+            self._players[player_id] = {**player, "elo": elo}
+            insort(self._keys, (-elo, player_id))
+
+    def _remove(self, player_ids: List[int]) -> None:
+        for player_id in player_ids:
+            self._discard(player_id)
+
+    def upsert(self, player_id: int, name: str, elo: int) -> None:
+        with self._lock:
+            self._write(lambda: self._upsert(player_id, name, elo))
+
+    def update_ratings(self, ratings: Dict[int, int]) -> None:
+        ratings = dict(ratings)
+        with self._lock:
+            self._write(lambda: self._update_ratings(ratings))
+
+    def remove(self, player_ids: Iterable[int]) -> None:
+        player_ids = list(player_ids)
+        with self._lock:
+            self._write(lambda: self._remove(player_ids))
+
+
+leaderboard = Leaderboard()
@@ -1,74 +1,267 @@
-from typing import Optional, List, Tuple
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, List, Set, Tuple, Type
 
-from fastapi import FastAPI, Request, HTTPException, status
-from peewee import Query, JOIN
+from anyio import to_thread
+from fastapi import FastAPI, Request, Response, Query as QueryParam, HTTPException, status
+from fastapi.responses import ORJSONResponse, StreamingResponse, PlainTextResponse
+from peewee import Query, JOIN, Field, IntegrityError, chunked
 from playhouse.shortcuts import model_to_dict
 
-from globals import GameState, GameResult
-from db_models import db, Player, Game, PlayerGame
-from http_models import NewPlayer, ExistingPlayer, Game as HTTPGame
+from globals import GameState, GameResult, env_flag, env_int
+from db_models import DB_BACKEND, db, replicas, ensure_schema, forget_inherited_connections, BaseModel, Player, Game, PlayerGame, PlayerStats
+from http_models import NewPlayer, ExistingPlayer, Game as HTTPGame, MatchmakingRequest
+from ratings import ELO_K_FACTOR, apply_results, replay_ratings
+from leaderboard import leaderboard
+from changes import PLAYER, GAME, record_changes, current_version, changed_ids
+from events import hub
+from stats import add_links, remove_games, rebuild_stats, player_stats, count_links
+from matchmaking import Matchmaker
+from jobs import DELETE_JOB_THRESHOLD, Job, jobs, delete_in_chunks, start_delete_job
+from metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, instrument_queries, metrics
+from games import check_game_consistency, game_result, finished_results, publish_created_games
+from async_db import async_db
+from async_routes import create_async_router
+from replicas import ReadRouter, ReadRoutingMiddleware
+from search import SEARCH_MAX_LIMIT, search_players
+from history import player_games_query, head_to_head_query
+from ingest import WRITE_BEHIND, Receipt, WriteBehindQueue, accept_game
+from responses import (MAX_PAGE_SIZE, GAME_RELATIONS, field_names, projection, not_modified, fast_json, wants_ndjson,
+                       ndjson_pages, ndjson_response, next_page)
 
 
-app = FastAPI()
-with db:
-    db.create_tables([Player, Game, PlayerGame])
+BATCH_CHUNK_SIZE = 1000
+# Ids of the games created by one transaction, the new ratings of their players and their change version
+CreatedGames = Tuple[List[int], Dict[int, int], Optional[int]]
 
 
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    db.connect()
-    response = await call_next(request)
-    db.close()
-    return response
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Handlers are sync and run on this bounded pool, keep it at or below DB_POOL_MAX_CONNECTIONS
+    to_thread.current_default_thread_limiter().total_tokens = env_int("API_WORKER_THREADS", 16)
+    # Runs in every worker once it is started, connections opened before, in this process or a parent, are never reused
+    forget_inherited_connections()
+    if env_flag("SCHEMA_INIT", True):
+        with db.connection_context():
+            ensure_schema()
+    hub.bind(asyncio.get_running_loop())
+    if DB_BACKEND == "asyncpg":
+        await async_db.connect()
+    matchmaking_task = asyncio.create_task(matchmaker.run())
+    if WRITE_BEHIND:
+        write_behind.start()
+    yield
+    matchmaking_task.cancel()
+    if WRITE_BEHIND:
+        # Games accepted with a receipt are written before the connections are closed
+        await to_thread.run_sync(write_behind.stop)
+    jobs.shutdown()
+    if DB_BACKEND == "asyncpg":
+        await async_db.close()
+    hub.bind(None)
+    if hasattr(db, "close_all"):
+        db.close_all()
+    read_router.close_all()
+
+
+read_router = ReadRouter(db, replicas)
+if len(replicas) != 0:
+    # The metrics wrap the routed queries of the primary, so they time replica reads too
+    db.read_router = read_router
+instrument_queries(db)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(MetricsMiddleware)
+if len(replicas) != 0:
+    app.add_middleware(ReadRoutingMiddleware)
+if DB_BACKEND == "asyncpg":
+    # Included before the peewee routes below, so it serves the paths both define
+    app.include_router(create_async_router(lambda player_ids: forget_players(player_ids)))
+
+
+def keyset(query: Query, model: Type[BaseModel], limit: Optional[int], after: Optional[int]) -> Query:
+    key: Field = model._meta.primary_key
+    query = query.order_by(key)
+    if after is not None:
+        query = query.where(key > after)
+    if limit is not None:
+        # Fetching one extra row tells whether there is a next page without a COUNT
+        query = query.limit(limit + 1)
+    return query
+
+
+def paginate(query: Query, model: Type[BaseModel], response: Response, limit: Optional[int], after: Optional[int]) -> List[dict]:
+    rows: List[dict] = list(keyset(query, model, limit, after).dicts())
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1][model._meta.primary_key.name])
+    return rows
+
+
+def attach_players(games: List[dict], game_ids: List[int] | Query, relations: Tuple[str, ...] = GAME_RELATIONS) -> List[dict]:
+    # Resolves the players and winner of every game with a single join, however many games there are
+    games_by_id = {game["id"]: game for game in games}
+    for game in games:
+        if "players" in relations:
+            game["players"] = []
+        if "winner" in relations:
+            game["winner"] = None
+    links_query = (PlayerGame.select(PlayerGame.game, PlayerGame.result, Player.id, Player.name, Player.elo)
+                   .join(Player)
+                   .where(PlayerGame.game.in_(game_ids))
+                   .order_by(PlayerGame.id)
+                   .tuples())
+    for game_id, result, player_id, player_name, player_elo in links_query:
+        game = games_by_id.get(game_id)
+        if game is None:
+            continue
+        player = {"id": player_id, "name": player_name, "elo": player_elo}
+        if "players" in relations:
+            game["players"].append(player)
+        if "winner" in relations and result == GameResult.WON.value:
+            game["winner"] = player
+    return games
+
+
+def check_etag(request: Request, response: Response, entity: str) -> Tuple[int, Optional[Response]]:
+    # The version is read before the rows, so a write landing in between is sent again rather than missed
+    version = current_version(entity)
+    return version, not_modified(request, response, entity, version)
+
+
+def delta(query: Query, model: Type[BaseModel], entity: str, since: int, version: int) -> dict:
+    row_ids = changed_ids(entity, since)
+    rows: List[dict] = list(query.where(model.id.in_(row_ids)).order_by(model.id).dicts()) if len(row_ids) != 0 else []
+    existing_ids = {row["id"] for row in rows}
+    return {"version": version, "upserted": rows, "deleted": [row_id for row_id in row_ids if row_id not in existing_ids]}
 
 
 @app.get("/players")
-async def get_players(request: Request):
-    players_query: Query = Player.select()
-    return list(players_query.dicts())
+@db.connection_context()
+def get_players(request: Request, response: Response, limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE),
+                after: Optional[int] = None, fields: Optional[str] = None, since: Optional[int] = QueryParam(None, ge=0)):
+    version, not_modified = check_etag(request, response, PLAYER)
+    if not_modified is not None:
+        return not_modified
+    players_query: Query = Player.select(*projection(Player, field_names(fields)))
+    if since is not None:
+        return fast_json(delta(players_query, Player, PLAYER, since, version), response)
+    if wants_ndjson(request):
+        return ndjson_response(ndjson_pages(players_query, Player, limit, after), response)
+    return fast_json(paginate(players_query, Player, response, limit, after), response)
+
+
+@app.get("/players/search")
+@db.connection_context()
+def search_player_names(q: str = QueryParam(..., max_length=100), limit: int = QueryParam(20, ge=1, le=SEARCH_MAX_LIMIT)):
+    if q.strip() == "":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A search should have a query!")
+    return search_players(q.strip(), limit)
 
 
 @app.get("/games")
-async def get_games(request: Request):
-    games_query: Query = Game.select()
-    return list(games_query.dicts())
+@db.connection_context()
+def get_games(request: Request, response: Response, limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE),
+              after: Optional[int] = None, fields: Optional[str] = None, since: Optional[int] = QueryParam(None, ge=0)):
+    version, not_modified = check_etag(request, response, GAME)
+    if not_modified is not None:
+        return not_modified
+    names = field_names(fields)
+    relations = GAME_RELATIONS if names is None else tuple(name for name in names if name in GAME_RELATIONS)
+    games_query: Query = Game.select(*projection(Game, names, GAME_RELATIONS))
+    if since is not None:
+        games_delta = delta(games_query, Game, GAME, since, version)
+        if len(relations) != 0 and len(games_delta["upserted"]) != 0:
+            attach_players(games_delta["upserted"], [game["id"] for game in games_delta["upserted"]], relations)
+        return fast_json(games_delta, response)
+    if wants_ndjson(request):
+        def attach_page_players(games_page: List[dict]):
+            attach_players(games_page, [game["id"] for game in games_page], relations)
+        page_transform = attach_page_players if len(relations) != 0 else None
+        return ndjson_response(ndjson_pages(games_query, Game, limit, after, page_transform), response)
+    games = paginate(games_query, Game, response, limit, after)
+    if len(relations) != 0 and len(games) != 0:
+        attach_players(games, keyset(Game.select(Game.id), Game, limit, after), relations)
+    return fast_json(games, response)
+
+
+@app.get("/games/{game_id}")
+@db.connection_context()
+def get_game(game_id: int):
+    games: List[dict] = list(Game.select().where(Game.id == game_id).dicts())
+    if len(games) == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested game does not exist!")
+    return attach_players(games, [game_id])[0]
 
 
 @app.post("/player")
-async def create_player(player: NewPlayer):
+@db.connection_context()
+def create_player(player: NewPlayer):
     if player.name is None or player.name == "":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A new player should have a name!")
-    created_player: Player = Player.create(name=player.name, elo=player.elo)
+    with db.atomic() as transaction:
+        created_player: Player = Player.create(name=player.name, elo=player.elo, base_elo=player.elo)
+        version = record_changes(PLAYER, [created_player.id])
+    leaderboard.upsert(created_player.id, created_player.name, created_player.elo)
+    hub.publish(PLAYER, "upserted", [created_player.id], version)
     return model_to_dict(created_player)
 
 
+def forget_players(player_ids: List[int]) -> None:
+    leaderboard.remove(player_ids)
+    for player_id in player_ids:
+        matchmaker.queue.remove(player_id)
+        matchmaker.forget(player_id)
+
+
+@db.connection_context()
+def delete_players_chunk(player_ids: List[int]) -> None:
+    # The games of deleted players are kept, they only lose the links to them
+    with db.atomic() as transaction:
+        games_query = PlayerGame.select(PlayerGame.game).where(PlayerGame.player.in_(player_ids)).distinct().tuples()
+        game_ids = [game_id for game_id, in games_query]
+        PlayerGame.delete().where(PlayerGame.player.in_(player_ids)).execute()
+        PlayerStats.delete().where(PlayerStats.player.in_(player_ids)).execute()
+        Player.delete().where(Player.id.in_(player_ids)).execute()
+        version = record_changes(PLAYER, player_ids)
+        games_version = record_changes(GAME, game_ids, version)
+    forget_players(player_ids)
+    hub.publish(PLAYER, "deleted", player_ids, version)
+    if len(game_ids) != 0:
+        hub.publish(GAME, "upserted", game_ids, games_version)
+
+
+@db.connection_context()
+def delete_games_chunk(game_ids: List[int]) -> None:
+    with db.atomic() as transaction:
+        remove_games(game_ids)
+        PlayerGame.delete().where(PlayerGame.game.in_(game_ids)).execute()
+        Game.delete().where(Game.id.in_(game_ids)).execute()
+        version = record_changes(GAME, game_ids)
+    hub.publish(GAME, "deleted", game_ids, version)
+
+
 @app.delete("/players")
-async def delete_players(player_ids: List[int]):
-    Player.delete().where(Player.id.in_(player_ids)).execute()
+def delete_players(player_ids: List[int], response: Response):
+    if len(player_ids) > DELETE_JOB_THRESHOLD:
+        return start_delete_job("delete_players", delete_players_chunk, player_ids, response)
+    delete_in_chunks(delete_players_chunk, player_ids)
     return {"Deleted players": player_ids}
 
 
 @app.delete("/games")
-async def delete_games(game_ids: List[int]):
-    Game.delete().where(Game.id.in_(game_ids)).execute()
+def delete_games(game_ids: List[int], response: Response):
+    if len(game_ids) > DELETE_JOB_THRESHOLD:
+        return start_delete_job("delete_games", delete_games_chunk, game_ids, response)
+    delete_in_chunks(delete_games_chunk, game_ids)
     return {"Deleted games": game_ids}
 
 
-def check_game_consistency(game: HTTPGame) -> None:
-    code400 = status.HTTP_400_BAD_REQUEST
-    if game.id is not None:
-        raise HTTPException(status_code=code400, detail="A new game should not already have an id!")
-    if len(game.players) == 0:
-        raise HTTPException(status_code=code400, detail="A game should have at least one player!")
-    if game.state not in GameState:
-        game_states = {i.name: i.value for i in GameState}
-        raise HTTPException(status_code=code400, detail=f"Unknown game state! The game state must be one of the following: {game_states}")
-    if game.state in [GameState.PLAYING, GameState.FINISHED] and len(game.players) != 2:
-        raise HTTPException(status_code=code400, detail="A game that is playing or has been played must have exactly two players!")
-    if game.state == GameState.FINISHED and game.winner is None:
-        raise HTTPException(status_code=code400, detail=f"A finished game should have exactly one winner!")
-    if game.winner is not None and game.winner not in game.players:
-        raise HTTPException(status_code=code400, detail="The winner of a game must the one who played it!")
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job: Optional[Job] = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested job does not exist!")
+    return job.to_dict()
 
 
 def check_player_existence(game: HTTPGame) -> Tuple[Optional[Player], List[Optional[Player]]]:
@@ -89,42 +282,263 @@ def check_player_existence(game: HTTPGame) -> Tuple[Optional[Player], List[Optio
 def create_game_linked(game: HTTPGame, db_players: List[Player], db_winner: Optional[Player]) -> Game:
     with db.atomic() as transaction:
         created_game: Game = Game.create(state=game.state)
+        links: List[Tuple[int, int]] = []
         for db_player in db_players:
-            result_state: GameResult = GameResult.UNPLAYED
             is_winner = db_winner is not None and db_player.id == db_winner.id
-            winner_game_state = [game.state, is_winner]
-            match winner_game_state:
-                case [GameState.UNPLAYED, *_]:
-                    result_state = GameResult.UNPLAYED
-                case [GameState.PLAYING, *_]:
-                    result_state = GameResult.PLAYING
-                case [GameState.ABORTED, *_]:
-                    result_state = GameResult.ABORTED
-                case [GameState.FINISHED, True]:
-                    result_state = GameResult.WON
-                case [GameState.FINISHED, False]:
-                    result_state = GameResult.LOST
-                case _:
-                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid game and winner state!")
+            result_state: GameResult = game_result(game.state, is_winner)
             PlayerGame.create(player=db_player, game=created_game, result=result_state.value)
+            links.append((db_player.id, result_state.value))
+        add_links(links)
+        new_ratings = apply_results(finished_results([game]))
+        version = record_changes(GAME, [created_game.id])
+        record_changes(PLAYER, new_ratings.keys(), version)
 
+    leaderboard.update_ratings(new_ratings)
+    publish_created_games([created_game.id], new_ratings, version)
     return created_game
 
 
+def create_games_linked(games: List[HTTPGame]) -> CreatedGames:
+    # The leaderboard and subscribers are told by the caller with publish_games, once its outermost transaction committed
+    with db.atomic() as transaction:
+        inserted_games = (Game.insert_many([(game.state.value,) for game in games], fields=[Game.state])
+                          .returning(Game.id).tuples().execute())
+        game_ids: List[int] = [row[0] for row in inserted_games]
+        links = [(player.id, game_id, game_result(game.state, game.winner is not None and player.id == game.winner.id).value)
+                 for game, game_id in zip(games, game_ids) for player in game.players]
+        for links_chunk in chunked(links, BATCH_CHUNK_SIZE):
+            PlayerGame.insert_many(links_chunk, fields=[PlayerGame.player, PlayerGame.game, PlayerGame.result]).execute()
+        add_links((player_id, result) for player_id, _, result in links)
+        new_ratings = apply_results(finished_results(games))
+        version = record_changes(GAME, game_ids)
+        record_changes(PLAYER, new_ratings.keys(), version)
+    return game_ids, new_ratings, version
+
+
+def publish_games(created: List[CreatedGames]) -> None:
+    for game_ids, new_ratings, version in created:
+        leaderboard.update_ratings(new_ratings)
+        publish_created_games(game_ids, new_ratings, version)
+
+
+def create_consistent_games(games: List[HTTPGame]) -> Tuple[List[dict], List[CreatedGames]]:
+    # Expects games that passed check_game_consistency, gives for each either the id of the created game or an error,
+    # along with the chunks created for publish_games
+    results: List[Optional[dict]] = [None] * len(games)
+    created: List[CreatedGames] = []
+
+    # Checking data existence in the database with a single query for all referenced players
+    referenced_ids = {player.id for game in games for player in game.players}
+    existing_ids = {row[0] for row in Player.select(Player.id).where(Player.id.in_(list(referenced_ids))).tuples()}
+    existing_indexes: List[int] = []
+    for index, game in enumerate(games):
+        if all(player.id in existing_ids for player in game.players):
+            existing_indexes.append(index)
+        else:
+            results[index] = {"status_code": status.HTTP_404_NOT_FOUND, "detail": "Requested player(s) do not exist!"}
+
+    # Creating the games and linking the players, one short transaction per chunk
+    for indexes_chunk in chunked(existing_indexes, BATCH_CHUNK_SIZE):
+        try:
+            created_games = create_games_linked([games[index] for index in indexes_chunk])
+        except IntegrityError as e:
+            for index in indexes_chunk:
+                results[index] = {"status_code": status.HTTP_409_CONFLICT, "detail": str(e)}
+            continue
+        created.append(created_games)
+        for index, game_id in zip(indexes_chunk, created_games[0]):
+            results[index] = {"id": game_id}
+    return results, created
+
+
+def create_matched_games(games: List[HTTPGame]) -> List[dict]:
+    with db.connection_context():
+        results, created = create_consistent_games(games)
+    publish_games(created)
+    return results
+
+
+def existing_player_ids(player_ids: List[int]) -> Set[int]:
+    with db.connection_context():
+        return {player_id for player_id, in Player.select(Player.id).where(Player.id.in_(player_ids)).tuples()}
+
+
+matchmaker = Matchmaker(create_matched_games, existing_player_ids)
+
+
+def create_queued_games(games: List[HTTPGame]) -> List[dict]:
+    # A single commit per batch, the chunk transactions become savepoints
+    with db.connection_context(), db.atomic():
+        results, created = create_consistent_games(games)
+    publish_games(created)
+    return results
+
+
+write_behind = WriteBehindQueue(create_queued_games)
+
+
 @app.post("/game")
-async def create_game(game: HTTPGame):
+def create_game(game: HTTPGame, response: Response):
     # Checking data consistency
     check_game_consistency(game)
+    if WRITE_BEHIND:
+        return accept_game(write_behind, game, response)
+
+    with db.connection_context():
+        # Checking data existence in the database
+        db_winner, db_players = check_player_existence(game)
+
+        # Creating the game and linking the player(s) accordingly
+        return ORJSONResponse(model_to_dict(create_game_linked(game, db_players, db_winner)))
+
+
+@app.get("/games/receipts/{receipt_id}")
+def get_game_receipt(receipt_id: str):
+    receipt: Optional[Receipt] = write_behind.get(receipt_id)
+    if receipt is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested receipt does not exist!")
+    return receipt.to_dict()
+
+
+@app.post("/games/batch")
+@db.connection_context()
+def create_games(games: List[HTTPGame]):
+    results: List[Optional[dict]] = [None] * len(games)
+
+    # Checking data consistency of every game, invalid ones are reported and skipped
+    valid_indexes: List[int] = []
+    for index, game in enumerate(games):
+        try:
+            check_game_consistency(game)
+            valid_indexes.append(index)
+        except HTTPException as e:
+            results[index] = {"index": index, "status_code": e.status_code, "detail": e.detail}
+
+    consistent_results, created_chunks = create_consistent_games([games[index] for index in valid_indexes])
+    publish_games(created_chunks)
+    for index, result in zip(valid_indexes, consistent_results):
+        results[index] = {"index": index, **result}
+
+    created = sum(1 for result in results if "id" in result)
+    return {"created": created, "failed": len(games) - created, "results": results}
+
+
+@app.post("/ratings/replay")
+@db.connection_context()
+def replay_all_ratings(k_factor: int = QueryParam(ELO_K_FACTOR, ge=1)):
+    replay_report = replay_ratings(k_factor)
+    leaderboard.invalidate()
+    hub.publish_resync()
+    return replay_report
+
+
+@app.get("/players/{player_id}/stats")
+@db.connection_context()
+def get_player_stats(player_id: int):
+    stats = player_stats(player_id)
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player does not exist!")
+    return stats
+
+
+@app.get("/players/{player_id}/games")
+@db.connection_context()
+def get_player_games(player_id: int, response: Response, limit: int = QueryParam(50, ge=1, le=MAX_PAGE_SIZE),
+                     after: Optional[int] = None, state: Optional[GameState] = None, result: Optional[GameResult] = None):
+    if not Player.select().where(Player.id == player_id).exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player does not exist!")
+    games = next_page(list(player_games_query(player_id, state, result, after, limit).dicts()), response, limit)
+    if len(games) != 0:
+        attach_players(games, [game["id"] for game in games])
+    return fast_json(games, response)
+
+
+@app.get("/players/{player_id}/vs/{opponent_id}")
+@db.connection_context()
+def get_head_to_head(player_id: int, opponent_id: int, response: Response, limit: int = QueryParam(50, ge=1, le=MAX_PAGE_SIZE),
+                     after: Optional[int] = None, state: Optional[GameState] = None, result: Optional[GameResult] = None):
+    if player_id == opponent_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A player cannot be their own opponent!")
+    players_query = Player.select(Player.id, Player.name, Player.elo).where(Player.id.in_([player_id, opponent_id]))
+    players = {player["id"]: player for player in players_query.dicts()}
+    if len(players) != 2:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player(s) do not exist!")
+    # Counted from the first player's side, over every shared game whatever the filters
+    record = count_links((player_id, link_result, links_count)
+                         for link_result, links_count in head_to_head_query(player_id, opponent_id))[player_id]
+    games_query = player_games_query(player_id, state, result, after, limit, opponent_id)
+    games = next_page(list(games_query.dicts()), response, limit)
+    if len(games) != 0:
+        attach_players(games, [game["id"] for game in games])
+    return fast_json({"player": players[player_id], "opponent": players[opponent_id], "record": record, "games": games}, response)
+
+
+@app.get("/stats")
+@db.connection_context()
+def get_stats(response: Response, limit: Optional[int] = QueryParam(None, ge=1, le=MAX_PAGE_SIZE), after: Optional[int] = None):
+    return fast_json(paginate(PlayerStats.select(), PlayerStats, response, limit, after), response)
+
+
+@app.post("/stats/rebuild")
+@db.connection_context()
+def rebuild_all_stats():
+    return {"players": rebuild_stats()}
+
+
+@app.post("/matchmaking/queue", status_code=status.HTTP_202_ACCEPTED)
+@db.connection_context()
+def enqueue_player(request: MatchmakingRequest):
+    db_player: Optional[Player] = Player.get_or_none(Player.id == request.player_id)
+    if db_player is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player does not exist!")
+    matchmaker.forget(db_player.id)
+    matchmaker.queue.enqueue(ExistingPlayer(id=db_player.id, name=db_player.name, elo=db_player.elo))
+    return matchmaker.status(db_player.id)
+
+
+@app.get("/matchmaking/queue/{player_id}")
+def get_matchmaking_status(player_id: int):
+    matchmaking_status = matchmaker.status(player_id)
+    if matchmaking_status is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player is not in the matchmaking queue!")
+    return matchmaking_status
+
+
+@app.delete("/matchmaking/queue/{player_id}")
+def leave_matchmaking(player_id: int):
+    if not matchmaker.queue.remove(player_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player is not waiting in the matchmaking queue!")
+    return {"Left matchmaking": player_id}
+
+
+@app.get("/leaderboard")
+def get_leaderboard(top: int = QueryParam(10, ge=1, le=MAX_PAGE_SIZE), offset: int = QueryParam(0, ge=0)):
+    return leaderboard.top(top, offset)
+
+
+@app.get("/leaderboard/{player_id}")
+def get_player_rank(player_id: int):
+    player_rank = leaderboard.rank(player_id)
+    if player_rank is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Requested player does not exist!")
+    return player_rank
+
+
+@app.get("/events")
+async def get_events():
+    # Server-Sent Events stream of the changes made through this process
+    return StreamingResponse(hub.stream(hub.subscribe()), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
-    # Checking data existence in the database
-    db_winner, db_players = check_player_existence(game)
 
-    # Creating the game and linking the player(s) accordingly
-    return model_to_dict(create_game_linked(game, db_players, db_winner))
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(db), media_type=PROMETHEUS_MEDIA_TYPE)
 
 
 @app.get("/")
-async def root():
+@db.connection_context()
+def root():
     for player in Player.select():
         print(player.name)
 
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from anyio import to_thread
+
+from globals import GameState, env_int
+from http_models import ExistingPlayer, Game as HTTPGame
+
+MATCHMAKING_BASE_WINDOW = env_int("MATCHMAKING_BASE_WINDOW", 50)
+MATCHMAKING_WINDOW_GROWTH = env_int("MATCHMAKING_WINDOW_GROWTH", 25)
+MATCHMAKING_MAX_WINDOW = env_int("MATCHMAKING_MAX_WINDOW", 400)
+MATCHMAKING_INTERVAL_MS = env_int("MATCHMAKING_INTERVAL_MS", 500)
+MATCHMAKING_MAX_BATCH = env_int("MATCHMAKING_MAX_BATCH", 1000)
+# Players whose last match is remembered for the status route, the oldest matches are forgotten first
+MATCHMAKING_MAX_MATCHES = env_int("MATCHMAKING_MAX_MATCHES", 100000)
+
+logger = logging.getLogger(__name__)
+Pair = Tuple[ExistingPlayer, ExistingPlayer]
+
+
+class MatchmakingQueue:
+    # Waiting players sorted by (elo, id). A player accepts opponents within an Elo window that widens
+    # with the time spent waiting, a pair is made as soon as one of the two windows covers the gap.
+    def __init__(self, base_window: int = MATCHMAKING_BASE_WINDOW, window_growth: int = MATCHMAKING_WINDOW_GROWTH,
+                 max_window: int = MATCHMAKING_MAX_WINDOW):
+        self.base_window = base_window
+        self.window_growth = window_growth
+        self.max_window = max_window
+        self._lock = Lock()
+        self._keys: List[Tuple[int, int]] = []
+        self._waiting: Dict[int, Tuple[ExistingPlayer, float]] = {}
+        self._pairs: List[Pair] = []
+        self._paired_ids: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def window(self, enqueued_at: float, now: float) -> float:
+        return min(self.max_window, self.base_window + self.window_growth * (now - enqueued_at))
+
+    def waiting_since(self, player_id: int) -> Optional[float]:
+        waiting = self._waiting.get(player_id)
+        return None if waiting is None else waiting[1]
+
+    def is_paired(self, player_id: int) -> bool:
+        return player_id in self._paired_ids
+
+    def _add_pairs(self, pairs: List[Pair]) -> None:
+        self._pairs.extend(pairs)
+        self._paired_ids.update(player.id for pair in pairs for player in pair)
+
+    def enqueue(self, player: ExistingPlayer, now: Optional[float] = None) -> Optional[Pair]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if player.id in self._waiting or player.id in self._paired_ids:
+                return None
+            key = (player.elo, player.id)
+            index = bisect_left(self._keys, key)
+            # Only the two neighbours can be the nearest opponent
+            best_index, best_gap = None, None
+            for neighbour_index in (index - 1, index):
+                if 0 <= neighbour_index < len(self._keys):
+                    neighbour_elo, neighbour_id = self._keys[neighbour_index]
+                    gap = abs(neighbour_elo - player.elo)
+                    window = self.window(self._waiting[neighbour_id][1], now)
+                    if gap <= window and (best_gap is None or gap < best_gap):
+                        best_index, best_gap = neighbour_index, gap
+            if best_index is None:
+                self._keys.insert(index, key)
+                self._waiting[player.id] = (player, now)
+                return None
+            _, opponent_id = self._keys.pop(best_index)
+            opponent, _ = self._waiting.pop(opponent_id)
+            pair = (opponent, player)
+            self._add_pairs([pair])
+            return pair
+
+    def remove(self, player_id: int) -> bool:
+        with self._lock:
+            waiting = self._waiting.pop(player_id, None)
+            if waiting is None:
+                return False
+            player, _ = waiting
+            del self._keys[bisect_left(self._keys, (player.elo, player.id))]
+            return True
+
+    def sweep(self, now: Optional[float] = None) -> List[Pair]:
+        # Pairs neighbours whose windows have grown enough since they were enqueued, in one pass over the queue
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            remaining_keys: List[Tuple[int, int]] = []
+            pairs: List[Pair] = []
+            index = 0
+            while index < len(self._keys):
+                if index + 1 < len(self._keys):
+                    (first_elo, first_id), (second_elo, second_id) = self._keys[index], self._keys[index + 1]
+                    window = self.window(min(self._waiting[first_id][1], self._waiting[second_id][1]), now)
+                    if second_elo - first_elo <= window:
+                        pairs.append((self._waiting.pop(first_id)[0], self._waiting.pop(second_id)[0]))
+                        index += 2
+                        continue
+                remaining_keys.append(self._keys[index])
+                index += 1
+            self._keys = remaining_keys
+            self._add_pairs(pairs)
+            return pairs
+
+    def take_pairs(self, limit: int) -> List[Pair]:
+        with self._lock:
+            pairs, self._pairs = self._pairs[:limit], self._pairs[limit:]
+            self._paired_ids.difference_update(player.id for pair in pairs for player in pair)
+            return pairs
+
+
+class Matchmaker:
+    # Periodically sweeps the queue and turns the pairs into PLAYING games, one batch per round.
+    # create_games gives for each game either {"id": ...} or an error, existing_ids tells which players were not deleted.
+    def __init__(self, create_games: Callable[[List[HTTPGame]], List[dict]], existing_ids: Callable[[List[int]], Set[int]],
+                 queue: Optional[MatchmakingQueue] = None, max_matches: int = MATCHMAKING_MAX_MATCHES):
+        self.create_games = create_games
+        self.existing_ids = existing_ids
+        self.queue = MatchmakingQueue() if queue is None else queue
+        self.max_matches = max_matches
+        # Written by the matchmaking loop and by request threads, the queue lock does not cover it
+        self._matches_lock = Lock()
+        self._matches: Dict[int, int] = {}
+
+    def forget(self, player_id: int) -> None:
+        with self._matches_lock:
+            self._matches.pop(player_id, None)
+
+    def _add_match(self, player_id: int, game_id: int) -> None:
+        # Dicts keep insertion order, so the first key is the oldest match
+        with self._matches_lock:
+            self._matches.pop(player_id, None)
+            self._matches[player_id] = game_id
+            while len(self._matches) > self.max_matches:
+                del self._matches[next(iter(self._matches))]
+
+    def create_round(self) -> int:
+        self.queue.sweep()
+        pairs = self.queue.take_pairs(MATCHMAKING_MAX_BATCH)
+        if len(pairs) == 0:
+            return 0
+        games = [HTTPGame(state=GameState.PLAYING, players=list(pair)) for pair in pairs]
+        try:
+            results = self.create_games(games)
+        except Exception:
+            logger.exception("Could not create %d matched games", len(games))
+            results = [{}] * len(games)
+        failed_pairs: List[Pair] = []
+        for pair, result in zip(pairs, results):
+            if "id" in result:
+                for player in pair:
+                    self._add_match(player.id, result["id"])
+            else:
+                failed_pairs.append(pair)
+        if len(failed_pairs) != 0:
+            self.requeue(failed_pairs)
+        return len(pairs) - len(failed_pairs)
+
+    def requeue(self, pairs: List[Pair]) -> None:
+        # Players of games that could not be created wait again, but for those deleted in the meantime
+        players = [player for pair in pairs for player in pair]
+        try:
+            existing_ids = self.existing_ids([player.id for player in players])
+        except Exception:
+            # Deleted players are dropped at the next failed round
+            logger.exception("Could not check the players of %d unmatched pairs", len(pairs))
+            existing_ids = {player.id for player in players}
+        for player in players:
+            if player.id in existing_ids:
+                self.queue.enqueue(player)
+
+    def status(self, player_id: int) -> Optional[dict]:
+        enqueued_at = self.queue.waiting_since(player_id)
+        if enqueued_at is not None:
+            return {"player": player_id, "status": "waiting", "waited": round(time.monotonic() - enqueued_at, 3)}
+        if self.queue.is_paired(player_id):
+            return {"player": player_id, "status": "paired"}
+        with self._matches_lock:
+            game_id = self._matches.get(player_id)
+        if game_id is not None:
+            return {"player": player_id, "status": "matched", "game": game_id}
+        return None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(MATCHMAKING_INTERVAL_MS / 1000)
+            try:
+                await to_thread.run_sync(self.create_round)
+            except Exception:
+                logger.exception("Matchmaking round failed")
@@ -0,0 +1,182 @@
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from peewee import Database
+
+from globals import env_int
+
+SLOW_QUERY_MS = env_int("SLOW_QUERY_MS", 0)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+Labels = Tuple[str, str]
+
+
+class RequestTimings:
+    def __init__(self, path: str):
+        self.path = path
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestTimings]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def label_text(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Metrics:
+    # Metrics of this process only, every worker of a multi-process server exposes its own
+    def __init__(self):
+        self._lock = Lock()
+        self.in_flight = 0
+        self.latencies: Dict[Labels, Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.request_queries: Dict[Labels, List[float]] = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.slow_queries = 0
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, timings: RequestTimings) -> None:
+        with self._lock:
+            self.latencies.setdefault((method, route), Histogram()).observe(seconds)
+            response_key = (method, route, status_code)
+            self.responses[response_key] = self.responses.get(response_key, 0) + 1
+            queries = self.request_queries.setdefault((method, route), [0, 0.0])
+            queries[0] += timings.queries
+            queries[1] += timings.query_seconds
+
+    def observe_query(self, seconds: float, slow: bool) -> None:
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            self.slow_queries += slow
+
+    def render(self, database: Database) -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines += ["# HELP http_request_duration_seconds Time to answer a request, by route.",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for labels, histogram in sorted(self.latencies.items()):
+                label = label_text(("method", "route"), labels)
+                cumulative = 0
+                bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"http_request_duration_seconds_sum{{{label}}} {histogram.sum}")
+                lines.append(f"http_request_duration_seconds_count{{{label}}} {cumulative}")
+            lines += ["# HELP http_responses_total Answered requests, by route and status code.",
+                      "# TYPE http_responses_total counter"]
+            for labels, count in sorted(self.responses.items()):
+                lines.append(f"http_responses_total{{{label_text(('method', 'route', 'status'), labels)}}} {count}")
+            lines += ["# HELP http_requests_in_flight Requests being answered.",
+                      "# TYPE http_requests_in_flight gauge",
+                      f"http_requests_in_flight {self.in_flight}"]
+            lines += ["# HELP http_request_db_queries_total SQL queries run while answering requests, by route.",
+                      "# TYPE http_request_db_queries_total counter"]
+            for labels, (count, _) in sorted(self.request_queries.items()):
+                lines.append(f"http_request_db_queries_total{{{label_text(('method', 'route'), labels)}}} {count}")
+            lines += ["# HELP http_request_db_seconds_total Time spent in SQL queries while answering requests, by route.",
+                      "# TYPE http_request_db_seconds_total counter"]
+            for labels, (_, seconds) in sorted(self.request_queries.items()):
+                lines.append(f"http_request_db_seconds_total{{{label_text(('method', 'route'), labels)}}} {seconds}")
+            lines += ["# HELP db_queries_total SQL queries run by this process.",
+                      "# TYPE db_queries_total counter",
+                      f"db_queries_total {self.queries}",
+                      "# HELP db_query_seconds_total Time spent in SQL queries by this process.",
+                      "# TYPE db_query_seconds_total counter",
+                      f"db_query_seconds_total {self.query_seconds}",
+                      "# HELP db_slow_queries_total SQL queries slower than SLOW_QUERY_MS.",
+                      "# TYPE db_slow_queries_total counter",
+                      f"db_slow_queries_total {self.slow_queries}"]
+        if hasattr(database, "max_connections"):
+            lines += ["# HELP db_pool_connections Connections of the pool, by state.",
+                      "# TYPE db_pool_connections gauge",
+                      f'db_pool_connections{{state="in_use"}} {len(database._in_use)}',
+                      f'db_pool_connections{{state="idle"}} {len(database._connections)}',
+                      f'db_pool_connections{{state="max"}} {database.max_connections}']
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_query(elapsed: float, sql: str, params) -> None:
+    timings = current_request.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.query_seconds += elapsed
+    slow = SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS
+    if slow:
+        path = "-" if timings is None else timings.path
+        logger.warning("Slow query (%.1f ms) on %s: %s %s", elapsed * 1000, path, sql, params)
+    metrics.observe_query(elapsed, slow)
+
+
+def instrument_queries(database: Database) -> None:
+    # Wraps execute_sql of the instance, every query built by peewee goes through it
+    execute_sql = database.execute_sql
+
+    def timed_execute_sql(sql, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return execute_sql(sql, params, *args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - start, sql, params)
+
+    database.execute_sql = timed_execute_sql
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware, streamed responses are measured until their last chunk and are not buffered.
+    # Server-Timing is sent with the headers, for streamed responses it only covers the work done before them.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings(scope["path"])
+        token = current_request.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                server_timing = (f'db;dur={timings.query_seconds * 1000:.1f};desc="{timings.queries} queries", '
+                                 f'app;dur={elapsed_ms:.1f}')
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing.encode())]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label, so that scanners cannot grow the metrics without bound
+            route_path = "unmatched" if route is None else route.path
+            metrics.observe_request(scope["method"], route_path, status_code, time.perf_counter() - start, timings)
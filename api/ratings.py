@@ -0,0 +1,106 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+from peewee import Case, chunked
+
+from globals import GameState, GameResult, env_int
+from db_models import db, Player, Game, PlayerGame
+from changes import PLAYER, record_changes
+
+ELO_K_FACTOR = env_int("ELO_K_FACTOR", 32)
+UPDATE_CHUNK_SIZE = 1000
+
+
+def rating_delta(winner_elo: int, loser_elo: int, k_factor: int = ELO_K_FACTOR) -> int:
+    expected_score = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
+    return int(round(k_factor * (1 - expected_score)))
+
+
+def rate_results(ratings: Dict[int, int], results: List[Tuple[int, int]], k_factor: int = ELO_K_FACTOR) -> Dict[int, int]:
+    for winner_id, loser_id in results:
+        delta = rating_delta(ratings[winner_id], ratings[loser_id], k_factor)
+        ratings[winner_id] += delta
+        ratings[loser_id] -= delta
+    return ratings
+
+
+def write_ratings(ratings: Dict[int, int]) -> None:
+    for ratings_chunk in chunked(ratings.items(), UPDATE_CHUNK_SIZE):
+        player_ids = [player_id for player_id, _ in ratings_chunk]
+        Player.update(elo=Case(Player.id, ratings_chunk)).where(Player.id.in_(player_ids)).execute()
+
+
+def apply_results(results: List[Tuple[int, int]], k_factor: int = ELO_K_FACTOR) -> Dict[int, int]:
+    # Expects to run inside the transaction writing the games, results are (winner id, loser id) in game order.
+    # The caller records the rating changes along with the games.
+    if len(results) == 0:
+        return {}
+    player_ids = {player_id for result in results for player_id in result}
+    players_query = Player.select(Player.id, Player.elo).where(Player.id.in_(list(player_ids))).order_by(Player.id)
+    # NO KEY UPDATE does not conflict with the key share locks taken on players by the links inserted before
+    lock = "FOR NO KEY UPDATE" if db.for_update else False
+    ratings = rate_results(dict(players_query.for_update(lock).tuples()), results, k_factor)
+    write_ratings(ratings)
+    return ratings
+
+
+def replay(winners: np.ndarray, losers: np.ndarray, ratings: np.ndarray, k_factor: int = ELO_K_FACTOR) -> np.ndarray:
+    # A game only depends on the previous games of its two players, so games are grouped in levels
+    # where no player appears twice and every level is applied with one vectorized step
+    last_level: List[int] = [0] * len(ratings)
+    levels: List[int] = []
+    append_level = levels.append
+    for winner_id, loser_id in zip(winners.tolist(), losers.tolist()):
+        winner_level, loser_level = last_level[winner_id], last_level[loser_id]
+        level = (winner_level if winner_level > loser_level else loser_level) + 1
+        last_level[winner_id] = last_level[loser_id] = level
+        append_level(level)
+
+    ratings = ratings.astype(np.int64)
+    order = np.argsort(np.asarray(levels, dtype=np.int64), kind="stable")
+    level_sizes = np.bincount(np.asarray(levels, dtype=np.int64))[1:]
+    start = 0
+    for size in level_sizes.tolist():
+        games = order[start:start + size]
+        start += size
+        level_winners, level_losers = winners[games], losers[games]
+        expected_scores = 1 / (1 + 10 ** ((ratings[level_losers] - ratings[level_winners]) / 400))
+        deltas = np.rint(k_factor * (1 - expected_scores)).astype(np.int64)
+        ratings[level_winners] += deltas
+        ratings[level_losers] -= deltas
+    return ratings
+
+
+def load_results() -> Tuple[np.ndarray, np.ndarray]:
+    results_query = (PlayerGame.select(PlayerGame.game, PlayerGame.player, PlayerGame.result)
+                     .join(Game)
+                     .where(Game.state == GameState.FINISHED.value,
+                            PlayerGame.result.in_([GameResult.WON.value, GameResult.LOST.value]))
+                     .tuples())
+    rows = np.array(list(results_query), dtype=np.int64).reshape(-1, 3)
+    won = rows[rows[:, 2] == GameResult.WON.value]
+    lost = rows[rows[:, 2] == GameResult.LOST.value]
+    # Games are replayed in creation order, only games with both a winner and a loser count
+    won = won[np.argsort(won[:, 0], kind="stable")]
+    lost = lost[np.argsort(lost[:, 0], kind="stable")]
+    _, won_indexes, lost_indexes = np.intersect1d(won[:, 0], lost[:, 0], assume_unique=True, return_indices=True)
+    return won[won_indexes, 1], lost[lost_indexes, 1]
+
+
+def replay_ratings(k_factor: int = ELO_K_FACTOR) -> dict:
+    with db.atomic():
+        players = np.array(list(Player.select(Player.id, Player.base_elo, Player.elo).for_update(db.for_update).tuples()),
+                           dtype=np.int64).reshape(-1, 3)
+        size = int(players[:, 0].max()) + 1 if len(players) != 0 else 0
+        base_ratings = np.zeros(size, dtype=np.int64)
+        base_ratings[players[:, 0]] = players[:, 1]
+
+        winners, losers = load_results()
+        ratings = replay(winners, losers, base_ratings, k_factor)
+
+        new_ratings = ratings[players[:, 0]]
+        changed = new_ratings != players[:, 2]
+        updated_ratings = dict(zip(players[changed, 0].tolist(), new_ratings[changed].tolist()))
+        write_ratings(updated_ratings)
+        record_changes(PLAYER, updated_ratings.keys())
+    return {"games": len(winners), "players": len(players), "updated_players": int(changed.sum())}
@@ -0,0 +1,160 @@
+import itertools
+import logging
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from typing import List, Optional, Type
+
+from peewee import ConnectionContext, Database, InterfaceError, OperationalError
+
+# Requests sent with this header read from the primary, for clients that must see their own recent writes
+READ_YOUR_WRITES_HEADER = b"x-read-your-writes"
+READ_SOURCE_HEADER = b"x-read-source"
+READ_METHODS = {"GET", "HEAD"}
+LOCKING_CLAUSES = ("FOR UPDATE", "FOR NO KEY UPDATE", "FOR SHARE", "FOR KEY SHARE")
+TRUE_VALUES = (b"1", b"true", b"yes", b"on")
+
+logger = logging.getLogger(__name__)
+
+
+class ReadState:
+    # Where the reads of the current request go, a request that writes keeps every later query on the primary
+    def __init__(self, use_replicas: bool):
+        self.use_replicas = use_replicas
+        self.replica: Optional[Database] = None
+        self.source = "primary"
+
+
+current_reads: ContextVar[Optional[ReadState]] = ContextVar("current_reads", default=None)
+
+
+def is_plain_read(sql: str) -> bool:
+    statement = sql.lstrip()[:6].upper()
+    return statement == "SELECT" and not any(clause in sql.upper() for clause in LOCKING_CLAUSES)
+
+
+class RoutedConnectionContext(ConnectionContext):
+    # Requests that may read from a replica only connect to the primary if one of their queries needs it
+    __slots__ = ()
+
+    def __enter__(self):
+        state = current_reads.get()
+        if (self.db.read_router is None or state is None or not state.use_replicas) and self.db.is_closed():
+            self.db.connect()
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with RoutedConnectionContext(self.db):
+                return fn(*args, **kwargs)
+        return inner
+
+
+class ReadRoutingDatabase:
+    # Mixed into the class of the primary by read_routing(), so that the models bound to it need no change.
+    # Without a read_router every query runs on the primary, replica connections are closed with the primary one.
+    read_router: Optional["ReadRouter"] = None
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        state = current_reads.get()
+        if self.read_router is not None and state is not None and state.use_replicas:
+            cursor = self.read_router.execute_sql(state, sql, params, *args, **kwargs)
+            if cursor is not None:
+                return cursor
+        return super().execute_sql(sql, params, *args, **kwargs)
+
+    def close(self):
+        if self.read_router is not None:
+            self.read_router.close_replicas()
+        return super().close()
+
+    def connection_context(self):
+        return RoutedConnectionContext(self)
+
+
+def read_routing(database_class: Type[Database]) -> Type[Database]:
+    return type(f"ReadRouting{database_class.__name__}", (ReadRoutingDatabase, database_class), {})
+
+
+class ReadRouter:
+    # Sends the reads of read-only requests to the replicas, one replica per request and the next one for the next request.
+    # Writes, reads inside transactions, reads after a write and requests outside ReadRoutingMiddleware use the primary.
+    def __init__(self, primary: Database, replicas: List[Database]):
+        self.primary = primary
+        self.replicas = replicas
+        self._lock = Lock()
+        self._next_index = itertools.cycle(range(len(replicas)))
+
+    def next_replica(self) -> int:
+        with self._lock:
+            return next(self._next_index)
+
+    def reader(self, state: ReadState) -> Database:
+        if state.replica is None:
+            index = self.next_replica()
+            state.replica = self.replicas[index]
+            state.source = f"replica-{index}"
+        return state.replica
+
+    def execute_sql(self, state: ReadState, sql: str, params=None, *args, **kwargs):
+        # Runs a plain read of the request on its replica, None sends the query to the primary
+        if is_plain_read(sql) and not self.primary.in_transaction():
+            replica = self.reader(state)
+            try:
+                return replica.execute_sql(sql, params, *args, **kwargs)
+            except (OperationalError, InterfaceError) as error:
+                # A replica that is down or that cancelled the query for replication stops serving this request
+                logger.warning("Read from %s failed, retrying on the primary: %s", state.source, error)
+                self.discard_connection(replica)
+        state.use_replicas = False
+        state.source = "primary"
+        return None
+
+    def discard_connection(self, replica: Database) -> None:
+        # A pool must not hand the failed connection out again
+        try:
+            if hasattr(replica, "manual_close"):
+                replica.manual_close()
+            else:
+                replica.close()
+        except (OperationalError, InterfaceError):
+            pass
+
+    def close_replicas(self) -> None:
+        for replica in self.replicas:
+            if not replica.is_closed():
+                try:
+                    replica.close()
+                except (OperationalError, InterfaceError):
+                    pass
+
+    def close_all(self) -> None:
+        for replica in self.replicas:
+            if hasattr(replica, "close_all"):
+                replica.close_all()
+
+
+class ReadRoutingMiddleware:
+    # Plain ASGI middleware, only GET and HEAD requests without the read your writes header may read from a replica.
+    # The replica that served the request is named in the X-Read-Source header.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        read_your_writes = dict(scope["headers"]).get(READ_YOUR_WRITES_HEADER)
+        state = ReadState(scope["method"] in READ_METHODS
+                          and (read_your_writes is None or read_your_writes.strip().lower() not in TRUE_VALUES))
+
+        async def send_with_source(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(READ_SOURCE_HEADER, state.source.encode())]
+            await send(message)
+
+        token = current_reads.set(state)
+        try:
+            await self.app(scope, receive, send_with_source)
+        finally:
+            current_reads.reset(token)
@@ -0,0 +1,100 @@
+import hashlib
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Type
+from urllib.parse import urlencode
+
+import orjson
+from fastapi import Request, Response, HTTPException, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from peewee import Query, Field
+
+from globals import env_int
+from db_models import db, BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_PAGE_SIZE = env_int("STREAM_PAGE_SIZE", 1000)
+MAX_PAGE_SIZE = 1000
+GAME_RELATIONS = ("players", "winner")
+
+
+def field_names(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip() != ""]
+
+
+def projection(model: Type[BaseModel], names: Optional[List[str]], extra_names: Tuple[str, ...] = ()) -> List[Field]:
+    if names is None:
+        return model._meta.sorted_fields
+    unknown_names = [name for name in names if name not in model._meta.fields and name not in extra_names]
+    if len(unknown_names) != 0:
+        available_names = list(model._meta.fields) + list(extra_names)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown field(s) {unknown_names}! Available fields are: {available_names}")
+    # The id is the pagination key, so it is always part of the projection
+    return [model.id] + [model._meta.fields[name] for name in names if name in model._meta.fields and name != "id"]
+
+
+def next_page(rows: List[dict], response: Response, limit: Optional[int]) -> List[dict]:
+    # Expects the rows of a keyset query fetching one extra row, like main.keyset
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return rows
+
+
+def variant(request: Request) -> str:
+    # Every projection, page, delta and media type of a listing has its own tag
+    query = urlencode(sorted(request.query_params.multi_items()))
+    media_type = NDJSON_MEDIA_TYPE if wants_ndjson(request) else "application/json"
+    return hashlib.sha1(f"{query} {media_type}".encode()).hexdigest()[:16]
+
+
+def not_modified(request: Request, response: Response, entity: str, version: int) -> Optional[Response]:
+    etag = f'"{entity}-{version}-{variant(request)}"'
+    client_etags = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in client_etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Vary": "Accept"})
+    response.headers["ETag"] = etag
+    response.headers["Vary"] = "Accept"
+    response.headers["X-Change-Version"] = str(version)
+    return None
+
+
+def fast_json(content: Any, response: Response) -> ORJSONResponse:
+    # Returning the response directly skips FastAPI's jsonable_encoder pass, headers set on the sub response are kept
+    return ORJSONResponse(content, headers=dict(response.headers))
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_lines(rows: List[dict]) -> bytes:
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+def ndjson_pages(query: Query, model: Type[BaseModel], limit: Optional[int], after: Optional[int],
+                 transform: Optional[Callable[[List[dict]], Any]] = None) -> Iterator[bytes]:
+    # Pages are fetched by id, each with a connection of the thread producing it, so memory stays bounded by the page
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = STREAM_PAGE_SIZE if remaining is None else min(STREAM_PAGE_SIZE, remaining)
+        page_query = query.order_by(model.id).limit(page_size)
+        if after is not None:
+            page_query = page_query.where(model.id > after)
+        with db.connection_context():
+            rows: List[dict] = list(page_query.dicts().iterator())
+            if transform is not None and len(rows) != 0:
+                transform(rows)
+        if len(rows) == 0:
+            return
+        yield ndjson_lines(rows)
+        after = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < page_size:
+            return
+
+
+def ndjson_response(rows: Iterator[bytes], response: Response) -> StreamingResponse:
+    return StreamingResponse(rows, media_type=NDJSON_MEDIA_TYPE, headers=dict(response.headers))
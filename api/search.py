@@ -0,0 +1,138 @@
+import heapq
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from peewee import PostgresqlDatabase, fn
+
+from db_models import db, Player
+from changes import PLAYER, current_version, changed_ids
+
+SEARCH_MAX_LIMIT = 100
+# Shorter queries match name prefixes only, trigram indexes cannot serve them as substrings
+SUBSTRING_MIN_LENGTH = 3
+
+
+class TrieNode:
+    __slots__ = ("children", "player_ids")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.player_ids: set = set()
+
+
+class NameIndex:
+    # In-memory search for databases without pg_trgm: a trie of lowercased names answers prefix queries,
+    # substring matches are scanned only when prefixes do not fill the page.
+    # It follows the change log, so writes of every process are visible to the next search.
+    def __init__(self):
+        self._lock = Lock()
+        self._root = TrieNode()
+        self._players: Dict[int, dict] = {}
+        self._names: Dict[int, str] = {}
+        self._version: Optional[int] = None
+
+    def _add(self, player: dict) -> None:
+        self._remove(player["id"])
+        name = player["name"].lower()
+        node = self._root
+        for character in name:
+            node = node.children.setdefault(character, TrieNode())
+        node.player_ids.add(player["id"])
+        self._players[player["id"]] = player
+        self._names[player["id"]] = name
+
+    def _remove(self, player_id: int) -> None:
+        name = self._names.pop(player_id, None)
+        if name is None:
+            return
+        del self._players[player_id]
+        path = [self._root]
+        for character in name:
+            path.append(path[-1].children[character])
+        path[-1].player_ids.discard(player_id)
+        # Prunes the branch the name leaves empty
+        for depth in range(len(name), 0, -1):
+            node = path[depth]
+            if len(node.player_ids) != 0 or len(node.children) != 0:
+                break
+            del path[depth - 1].children[name[depth - 1]]
+
+    def _refresh(self) -> None:
+        version = current_version(PLAYER)
+        if version == self._version:
+            return
+        if self._version is None:
+            player_ids = None
+            players_query = Player.select(Player.id, Player.name, Player.elo)
+        else:
+            player_ids = changed_ids(PLAYER, self._version)
+            players_query = Player.select(Player.id, Player.name, Player.elo).where(Player.id.in_(player_ids))
+        players = list(players_query.dicts())
+        for player in players:
+            self._add(player)
+        if player_ids is not None:
+            for player_id in set(player_ids) - {player["id"] for player in players}:
+                self._remove(player_id)
+        self._version = version
+
+    def _prefix_matches(self, query: str, limit: int) -> List[int]:
+        node = self._root
+        for character in query:
+            node = node.children.get(character)
+            if node is None:
+                return []
+        # Breadth first, so names come shortest first like in the SQL ranking
+        matches: List[int] = []
+        level = [node]
+        while len(level) != 0 and len(matches) < limit:
+            matches.extend(sorted(player_id for level_node in level for player_id in level_node.player_ids))
+            level = [child for level_node in level for child in level_node.children.values()]
+        return matches[:limit]
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        query = query.lower()
+        with self._lock:
+            self._refresh()
+            player_ids = self._prefix_matches(query, limit)
+            if len(query) >= SUBSTRING_MIN_LENGTH and len(player_ids) < limit:
+                substring_matches: List[Tuple[int, int, int]] = []
+                for player_id, name in self._names.items():
+                    position = name.find(query)
+                    if position > 0:
+                        substring_matches.append((position, len(name), player_id))
+                player_ids += [player_id for _, _, player_id in heapq.nsmallest(limit - len(player_ids), substring_matches)]
+            return [dict(self._players[player_id]) for player_id in player_ids]
+
+
+name_index = NameIndex()
+_search_indexes_ready: Optional[bool] = None
+
+
+def search_indexes_ready() -> bool:
+    # Checked once per process, the schema is migrated before requests are served
+    global _search_indexes_ready
+    if _search_indexes_ready is None:
+        _search_indexes_ready = (isinstance(db, PostgresqlDatabase)
+                                 and db.execute_sql("SELECT 1 FROM pg_indexes WHERE indexname = %s",
+                                                    ("player_name_trgm",)).fetchone() is not None)
+    return _search_indexes_ready
+
+
+def escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_players(query: str, limit: int) -> List[dict]:
+    # Ranked by where the name matches, then by length, so prefixes and the closest names come first
+    query = query.lower()
+    if not search_indexes_ready():
+        return name_index.search(query, limit)
+    lowered_name = fn.LOWER(Player.name)
+    pattern = escape_like(query) + "%"
+    if len(query) >= SUBSTRING_MIN_LENGTH:
+        pattern = "%" + pattern
+    search_query = (Player.select(Player.id, Player.name, Player.elo)
+                    .where(lowered_name % pattern)
+                    .order_by(fn.STRPOS(lowered_name, query), fn.LENGTH(Player.name), Player.id)
+                    .limit(limit))
+    return list(search_query.dicts())
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from peewee import EXCLUDED, Case, fn, chunked
+
+from globals import GameResult
+from db_models import db, Player, PlayerGame, PlayerStats
+
+COUNT_FIELDS = [PlayerStats.games, PlayerStats.unplayed, PlayerStats.playing, PlayerStats.won, PlayerStats.lost, PlayerStats.aborted]
+RESULT_FIELDS = {
+    GameResult.UNPLAYED.value: PlayerStats.unplayed,
+    GameResult.PLAYING.value: PlayerStats.playing,
+    GameResult.WON.value: PlayerStats.won,
+    GameResult.LOST.value: PlayerStats.lost,
+    GameResult.ABORTED.value: PlayerStats.aborted,
+}
+UPSERT_CHUNK_SIZE = 1000
+
+
+def empty_counts() -> Dict[str, int]:
+    return {field.name: 0 for field in COUNT_FIELDS}
+
+
+def apply_counts(counts: Dict[int, Dict[str, int]]) -> None:
+    # Rows are locked in player order, so that concurrent transactions cannot deadlock on them
+    rows = [{"player": player_id, **counts[player_id]} for player_id in sorted(counts)]
+    for rows_chunk in chunked(rows, UPSERT_CHUNK_SIZE):
+        (PlayerStats.insert_many(rows_chunk)
+         .on_conflict(conflict_target=[PlayerStats.player],
+                      update={field: field + getattr(EXCLUDED, field.column_name) for field in COUNT_FIELDS})
+         .execute())
+
+
+def count_links(links: Iterable[Tuple[int, int, int]]) -> Dict[int, Dict[str, int]]:
+    # Links are (player id, result, count) triples, negative counts take links away
+    counts: Dict[int, Dict[str, int]] = defaultdict(empty_counts)
+    for player_id, result, links_count in links:
+        counts[player_id]["games"] += links_count
+        counts[player_id][RESULT_FIELDS[result].name] += links_count
+    return counts
+
+
+def add_links(links: Iterable[Tuple[int, int]]) -> None:
+    # Expects to run inside the transaction writing the links, links are (player id, result) pairs
+    apply_counts(count_links((player_id, result, 1) for player_id, result in links))
+
+
+def remove_games(game_ids: List[int]) -> None:
+    # Expects to run inside the transaction deleting the games, before their links are gone
+    links_query = (PlayerGame.select(PlayerGame.player, PlayerGame.result, fn.COUNT(PlayerGame.id))
+                   .where(PlayerGame.game.in_(game_ids))
+                   .group_by(PlayerGame.player, PlayerGame.result)
+                   .tuples())
+    apply_counts(count_links((player_id, result, -links_count) for player_id, result, links_count in links_query))
+
+
+def rebuild_stats() -> int:
+    result_counts = [fn.SUM(Case(PlayerGame.result, [(result, 1)], 0)) for result in RESULT_FIELDS]
+    aggregate_query = (PlayerGame.select(PlayerGame.player, fn.COUNT(PlayerGame.id), *result_counts)
+                       .group_by(PlayerGame.player))
+    with db.atomic():
+        PlayerStats.delete().execute()
+        PlayerStats.insert_from(aggregate_query, [PlayerStats.player, PlayerStats.games, *RESULT_FIELDS.values()]).execute()
+        return PlayerStats.select().count()
+
+
+def player_stats(player_id: int) -> Optional[dict]:
+    stats: List[dict] = list(PlayerStats.select().where(PlayerStats.player == player_id).dicts())
+    if len(stats) != 0:
+        return stats[0]
+    if not Player.select().where(Player.id == player_id).exists():
+        return None
+    return {"player": player_id, **empty_counts()}
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import IsolatedAsyncioTestCase, mock
+
+os.environ.setdefault("DB_ENGINE", "sqlite")
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "test.db"))
+
+import httpx
+from fastapi.testclient import TestClient
+
+import events
+from events import ChangeHub, hub
+from main import app
+
+
+def parse_frame(frame: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return {"event": fields["event"], **json.loads(fields["data"])}
+
+
+class TestChangeHub(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.hub = ChangeHub(queue_size=2)
+        self.hub.bind(asyncio.get_running_loop())
+        self.subscriber = self.hub.subscribe()
+
+    async def dispatched(self):
+        # Publishing hands events over with call_soon_threadsafe
+        await asyncio.sleep(0)
+
+    async def test_publish_reaches_subscribers(self):
+        other = self.hub.subscribe()
+        self.hub.publish("player", "upserted", [1, 2], 7)
+        await self.dispatched()
+        for subscriber in (self.subscriber, other):
+            self.assertEqual(subscriber.get_nowait(), {"type": "change", "entity": "player", "action": "upserted",
+                                                       "ids": [1, 2], "version": 7})
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        for version in range(3):
+            self.hub.publish("game", "deleted", [version], version)
+        await self.dispatched()
+        self.assertEqual(self.subscriber.get_nowait(), {"type": "resync"})
+        self.assertTrue(self.subscriber.empty())
+
+    async def test_stream_frames_and_keep_alive(self):
+        stream = self.hub.stream(self.subscriber)
+        self.hub.publish("player", "deleted", [3], 8)
+        self.assertEqual(parse_frame(await anext(stream)),
+                         {"event": "change", "type": "change", "entity": "player", "action": "deleted", "ids": [3], "version": 8})
+        with mock.patch.object(events, "EVENTS_KEEP_ALIVE", 0.01):
+            self.assertEqual(await anext(stream), ": keep-alive\n\n")
+        await stream.aclose()
+        self.hub.publish("player", "deleted", [4], 9)
+        await self.dispatched()
+        self.assertTrue(self.subscriber.empty())
+
+
+class TestEventsRoute(IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Runs the lifespan once, which creates the schema
+        with TestClient(app):
+            pass
+
+    async def test_created_player_is_streamed(self):
+        # TestClient reads whole bodies, so the endless stream is read straight from the ASGI app
+        hub.bind(asyncio.get_running_loop())
+        self.addCleanup(hub.bind, None)
+        frames: asyncio.Queue = asyncio.Queue()
+        headers = {}
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message: dict):
+            if message["type"] == "http.response.start":
+                headers.update((key.decode(), value.decode()) for key, value in message["headers"])
+            elif message["body"] != b"":
+                await frames.put(message["body"].decode())
+
+        scope = {"type": "http", "method": "GET", "path": "/events", "raw_path": b"/events", "query_string": b"",
+                 "headers": [], "http_version": "1.1", "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+                 "root_path": ""}
+        stream = asyncio.create_task(app(scope, receive, send))
+        self.addCleanup(stream.cancel)
+        while len(hub._subscribers) == 0:
+            await asyncio.sleep(0.01)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            player = (await client.post("/player", json={"name": f"events-{uuid.uuid4().hex[:8]}", "elo": 1000})).json()
+        event = parse_frame(await asyncio.wait_for(frames.get(), timeout=5))
+        self.assertTrue(headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual((event["event"], event["entity"], event["action"], event["ids"]), ("change", "player", "upserted", [player["id"]]))
+        self.assertIsNotNone(event["version"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import TestCase, mock
+
+os.environ.setdefault("DB_ENGINE", "sqlite")
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from fastapi.testclient import TestClient
+
+import main
+import responses
+from globals import GameState
+from db_models import db
+from responses import NDJSON_MEDIA_TYPE
+from main import app
+
+
+class TestGames(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Entering the client runs the lifespan, which creates the schema
+        cls.client = cls.enterClassContext(TestClient(app))
+        cls.players = [cls.client.post("/player", json={"name": f"games-{i}", "elo": 1000}).json() for i in range(4)]
+
+    def create_games(self, count: int):
+        first, second = self.players[0], self.players[1]
+        games = [{"state": GameState.FINISHED.value, "players": [first, second], "winner": first} for _ in range(count)]
+        self.client.post("/games/batch", json=games)
+
+    def count_queries(self, path: str) -> int:
+        with mock.patch.object(db, "execute_sql", wraps=db.execute_sql) as execute_sql:
+            self.client.get(path)
+        return execute_sql.call_count
+
+    def test_game_listing_query_count_does_not_grow(self):
+        self.create_games(2)
+        few_games = self.count_queries("/games")
+        self.create_games(50)
+        many_games = self.count_queries("/games")
+        self.assertEqual(few_games, many_games)
+        self.assertEqual(self.count_queries("/games?limit=5"), many_games)
+
+    def test_game_has_players_and_winner(self):
+        self.create_games(1)
+        game = self.client.get("/games").json()[-1]
+        self.assertEqual([player["id"] for player in game["players"]], [self.players[0]["id"], self.players[1]["id"]])
+        self.assertEqual(game["winner"]["id"], self.players[0]["id"])
+        self.assertEqual(self.client.get(f"/games/{game['id']}").json(), game)
+
+    def test_game_projection(self):
+        self.create_games(1)
+        game = self.client.get("/games?fields=state").json()[-1]
+        self.assertEqual(set(game), {"id", "state"})
+        self.assertEqual(self.client.get("/games/0").status_code, 404)
+
+    def test_keyset_pages(self):
+        for i in range(5):
+            self.client.post("/player", json={"name": f"games-page-{i}", "elo": 1000})
+        all_ids = [player["id"] for player in self.client.get("/players").json()]
+        page_ids, after = [], None
+        while True:
+            response = self.client.get("/players", params={"limit": 2} if after is None else {"limit": 2, "after": after})
+            page_ids += [player["id"] for player in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            after = int(response.headers["X-Next-Cursor"])
+            self.assertEqual(after, page_ids[-1])
+        self.assertEqual(page_ids, sorted(all_ids))
+        self.assertEqual(self.client.get("/players", params={"limit": 1, "after": all_ids[-1]}).json(), [])
+        self.assertEqual(self.client.get("/players", params={"limit": 0}).status_code, 422)
+
+    def test_ndjson_listings(self):
+        self.create_games(3)
+        for path in ("/players", "/games"):
+            rows = self.client.get(path).json()
+            with mock.patch.object(responses, "STREAM_PAGE_SIZE", 2):
+                response = self.client.get(path, headers={"Accept": NDJSON_MEDIA_TYPE})
+            self.assertTrue(response.headers["content-type"].startswith(NDJSON_MEDIA_TYPE))
+            lines = response.text.splitlines()
+            # Pages of 2 rows are streamed, one object per line in id order
+            self.assertGreater(len(lines), 2)
+            self.assertEqual([json.loads(line) for line in lines], rows)
+            with mock.patch.object(responses, "STREAM_PAGE_SIZE", 2):
+                limited = self.client.get(path, params={"limit": 3}, headers={"Accept": NDJSON_MEDIA_TYPE}).text.splitlines()
+            self.assertEqual([json.loads(line) for line in limited], rows[:3])
+
+    def test_conditional_and_delta_listing(self):
+        response = self.client.get("/players")
+        etag, version = response.headers["ETag"], int(response.headers["X-Change-Version"])
+        self.assertEqual(self.client.get("/players", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.client.get("/players?fields=name", headers={"If-None-Match": etag}).status_code, 200)
+
+        created_player = self.client.post("/player", json={"name": "games-deleted", "elo": 0}).json()
+        self.client.request("DELETE", "/players", json=[created_player["id"], created_player["id"]])
+        players_delta = self.client.get(f"/players?since={version}").json()
+        self.assertEqual(players_delta["upserted"], [])
+        self.assertEqual(players_delta["deleted"], [created_player["id"]])
+        self.assertNotEqual(self.client.get("/players", headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_request_metrics(self):
+        self.create_games(3)
+        server_timing = self.client.get("/games/1").headers["Server-Timing"]
+        self.assertRegex(server_timing, r'db;dur=[0-9.]+;desc="[1-9][0-9]* queries", app;dur=[0-9.]+')
+        exposition = self.client.get("/metrics").text
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/games/{game_id}"}', exposition)
+        self.assertIn('http_request_db_queries_total{method="GET",route="/games/{game_id}"}', exposition)
+
+    def test_delete_player_with_history(self):
+        first, second = [self.client.post("/player", json={"name": f"games-history-{i}", "elo": 1000}).json() for i in range(2)]
+        game = {"state": GameState.FINISHED.value, "players": [first, second], "winner": first}
+        game_id = self.client.post("/games/batch", json=[game]).json()["results"][0]["id"]
+        self.assertEqual(self.client.request("DELETE", "/players", json=[first["id"]]).status_code, 200)
+        self.assertEqual([player["id"] for player in self.client.get(f"/games/{game_id}").json()["players"]], [second["id"]])
+        self.assertEqual(self.client.request("DELETE", "/games", json=[game_id]).status_code, 200)
+        self.assertEqual(self.client.get(f"/players/{second['id']}/stats").json()["games"], 0)
+
+    def test_large_delete_runs_as_a_job(self):
+        player_ids = [self.client.post("/player", json={"name": f"games-job-{i}", "elo": 1000}).json()["id"] for i in range(5)]
+        with mock.patch.object(main, "DELETE_JOB_THRESHOLD", 2):
+            response = self.client.request("DELETE", "/players", json=player_ids)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers["Location"], f"/jobs/{response.json()['id']}")
+        deadline = time.monotonic() + 10
+        job = response.json()
+        while job["status"] in ("pending", "running") and time.monotonic() < deadline:
+            time.sleep(0.01)
+            job = self.client.get(response.headers["Location"]).json()
+        self.assertEqual((job["kind"], job["status"], job["done"], job["total"]), ("delete_players", "done", 5, 5))
+        remaining_ids = {player["id"] for player in self.client.get("/players").json()}
+        self.assertEqual(remaining_ids & set(player_ids), set())
+        self.assertEqual(self.client.get("/jobs/unknown").status_code, 404)
+
+    def test_rebuilt_stats_match_incremental_ones(self):
+        players = [self.client.post("/player", json={"name": f"games-stats-{i}", "elo": 1000}).json() for i in range(4)]
+        games = [{"state": state.value, "players": pair, "winner": pair[0] if state == GameState.FINISHED else None}
+                 for state in GameState for pair in (players[:2], players[1:3], players[2:])]
+        game_ids = [result["id"] for result in self.client.post("/games/batch", json=games).json()["results"]]
+        # Every game of the first player is deleted
+        self.client.request("DELETE", "/games", json=game_ids[::3])
+        self.client.request("DELETE", "/players", json=[players[3]["id"]])
+        player_ids = {player["id"] for player in players}
+
+        def stats() -> list:
+            # A player left without games keeps a row of zeros incrementally and has no row after a rebuild,
+            # /players/{id}/stats answers zeros for both
+            return [row for row in self.client.get("/stats").json() if row["player"] in player_ids and row["games"] != 0]
+
+        incremental = stats()
+        self.assertEqual(len(incremental), 2)
+        self.assertGreater(self.client.post("/stats/rebuild").json()["players"], 0)
+        self.assertEqual(stats(), incremental)
+
+    def test_player_search(self):
+        names = ["search-zed", "Search-Zeta", "search-zetamax", "research-zeta"]
+        created = {name: self.client.post("/player", json={"name": name, "elo": 1000}).json()["id"] for name in names}
+
+        def search(query: str):
+            return [player["name"] for player in self.client.get("/players/search", params={"q": query}).json()]
+
+        self.assertEqual(search("search-ze"), ["search-zed", "Search-Zeta", "search-zetamax", "research-zeta"])
+        self.assertEqual(search("zeta"), ["Search-Zeta", "search-zetamax", "research-zeta"])
+        self.assertEqual(search("re"), ["research-zeta"])
+        self.client.request("DELETE", "/players", json=[created["Search-Zeta"]])
+        self.assertEqual(search("zeta"), ["search-zetamax", "research-zeta"])
+        self.assertEqual(self.client.get("/players/search", params={"q": " "}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import random
+import tempfile
+import unittest
+from typing import List
+from unittest import TestCase
+
+os.environ.setdefault("DB_ENGINE", "sqlite")
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from fastapi.testclient import TestClient
+from peewee import Query, SqliteDatabase, chunked
+
+from globals import GameState, GameResult
+from db_models import db, Player, Game, PlayerGame
+from history import player_games_query, head_to_head_query
+from main import app
+
+SEEDED_PLAYERS = 1000
+SEEDED_GAMES = 20000
+
+
+def sequential_scans(query: Query) -> List[str]:
+    sql, params = query.sql()
+    if isinstance(db, SqliteDatabase):
+        plan = [row[-1] for row in db.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+        return [step for step in plan if step.startswith("SCAN")]
+    plan = [row[0] for row in db.execute_sql(f"EXPLAIN {sql}", params)]
+    return [step for step in plan if "Seq Scan" in step]
+
+
+class TestHistory(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = cls.enterClassContext(TestClient(app))
+        cls.players = [cls.client.post("/player", json={"name": f"history-{i}", "elo": 1000}).json() for i in range(3)]
+
+    def post_game(self, state: GameState, players: List[dict], winner: dict = None) -> int:
+        game = {"state": state.value, "players": players, "winner": winner}
+        return self.client.post("/games/batch", json=[game]).json()["results"][0]["id"]
+
+    def test_history_and_head_to_head(self):
+        first, second, third = self.players
+        game_ids = [self.post_game(GameState.FINISHED, [first, second], first),
+                    self.post_game(GameState.FINISHED, [first, second], second),
+                    self.post_game(GameState.ABORTED, [first, third]),
+                    self.post_game(GameState.FINISHED, [second, first], first)]
+
+        response = self.client.get(f"/players/{first['id']}/games", params={"limit": 3})
+        self.assertEqual([game["id"] for game in response.json()], game_ids[:3])
+        after = response.headers["X-Next-Cursor"]
+        last_page = self.client.get(f"/players/{first['id']}/games", params={"limit": 3, "after": after})
+        self.assertEqual([game["id"] for game in last_page.json()], game_ids[3:])
+        self.assertNotIn("X-Next-Cursor", last_page.headers)
+        won = self.client.get(f"/players/{first['id']}/games", params={"result": GameResult.WON.value}).json()
+        self.assertEqual([game["id"] for game in won], [game_ids[0], game_ids[3]])
+        self.assertEqual(won[0]["winner"]["id"], first["id"])
+
+        head_to_head = self.client.get(f"/players/{first['id']}/vs/{second['id']}").json()
+        self.assertEqual((head_to_head["record"]["games"], head_to_head["record"]["won"], head_to_head["record"]["lost"]), (3, 2, 1))
+        self.assertEqual([game["id"] for game in head_to_head["games"]], [game_ids[0], game_ids[1], game_ids[3]])
+        self.assertEqual(self.client.get(f"/players/{first['id']}/vs/{first['id']}").status_code, 400)
+        self.assertEqual(self.client.get(f"/players/{first['id']}/vs/0").status_code, 404)
+        self.assertEqual(self.client.get("/players/0/games").status_code, 404)
+
+    def test_history_queries_use_indexes(self):
+        generator = random.Random(0)
+        with db.connection_context(), db.atomic():
+            player_ids = [player_id for player_id, in Player.insert_many(
+                [(f"history-seed-{i}", 1000, 1000) for i in range(SEEDED_PLAYERS)],
+                fields=[Player.name, Player.elo, Player.base_elo]).returning(Player.id).tuples().execute()]
+            game_ids = [game_id for game_id, in Game.insert_many(
+                [(GameState.FINISHED.value,) for _ in range(SEEDED_GAMES)],
+                fields=[Game.state]).returning(Game.id).tuples().execute()]
+            links = []
+            for game_id in game_ids:
+                winner, loser = generator.sample(player_ids, 2)
+                links += [(winner, game_id, GameResult.WON.value), (loser, game_id, GameResult.LOST.value)]
+            for links_chunk in chunked(links, 1000):
+                PlayerGame.insert_many(links_chunk, fields=[PlayerGame.player, PlayerGame.game, PlayerGame.result]).execute()
+        with db.connection_context():
+            db.execute_sql("ANALYZE")
+            player_id, opponent_id = player_ids[:2]
+            queries = [player_games_query(player_id, None, None, None, 50),
+                       player_games_query(player_id, GameState.FINISHED, GameResult.WON, game_ids[0], 50),
+                       player_games_query(player_id, None, None, None, 50, opponent_id),
+                       head_to_head_query(player_id, opponent_id)]
+            for query in queries:
+                self.assertEqual(sequential_scans(query), [], query.sql()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from contextlib import ExitStack
+from threading import Event
+from typing import List
+from unittest import TestCase, mock
+
+os.environ.setdefault("DB_ENGINE", "sqlite")
+os.environ.setdefault("DB_NAME", os.path.join(tempfile.mkdtemp(), "test.db"))
+
+from fastapi.testclient import TestClient
+from peewee import OperationalError
+
+import main
+from globals import GameState
+from db_models import db
+from http_models import ExistingPlayer, Game as HTTPGame
+from ingest import RETRY_AFTER_SECONDS, WriteBehindQueue
+
+
+def game() -> HTTPGame:
+    players = [ExistingPlayer(id=player_id, name=f"player{player_id}", elo=1000) for player_id in (1, 2)]
+    return HTTPGame(state=GameState.PLAYING, players=players)
+
+
+class TestWriteBehindQueue(TestCase):
+    def setUp(self):
+        self.batches: List[int] = []
+        self.written = Event()
+        self.written.set()
+
+    def create_games(self, games: List[HTTPGame]) -> List[dict]:
+        self.written.wait()
+        self.batches.append(len(games))
+        return [{"id": len(self.batches) * 100 + index} for index in range(len(games))]
+
+    def test_batches_by_size_and_drains_on_stop(self):
+        queue = WriteBehindQueue(self.create_games, size=100, batch_size=2, flush_ms=60000)
+        queue.start()
+        receipts = [queue.submit(game()) for _ in range(5)]
+        queue.stop()
+        self.assertEqual(self.batches, [2, 2, 1])
+        self.assertEqual([receipt.status for receipt in receipts], ["created"] * 5)
+        self.assertEqual(queue.get(receipts[2].id).game, 200)
+        self.assertIsNone(queue.submit(game()))
+
+    def test_flushes_after_delay(self):
+        queue = WriteBehindQueue(self.create_games, size=100, batch_size=1000, flush_ms=10)
+        queue.start()
+        self.addCleanup(queue.stop)
+        receipt = queue.submit(game())
+        for _ in range(100):
+            if receipt.status != "queued":
+                break
+            time.sleep(0.01)
+        self.assertEqual(receipt.status, "created")
+
+    def test_full_queue_refuses_games(self):
+        self.written.clear()
+        queue = WriteBehindQueue(self.create_games, size=2, batch_size=1, flush_ms=0)
+        queue.start()
+        first = queue.submit(game())
+        # The first game is being written and blocks the writer, two more fill the queue
+        while len(queue) != 0:
+            time.sleep(0.001)
+        self.assertIsNotNone(queue.submit(game()))
+        self.assertIsNotNone(queue.submit(game()))
+        self.assertIsNone(queue.submit(game()))
+        self.written.set()
+        queue.stop()
+        self.assertEqual(first.status, "created")
+        self.assertEqual(self.batches, [1, 1, 1])
+
+
+class TestWriteBehindRoutes(TestCase):
+    def setUp(self):
+        # Closing the server runs the shutdown of the lifespan, a second close does nothing
+        self.server = ExitStack()
+        self.addCleanup(self.server.close)
+        self.server.enter_context(mock.patch.object(main, "WRITE_BEHIND", True))
+        self.client = self.server.enter_context(TestClient(main.app))
+        prefix = uuid.uuid4().hex[:8]
+        self.players = [self.client.post("/player", json={"name": f"ingest-{prefix}-{i}", "elo": 1000}).json()
+                        for i in range(2)]
+
+    def post_game(self, players: List[dict], winner: dict = None) -> dict:
+        state = GameState.FINISHED if winner is not None else GameState.PLAYING
+        response = self.client.post("/game", json={"state": state.value, "players": players, "winner": winner})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers["Location"], f"/games/receipts/{response.json()['id']}")
+        return response.json()
+
+    def written_receipt(self, receipt_id: str) -> dict:
+        for _ in range(200):
+            receipt = self.client.get(f"/games/receipts/{receipt_id}").json()
+            if receipt["status"] != "queued":
+                return receipt
+            time.sleep(0.01)
+        self.fail("The game was never written")
+
+    def test_accepted_game_is_written(self):
+        receipt = self.written_receipt(self.post_game(self.players, self.players[0])["id"])
+        self.assertEqual(receipt["status"], "created")
+        game = self.client.get(f"/games/{receipt['game']}").json()
+        self.assertEqual(game["winner"]["id"], self.players[0]["id"])
+        self.assertGreater(self.client.get(f"/leaderboard/{self.players[0]['id']}").json()["elo"], 1000)
+        self.assertEqual(self.client.get("/games/receipts/unknown").status_code, 404)
+
+    def test_game_of_missing_player_fails_its_receipt(self):
+        missing_player = {"id": 0, "name": "missing", "elo": 1000}
+        receipt = self.written_receipt(self.post_game([self.players[0], missing_player])["id"])
+        self.assertEqual(receipt["status"], "failed")
+        self.assertEqual(receipt["status_code"], 404)
+
+    def test_full_queue_asks_to_retry(self):
+        with mock.patch.object(main.write_behind, "size", 0):
+            response = self.client.post("/game", json={"state": GameState.PLAYING.value, "players": self.players})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], str(RETRY_AFTER_SECONDS))
+
+    def test_shutdown_drains_queue(self):
+        with mock.patch.object(main.write_behind, "flush_ms", 60000):
+            receipt_ids = [self.post_game(self.players)["id"] for _ in range(3)]
+            self.assertEqual(len(main.write_behind), 3)
+            self.server.close()
+        self.assertEqual([main.write_behind.get(receipt_id).status for receipt_id in receipt_ids], ["created"] * 3)
+
+    def test_rolled_back_batch_is_not_published(self):
+        with mock.patch.object(main, "publish_created_games") as publish_created_games, \
+                mock.patch.object(db, "commit", side_effect=OperationalError("disk I/O error")), \
+                self.assertLogs("ingest"):
+            receipt = self.written_receipt(self.post_game(self.players, self.players[0])["id"])
+        self.assertEqual(receipt["status_code"], 500)
+        publish_created_games.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
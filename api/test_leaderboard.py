@@ -0,0 +1,62 @@
+import unittest
+from threading import Thread
+from typing import List
+from unittest import TestCase, mock
+
+from leaderboard import Leaderboard
+
+
+def players(*elos: int) -> List[dict]:
+    return sorted(({"id": player_id, "name": f"player{player_id}", "elo": elo} for player_id, elo in enumerate(elos, 1)),
+                  key=lambda player: (-player["elo"], player["id"]))
+
+
+class TestLeaderboard(TestCase):
+    def setUp(self):
+        self.leaderboard = Leaderboard(ttl=60)
+        self.load = self.enterContext(mock.patch.object(self.leaderboard, "_load", return_value=players(1000, 1200, 1000, 900)))
+
+    def ranking(self) -> List[tuple]:
+        return [(entry["rank"], entry["id"]) for entry in self.leaderboard.top(10)]
+
+    def test_top_and_tied_ranks(self):
+        self.assertEqual(self.ranking(), [(1, 2), (2, 1), (2, 3), (4, 4)])
+        self.assertEqual([entry["id"] for entry in self.leaderboard.top(2, offset=1)], [1, 3])
+        self.assertEqual(self.leaderboard.rank(3)["rank"], 2)
+        self.assertIsNone(self.leaderboard.rank(5))
+        self.assertEqual(self.load.call_count, 1)
+
+    def test_writes_patch_the_ranking(self):
+        self.leaderboard.top(1)
+        self.leaderboard.upsert(5, "player5", 1100)
+        self.leaderboard.remove([2])
+        self.leaderboard.update_ratings({1: 1016, 3: 984})
+        self.assertEqual(self.ranking(), [(1, 5), (2, 1), (3, 3), (4, 4)])
+        self.assertEqual(self.leaderboard.rank(1)["elo"], 1016)
+        # A player unknown to this process makes the next read load them all again
+        self.leaderboard.update_ratings({6: 1000})
+        self.leaderboard.top(1)
+        self.assertEqual(self.load.call_count, 2)
+
+    def test_writes_during_a_load_are_replayed(self):
+        def load() -> List[dict]:
+            # Another thread writes while the players are read, it must not wait for the load
+            writer = Thread(target=self.leaderboard.update_ratings, args=({1: 1300},))
+            writer.start()
+            writer.join(timeout=5)
+            self.assertFalse(writer.is_alive())
+            return players(1000, 1200)
+
+        self.load.side_effect = load
+        self.assertEqual(self.ranking(), [(1, 1), (2, 2)])
+        self.assertEqual(self.leaderboard.rank(1)["elo"], 1300)
+
+    def test_expired_ranking_is_loaded_again(self):
+        self.leaderboard.top(1)
+        self.leaderboard.ttl = 0
+        self.load.return_value = players(800)
+        self.assertEqual(self.ranking(), [(1, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest import TestCase
+
+from http_models import ExistingPlayer
+from matchmaking import MatchmakingQueue, Matchmaker
+
+
+def player(player_id: int, elo: int) -> ExistingPlayer:
+    return ExistingPlayer(id=player_id, name=f"player{player_id}", elo=elo)
+
+
+class TestMatchmakingQueue(TestCase):
+    def test_enqueue_pairs_nearest_player_in_window(self):
+        queue = MatchmakingQueue(base_window=50, window_growth=10, max_window=100)
+        self.assertIsNone(queue.enqueue(player(1, 1000), now=0))
+        self.assertIsNone(queue.enqueue(player(2, 1200), now=0))
+        pair = queue.enqueue(player(3, 1030), now=0)
+        self.assertEqual([opponent.id for opponent in pair], [1, 3])
+        self.assertEqual(len(queue), 1)
+        self.assertTrue(queue.is_paired(3))
+
+    def test_window_widens_while_waiting(self):
+        queue = MatchmakingQueue(base_window=50, window_growth=10, max_window=100)
+        queue.enqueue(player(1, 1000), now=0)
+        queue.enqueue(player(2, 1080), now=0)
+        self.assertEqual(queue.sweep(now=2), [])
+        self.assertEqual([[opponent.id for opponent in pair] for pair in queue.sweep(now=3)], [[1, 2]])
+        queue.enqueue(player(3, 1000), now=3)
+        queue.enqueue(player(4, 1500), now=3)
+        self.assertEqual(queue.sweep(now=1000), [])
+
+    def test_remove_and_take_pairs(self):
+        queue = MatchmakingQueue(base_window=50, window_growth=10, max_window=100)
+        queue.enqueue(player(1, 1000), now=0)
+        self.assertTrue(queue.remove(1))
+        self.assertFalse(queue.remove(1))
+        queue.enqueue(player(2, 1000), now=0)
+        queue.enqueue(player(3, 1000), now=0)
+        self.assertEqual(len(queue.take_pairs(10)), 1)
+        self.assertFalse(queue.is_paired(2))
+        self.assertIsNone(queue.waiting_since(2))
+
+
+class TestMatchmaker(TestCase):
+    def test_failed_pairs_requeue_existing_players(self):
+        deleted_ids = {3}
+
+        def create_games(games):
+            # Like main.create_consistent_games, games with a deleted player fail alone
+            return [{"status_code": 404} if any(player.id in deleted_ids for player in game.players) else {"id": 100 + index}
+                    for index, game in enumerate(games)]
+
+        queue = MatchmakingQueue(base_window=50, window_growth=10, max_window=100)
+        matchmaker = Matchmaker(create_games, lambda player_ids: set(player_ids) - deleted_ids, queue, max_matches=3)
+        for player_id in range(1, 5):
+            queue.enqueue(player(player_id, 1000 + player_id * 100), now=0)
+        self.assertEqual(matchmaker.create_round(), 1)
+        self.assertEqual(matchmaker.status(1)["game"], 100)
+        self.assertIsNone(matchmaker.status(3))
+        self.assertEqual(matchmaker.status(4)["status"], "waiting")
+
+        queue.enqueue(player(5, 1400))
+        self.assertEqual(matchmaker.create_round(), 1)
+        # Only the last three matched players are remembered
+        self.assertIsNone(matchmaker.status(1))
+        self.assertEqual(matchmaker.status(5)["status"], "matched")
+
+    def test_failed_round_requeues_players(self):
+        def create_games(games):
+            raise RuntimeError("database is down")
+
+        queue = MatchmakingQueue(base_window=50, window_growth=10, max_window=100)
+        matchmaker = Matchmaker(create_games, lambda player_ids: set(player_ids), queue)
+        queue.enqueue(player(1, 1000), now=0)
+        queue.enqueue(player(2, 1000), now=0)
+        with self.assertLogs("matchmaking"):
+            self.assertEqual(matchmaker.create_round(), 0)
+        self.assertTrue(queue.is_paired(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from ratings import rating_delta, replay
+
+
+class TestRatings(TestCase):
+    def test_rating_delta(self):
+        self.assertEqual(rating_delta(1000, 1000, k_factor=32), 16)
+        self.assertLess(rating_delta(1400, 1000, k_factor=32), rating_delta(1000, 1400, k_factor=32))
+
+    def test_replay_matches_sequential_updates(self):
+        generator = np.random.default_rng(42)
+        players = 20
+        winners = generator.integers(1, players + 1, size=2000)
+        losers = (winners - 1 + generator.integers(1, players, size=2000)) % players + 1
+        ratings = generator.integers(800, 1600, size=players + 1)
+
+        expected = ratings.tolist()
+        for winner_id, loser_id in zip(winners.tolist(), losers.tolist()):
+            delta = rating_delta(expected[winner_id], expected[loser_id], k_factor=24)
+            expected[winner_id] += delta
+            expected[loser_id] -= delta
+
+        self.assertEqual(replay(winners, losers, ratings, k_factor=24).tolist(), expected)
+
+    def test_replay_without_games(self):
+        ratings = np.array([0, 1200, 1300])
+        empty = np.array([], dtype=np.int64)
+        self.assertEqual(replay(empty, empty, ratings).tolist(), ratings.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
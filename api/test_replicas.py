@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from replicas import ReadRouter, ReadState, current_reads, is_plain_read, read_routing
+
+
+class TestReadRouter(TestCase):
+    # Two database files stand in for a primary and its replica, each holding a row naming it
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.primary = read_routing(SqliteDatabase)(os.path.join(directory, "primary.db"))
+        self.replica = SqliteDatabase(os.path.join(directory, "replica.db"))
+        for name, database in (("primary", self.primary), ("replica", self.replica)):
+            database.execute_sql("CREATE TABLE source (name TEXT)")
+            database.execute_sql("INSERT INTO source (name) VALUES (?)", (name,))
+        self.primary.read_router = ReadRouter(self.primary, [self.replica])
+
+    def read_source(self) -> str:
+        return self.primary.execute_sql("SELECT name FROM source").fetchone()[0]
+
+    def route(self, state: ReadState) -> None:
+        token = current_reads.set(state)
+        self.addCleanup(current_reads.reset, token)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.read_source(), "primary")
+
+    def test_read_only_request_uses_replica(self):
+        state = ReadState(True)
+        self.route(state)
+        self.assertEqual(self.read_source(), "replica")
+        self.assertEqual(state.source, "replica-0")
+        with self.primary.atomic():
+            self.assertEqual(self.read_source(), "primary")
+
+    def test_locking_reads_are_not_plain(self):
+        self.assertTrue(is_plain_read("  select id FROM player"))
+        self.assertFalse(is_plain_read("SELECT id FROM player ORDER BY id FOR NO KEY UPDATE"))
+        self.assertFalse(is_plain_read("UPDATE player SET elo = 0"))
+
+    def test_reads_after_write_stay_on_primary(self):
+        state = ReadState(True)
+        self.route(state)
+        self.primary.execute_sql("UPDATE source SET name = ?", ("written",))
+        self.assertEqual(self.read_source(), "written")
+        self.assertEqual(state.source, "primary")
+
+    def test_read_your_writes_uses_primary(self):
+        self.route(ReadState(False))
+        self.assertEqual(self.read_source(), "primary")
+
+    def test_connection_context_is_routed(self):
+        self.route(ReadState(True))
+        self.primary.close()
+        with self.primary.connection_context():
+            self.assertEqual(self.read_source(), "replica")
+            self.assertTrue(self.primary.is_closed())
+
+    def test_close_closes_replica(self):
+        self.route(ReadState(True))
+        self.read_source()
+        self.assertFalse(self.replica.is_closed())
+        self.primary.close()
+        self.assertTrue(self.replica.is_closed())
+
+
+if __name__ == "__main__":
+    unittest.main()
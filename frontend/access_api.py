@@ -1,48 +1,164 @@
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PySide2 import QtCore
-from typing import List, Optional, Any
-from models import Player, Game
+from typing import List, Optional, Any, Callable, Set, Tuple, Union
+from models import Player, Game, parse_players, parse_games
 from globals import GameState
 
+# (connect, read) in seconds, the read timeout is long enough to fetch every game of a big database
+TIMEOUT = (3.05, 30)
+# Connection errors are retried for every method, error statuses only for idempotent ones (not POST)
+RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (502, 503, 504)
+# Also the number of calls running at once in the background
+POOL_SIZE = 4
+# Payloads of a trusted API are decoded into models without validating them again
+TRUSTED = False
+
+
+def create_session(retries: int = RETRIES, pool_size: int = POOL_SIZE) -> requests.Session:
+    retry = Retry(total=retries, backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ApiCall(QtCore.QRunnable):
+    # One AccessApi method running on the thread pool, its result is handed back on the GUI thread
+    def __init__(self, api: "AccessApi", function: Callable, args: tuple,
+                 on_result: Optional[Callable[[Any], None]], on_error: Optional[Callable[[Exception], None]]):
+        super().__init__()
+        # AccessApi keeps the call until it finished, Qt must not delete it behind Python's back
+        self.setAutoDelete(False)
+        self.api = api
+        self.function = function
+        self.args = args
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        # The request still runs if it started, its result is dropped
+        self.cancelled = True
+
+    def run(self):
+        if self.cancelled:
+            self.api.call_finished.emit(self, True, None)
+            return
+        try:
+            result = self.function(*self.args)
+        except Exception as e:
+            self.api.call_finished.emit(self, False, e)
+        else:
+            self.api.call_finished.emit(self, True, result)
+
 
 class AccessApi(QtCore.QObject):
-    def __init__(self, host="http://127.0.0.1:8000", parent=None):
+    # Emitted across threads, so on_call_finished runs on the thread of AccessApi
+    call_finished = QtCore.Signal(object, bool, object)
+    # Errors of background calls made without on_error
+    failed = QtCore.Signal(object)
+
+    def __init__(self, host="http://127.0.0.1:8000", timeout: Union[float, Tuple[float, float]] = TIMEOUT,
+                 retries: int = RETRIES, pool_size: int = POOL_SIZE, trusted: bool = TRUSTED, parent=None):
         super().__init__(parent=parent)
         self.host = host
+        self.timeout = timeout
+        self.trusted = trusted
+        self.session = create_session(retries, pool_size)
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(pool_size)
+        self.pending_calls: Set[ApiCall] = set()
+        self.call_finished.connect(self.on_call_finished)
 
     def to_host(self, path: str) -> str:
         if not path.startswith("/") and not self.host.endswith("/"):
             path = "/" + path
         return f"{self.host}{path}"
 
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        return self.session.request(method, self.to_host(path), timeout=self.timeout, **kwargs)
+
+    def run(self, function: Callable, *args, on_result: Optional[Callable[[Any], None]] = None,
+            on_error: Optional[Callable[[Exception], None]] = None) -> ApiCall:
+        # Runs function(*args), usually a method of this class, without blocking the GUI thread
+        call = ApiCall(self, function, args, on_result, on_error)
+        self.pending_calls.add(call)
+        self.thread_pool.start(call)
+        return call
+
+    @QtCore.Slot(object, bool, object)
+    def on_call_finished(self, call: ApiCall, succeeded: bool, value: Any):
+        self.pending_calls.discard(call)
+        if call.cancelled:
+            return
+        if not succeeded:
+            if call.on_error is not None:
+                call.on_error(value)
+            else:
+                self.failed.emit(value)
+        elif call.on_result is not None:
+            call.on_result(value)
+
+    def wait(self, msecs: int = 30000) -> bool:
+        # Blocks until every background call and the calls started by their callbacks are done, for tests and shutdown
+        deadline = QtCore.QDeadlineTimer(msecs)
+        while len(self.pending_calls) != 0:
+            if deadline.hasExpired() or not self.thread_pool.waitForDone(max(deadline.remainingTime(), 0)):
+                return False
+            QtCore.QCoreApplication.processEvents()
+        return True
+
+    def close(self):
+        for call in self.pending_calls:
+            call.cancel()
+        self.thread_pool.waitForDone()
+        self.session.close()
+
     def get_players(self) -> List[Player]:
-        request: requests.Response = requests.get(self.to_host("/players"))
-        request_body = request.json()
-        players: List[Player] = [Player.parse_obj(player) for player in request_body]
-        return players
+        request: requests.Response = self.request("GET", "/players")
+        return parse_players(request.content, self.trusted)
 
     def get_games(self) -> List[Game]:
-        request: requests.Response = requests.get(self.to_host("/games"))
-        request_body = request.json()
-        games: List[Game] = [Game.parse_obj(game) for game in request_body]
-        return games
+        request: requests.Response = self.request("GET", "/games")
+        return parse_games(request.content, self.trusted)
+
+    def get_page(self, path: str, limit: int, after: Optional[int] = None) -> Tuple[List[dict], Optional[int], Optional[int]]:
+        # Raw rows of one page, the cursor of the next one (None on the last page) and the change version they are up to date with
+        params = {"limit": limit} if after is None else {"limit": limit, "after": after}
+        request: requests.Response = self.request("GET", path, params=params)
+        request.raise_for_status()
+        cursor = request.headers.get("X-Next-Cursor")
+        version = request.headers.get("X-Change-Version")
+        return orjson.loads(request.content), None if cursor is None else int(cursor), None if version is None else int(version)
+
+    def get_changes(self, path: str, since: int) -> dict:
+        # {"version": ..., "upserted": [rows], "deleted": [ids]} of the rows changed after version since
+        request: requests.Response = self.request("GET", path, params={"since": since})
+        request.raise_for_status()
+        return orjson.loads(request.content)
 
     @QtCore.Slot(dict)
     def create_player(self, new_player: dict) -> Player:
-        request: requests.Response = requests.post(self.to_host("/player"), json=new_player)
+        request: requests.Response = self.request("POST", "/player", json=new_player)
         return Player.parse_obj(request.json())
 
     @QtCore.Slot(dict)
     def create_game(self, new_game: dict) -> Game:
-        request: requests.Response = requests.post(self.to_host("/game"), json=new_game)
+        request: requests.Response = self.request("POST", "/game", json=new_game)
         return Game.parse_obj(request.json())
 
     @QtCore.Slot(list)
     def delete_players(self, player_ids: List[int]):
-        request: requests.Response = requests.delete(self.to_host("/players"), json=player_ids)
+        request: requests.Response = self.request("DELETE", "/players", json=player_ids)
         return request.json()
 
     @QtCore.Slot(list)
     def delete_games(self, game_ids: List[int]):
-        request: requests.Response = requests.delete(self.to_host("/games"), json=game_ids)
+        request: requests.Response = self.request("DELETE", "/games", json=game_ids)
         return request.json()
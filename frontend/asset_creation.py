@@ -1,9 +1,8 @@
-import itertools
-
 from PySide2 import QtCore, QtWidgets, QtGui
-from globals import GameState, Role
+from globals import GameState
 from models import Player, Game
-from typing import List, Dict
+from list_models import PlayerListModel
+from typing import List, Optional
 
 class CreatePlayerDialog(QtWidgets.QDialog):
     new_player = QtCore.Signal(dict)
@@ -68,7 +67,7 @@ class CreatePlayerDialog(QtWidgets.QDialog):
 class CreateGameDialog(QtWidgets.QDialog):
     new_game = QtCore.Signal(dict)
 
-    def __init__(self, players_model: QtGui.QStandardItemModel, parent=None):
+    def __init__(self, players_model: PlayerListModel, parent=None):
         super().__init__(parent,
                          f=QtCore.Qt.WindowTitleHint | QtCore.Qt.WindowSystemMenuHint | QtCore.Qt.WindowCloseButtonHint)
         self.setWindowTitle("Create new Game")
@@ -80,9 +79,15 @@ class CreateGameDialog(QtWidgets.QDialog):
         winner_label = QtWidgets.QLabel("Winner (if any)")
         game_state_label = QtWidgets.QLabel("Game state")
 
+        # Both players are picked straight from the list model, nothing is copied
         self.first_player_combo_box = QtWidgets.QComboBox()
+        self.first_player_combo_box.setModel(players_model)
         self.second_player_combo_box = QtWidgets.QComboBox()
+        self.second_player_combo_box.setModel(players_model)
+        # The winner is one of the two players
         self.winner_combo_box = QtWidgets.QComboBox()
+        self.first_player_combo_box.currentIndexChanged.connect(self.update_winners)
+        self.second_player_combo_box.currentIndexChanged.connect(self.update_winners)
         self.game_state_combo_box = QtWidgets.QComboBox()
         self.game_state_combo_box.addItems([state.name for state in GameState])
 
@@ -106,15 +111,23 @@ class CreateGameDialog(QtWidgets.QDialog):
         box_layout_3.addLayout(table_layout)
         box_layout_3.addWidget(button_box)
 
-    def get_players(self) -> List[Player]:
-        player_items: List[QtGui.QStandardItem] = [self.players_model.item(row, 0) for row in range(self.players_model.rowCount())]
-        return [item.data(Role.WHOLE_DATA_ROLE.value) for item in player_items]
+    def get_players(self) -> List[Optional[Player]]:
+        # The two selected players, None when nothing is selected
+        rows = [self.first_player_combo_box.currentIndex(), self.second_player_combo_box.currentIndex()]
+        return [self.players_model.player(row) if row >= 0 else None for row in rows]
+
+    @QtCore.Slot(int)
+    def update_winners(self, _row: int):
+        self.winner_combo_box.clear()
+        for player in self.get_players():
+            if player is not None:
+                self.winner_combo_box.addItem(player.name, player)
+        self.winner_combo_box.addItem("No winner", None)
 
     def reset_ui(self):
-        player_names = [player.name for player in self.get_players()]
-        self.first_player_combo_box.addItems(player_names)
-        self.second_player_combo_box.addItems(player_names)
-        self.winner_combo_box.addItems(list(itertools.chain(player_names, ["No winner"])))
+        self.first_player_combo_box.setCurrentIndex(0 if self.players_model.rowCount() > 0 else -1)
+        self.second_player_combo_box.setCurrentIndex(1 if self.players_model.rowCount() > 1 else -1)
+        self.update_winners(-1)
 
     def showEvent(self, *args, **kwargs):
         self.reset_ui()
@@ -122,14 +135,14 @@ class CreateGameDialog(QtWidgets.QDialog):
 
     @QtCore.Slot()
     def dialog_accepted(self):
-        players: Dict[str, Player] = {player.name: player for player in self.get_players()}
-
-        player_one = players[self.first_player_combo_box.currentText()]
-        player_two = players[self.second_player_combo_box.currentText()]
-        winner = players.get(self.winner_combo_box.currentText())
+        player_one, player_two = self.get_players()
+        if player_one is None or player_two is None:
+            QtWidgets.QMessageBox.warning(self, "Error", "A game needs two players")
+            return
+        winner: Optional[Player] = self.winner_combo_box.currentData()
         game_state = GameState[self.game_state_combo_box.currentText()]
 
-        self.new_game.emit({"state": game_state.value, "winner": dict(winner),
+        self.new_game.emit({"state": game_state.value, "winner": dict(winner) if winner is not None else None,
                             "players": [dict(player_one), dict(player_two)]})
         self.close()
 
@@ -0,0 +1,69 @@
+# Compares decoding a /games payload game by game like before with the bulk and trusted paths of models.parse_games
+# Run from the frontend directory: python -m benchmarks.parsing --games 100000 --players 10000
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, List
+
+import orjson
+
+from globals import GameState
+from models import Game, parse_games
+
+
+def games_payload(games: int, players: int) -> bytes:
+    pool = [{"id": player_id, "name": f"player{player_id}", "elo": random.randint(0, 3000)} for player_id in range(1, players + 1)]
+    rows = []
+    for game_id in range(1, games + 1):
+        state = random.choice(list(GameState))
+        game_players = random.sample(pool, 2)
+        winner = random.choice(game_players) if state == GameState.FINISHED else None
+        rows.append({"id": game_id, "state": state.value, "players": game_players, "winner": winner})
+    return orjson.dumps(rows)
+
+
+def per_element(content: bytes) -> List[Game]:
+    # What AccessApi.get_games did: requests' json() then one validation per game
+    return [Game.model_validate(game) for game in json.loads(content)]
+
+
+def measure(parse: Callable[[bytes], List[Game]], content: bytes, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        games = parse(content)
+        timings.append(time.perf_counter() - start)
+        del games
+    gc.collect()
+    tracemalloc.start()
+    games = parse(content)
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    distinct_players = len({id(player) for game in games for player in game.players})
+    return {"ms": round(min(timings) * 1000, 1), "kept_mb": round(kept / 2 ** 20, 1), "peak_mb": round(peak / 2 ** 20, 1),
+            "player_objects": distinct_players}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=100_000)
+    parser.add_argument("--players", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    content = games_payload(args.games, args.players)
+    report = {"payload_mb": round(len(content) / 2 ** 20, 1)}
+    for name, parse in [("per_element", per_element), ("bulk", lambda content: parse_games(content)),
+                        ("trusted", lambda content: parse_games(content, trusted=True))]:
+        report[name] = measure(parse, content, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
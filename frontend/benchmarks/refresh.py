@@ -0,0 +1,98 @@
+# Compares the row by row refresh of the players list model with rebuilding it, for a growing number of changes.
+# The model sits behind a sort/filter proxy with rows selected like in the app, no API or display needed.
+# Run from the frontend directory: python -m benchmarks.refresh --players 100000 --changes 1 10 100 1000 10000
+import argparse
+import gc
+import json
+import random
+import time
+from typing import List, Tuple
+
+from PySide2 import QtCore
+
+from access_api import AccessApi
+from list_models import PlayerListModel
+
+
+def player_row(player_id: int) -> dict:
+    return {"id": player_id, "name": f"player{player_id}", "elo": random.randint(0, 3000)}
+
+
+def create_model(api: AccessApi, players: int, selected: int) -> Tuple[PlayerListModel, QtCore.QItemSelectionModel]:
+    model = PlayerListModel(api)
+    # Even ids only, so that odd ones can be inserted between loaded rows
+    model.append_page(([player_row(player_id) for player_id in range(2, 2 * players + 1, 2)], None, 0))
+    proxy = QtCore.QSortFilterProxyModel(model)
+    proxy.setSourceModel(model)
+    proxy.setFilterFixedString("player")
+    selection = QtCore.QItemSelectionModel(proxy, model)
+    for row in random.sample(range(players), selected):
+        selection.select(proxy.index(row, 0), QtCore.QItemSelectionModel.Select)
+    return model, selection
+
+
+def random_changes(model: PlayerListModel, count: int, pattern: str) -> Tuple[List[dict], List[int]]:
+    # A third of the changes of each kind: updated elo, new player, deleted player.
+    # New players get the next ids like the API gives them, or land anywhere in the list when scattered.
+    loaded_ids = random.sample(list(model.ids), 2 * (count // 3) + count % 3)
+    updated_ids, deleted = loaded_ids[:count // 3 + count % 3], loaded_ids[count // 3 + count % 3:]
+    upserted = [player_row(player_id) for player_id in updated_ids]
+    if pattern == "appended":
+        new_ids = range(model.ids[-1] + 1, model.ids[-1] + 1 + count // 3)
+    else:
+        new_ids = random.sample(range(1, 2 * len(model.ids), 2), count // 3)
+    upserted += [player_row(player_id) for player_id in new_ids]
+    upserted.sort(key=lambda row: row["id"])
+    return upserted, deleted
+
+
+def rebuild(model: PlayerListModel, upserted: List[dict], deleted: List[int]):
+    # What a clear and append costs, with the fetched rows already at hand
+    rows = {row_id: {"id": row_id, "name": name, "elo": elo} for row_id, name, elo in zip(model.ids, model.names, model.elos)}
+    for row_id in deleted:
+        rows.pop(row_id, None)
+    rows.update((row["id"], row) for row in upserted)
+    model.beginResetModel()
+    model.clear_rows()
+    model.insert_values(0, [model.row_values(row) for row in sorted(rows.values(), key=lambda row: row["id"])])
+    model.endResetModel()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--changes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--selected", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    _app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    api = AccessApi()
+    report = {"appended": {}, "scattered": {}}
+    # Models are kept until the end and the collector paused while timing, like timeit does
+    models = []
+    for pattern, pattern_report in report.items():
+        for count in args.changes:
+            timings = {}
+            for name, apply in [("diff", PlayerListModel.apply_diff), ("rebuild", rebuild)]:
+                random.seed(args.seed)
+                model, selection = create_model(api, args.players, args.selected)
+                models.append((model, selection))
+                upserted, deleted = random_changes(model, count, pattern)
+                gc.disable()
+                start = time.perf_counter()
+                apply(model, upserted, deleted)
+                # A view asks the proxy right away, a reset only filters the rows again then
+                selection.model().rowCount()
+                elapsed = time.perf_counter() - start
+                gc.enable()
+                timings[name] = {"ms": round(elapsed * 1000, 2), "rows": model.rowCount(),
+                                 "selected_after": len(selection.selectedIndexes())}
+            timings["diff"]["us_per_change"] = round(timings["diff"]["ms"] * 1000 / count, 1)
+            pattern_report[count] = timings
+    api.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
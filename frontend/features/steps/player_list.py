@@ -1,6 +1,6 @@
 from behave import *
 from main import MainWindow
-from PySide2 import QtWidgets, QtGui, QtCore
+from PySide2 import QtWidgets, QtCore
 from typing import List
 from access_api import AccessApi
 
@@ -15,6 +15,8 @@ def step_impl(context):
 @when("the app is opened")
 def step_impl(context):
     window = MainWindow()
+    # The lists are filled once the calls made in the background are done
+    window.api.wait()
     context.window = window
 
 
@@ -36,7 +38,7 @@ def step_impl(context):
 def step_impl(context):
     window: MainWindow = context.window
     player_nbr = window.player_list.model.rowCount()
-    players: List[QtGui.QStandardItem] = [window.player_list.model.item(i, 0) for i in range(player_nbr)]
-    names: List[str] = [item.data(QtCore.Qt.DisplayRole) for item in players]
+    players: List[QtCore.QModelIndex] = [window.player_list.model.index(i, 0) for i in range(player_nbr)]
+    names: List[str] = [index.data(QtCore.Qt.DisplayRole) for index in players]
     for i, name in enumerate(context.name_list):
         assert name == names[i]
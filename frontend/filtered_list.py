@@ -1,49 +1,66 @@
 from PySide2 import QtCore, QtGui, QtWidgets
+from typing import Optional
+from filtering import FilterEngine, FilterProxyModel
 
 
 class FilteredListWidget(QtWidgets.QWidget):
     selection_changed = QtCore.Signal(list)
 
-    def __init__(self, parent=None):
+    def __init__(self, source_model: Optional[QtCore.QAbstractItemModel] = None, parent=None):
         super().__init__(parent=parent)
 
         self.filter_box = QtWidgets.QLineEdit(parent=self)
+        self.filter_box.setPlaceholderText("Filter, e.g. name elo:1000-1500 state:finished")
+        self.fuzzy_box = QtWidgets.QCheckBox("Fuzzy", parent=self)
 
-        self.source_model = QtGui.QStandardItemModel(parent=self)
-        self.proxy_model = QtCore.QSortFilterProxyModel(parent=self)
+        # Any list model, it is paged in by the view if it implements canFetchMore/fetchMore
+        self.source_model = source_model if source_model is not None else QtGui.QStandardItemModel()
+        self.source_model.setParent(self)
+        self.proxy_model = FilterProxyModel(parent=self)
 
         self.list_view = QtWidgets.QListView(parent=self)
         self.list_view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.list_view.setUniformItemSizes(True)
 
         self.proxy_model.setSourceModel(self.source_model)
         self.list_view.setModel(self.proxy_model)
+        # Filters on a worker once typing pauses, see FilterEngine
+        self.filter_engine = FilterEngine(self.proxy_model, parent=self)
 
-        self.filter_box.textChanged.connect(self.proxy_model.setFilterFixedString)
+        self.filter_box.textChanged.connect(self.on_filter_changed)
+        self.fuzzy_box.toggled.connect(self.on_filter_changed)
         self.list_view.selectionModel().selectionChanged.connect(self.on_selection_changed)
 
+        filter_layout = QtWidgets.QHBoxLayout()
+        filter_layout.addWidget(self.filter_box)
+        filter_layout.addWidget(self.fuzzy_box)
+
         main_layout = QtWidgets.QVBoxLayout()
-        main_layout.addWidget(self.filter_box)
+        main_layout.addLayout(filter_layout)
         main_layout.addWidget(self.list_view)
         self.setLayout(main_layout)
 
+    @QtCore.Slot()
+    def on_filter_changed(self):
+        self.filter_engine.set_filter(self.filter_box.text(), self.fuzzy_box.isChecked())
+
     @QtCore.Slot(QtCore.QItemSelection)
     def on_selection_changed(self, newly_selected_items: QtCore.QItemSelection):
         current_selection = self.list_view.selectionModel().selection()
         source_selection = self.proxy_model.mapSelectionToSource(current_selection)
-        source_indexes = source_selection.indexes()
-        selected_items = [self.source_model.itemFromIndex(index) for index in source_indexes]
-        self.selection_changed.emit(selected_items)
+        # Indexes rather than items, so that any source model works, both answer data(role)
+        self.selection_changed.emit(source_selection.indexes())
 
     @property
     def filter_widget(self) -> QtWidgets.QLineEdit:
         return self.filter_box
 
     @property
-    def proxy(self) -> QtCore.QSortFilterProxyModel:
+    def proxy(self) -> FilterProxyModel:
         return self.proxy_model
 
     @property
-    def model(self) -> QtGui.QStandardItemModel:
+    def model(self) -> QtCore.QAbstractItemModel:
         return self.source_model
 
     @property
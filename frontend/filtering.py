@@ -0,0 +1,413 @@
+import re
+import unicodedata
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+from PySide2 import QtCore
+from typing import List, Optional, Any, Callable, Dict, Tuple, Type
+
+# Keystrokes closer than this are filtered once
+FILTER_DEBOUNCE_MS = 150
+NUMBER_TERM = re.compile(r"^(<=|>=|<|>)?(-?\d+)(?:-(-?\d+))?$")
+
+
+def normalize(text: str) -> str:
+    # Lowercased and without accents, so that "eloise" finds "Éloïse"
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(character for character in decomposed if not unicodedata.combining(character)).casefold()
+
+
+class FilterSnapshot:
+    # Copy of what a model can be filtered on, taken on the GUI thread and indexed on a worker.
+    # texts is called on the worker, numbers are searched with field:value terms, enums name the values of some of them.
+    def __init__(self, texts: Callable[[], List[str]], numbers: Optional[Dict[str, array]] = None,
+                 enums: Optional[Dict[str, Type[IntEnum]]] = None):
+        self.texts = texts
+        self.numbers = numbers or {}
+        self.enums = enums or {}
+
+    @staticmethod
+    def from_model(model: QtCore.QAbstractItemModel) -> "FilterSnapshot":
+        # Any model, through its display role only
+        texts = [str(model.index(row, 0).data(QtCore.Qt.DisplayRole)) for row in range(model.rowCount())]
+        return FilterSnapshot(lambda: texts)
+
+
+class FilterQuery:
+    # Every term has to match: words are searched in the text of rows, field:value terms in their numbers
+    def __init__(self, text: str, index: "FilterIndex"):
+        self.text = text
+        self.words: List[str] = []
+        self.ranges: List[Tuple[str, int, int]] = []
+        for term in text.split():
+            field, _, value = term.partition(":")
+            field = field.lower()
+            value_range = parse_range(value, index.enums.get(field)) if field in index.numbers else None
+            if value_range is None:
+                self.words.append(normalize(term))
+            else:
+                self.ranges.append((field, *value_range))
+
+    def narrows(self, previous: "FilterQuery") -> bool:
+        # Typing at the end of words only removes matches, which is not true of numbers: elo:1 then elo:12
+        return len(self.ranges) == 0 and len(previous.ranges) == 0 and self.text.startswith(previous.text)
+
+
+def parse_range(value: str, enum: Optional[Type[IntEnum]]) -> Optional[Tuple[int, int]]:
+    # 1200, 1000-1500, >1200, <=900, or the name of an enum member
+    if enum is not None and value.upper() in enum.__members__:
+        member = enum[value.upper()]
+        return member.value, member.value
+    match = NUMBER_TERM.match(value)
+    if match is None:
+        return None
+    operator, low, high = match.group(1), int(match.group(2)), match.group(3)
+    if high is not None:
+        return (low, int(high)) if operator is None else None
+    bounds = {None: (low, low), "<": (None, low - 1), "<=": (None, low), ">": (low + 1, None), ">=": (low, None)}
+    low, high = bounds[operator]
+    return -2 ** 63 if low is None else low, 2 ** 63 - 1 if high is None else high
+
+
+class FilterIndex:
+    # The normalized texts of every row joined in one string, searched with str.find and mapped back to rows by offset
+    def __init__(self, snapshot: FilterSnapshot):
+        self.keys = [normalize(text) for text in snapshot.texts()]
+        self.numbers = snapshot.numbers
+        self.enums = snapshot.enums
+        self.haystack = "\n".join(self.keys)
+        self.starts = array("q")
+        offset = 0
+        for key in self.keys:
+            self.starts.append(offset)
+            offset += len(key) + 1
+
+    def row_at(self, offset: int) -> int:
+        return bisect_right(self.starts, offset) - 1
+
+    def next_row_start(self, row: int) -> int:
+        return self.starts[row + 1] if row + 1 < len(self.starts) else len(self.haystack)
+
+    def rows_containing(self, word: str, candidates: Optional[List[int]]) -> List[int]:
+        if candidates is not None:
+            return [row for row in candidates if word in self.keys[row]]
+        rows = []
+        offset = self.haystack.find(word)
+        while offset != -1:
+            row = self.row_at(offset)
+            rows.append(row)
+            offset = self.haystack.find(word, self.next_row_start(row))
+        return rows
+
+    def fuzzy_scores(self, word: str, candidates: Optional[List[int]]) -> Dict[int, int]:
+        # Rows holding the letters of word in order, scored by how far apart they are then by where they start
+        pattern = re.compile("[^\n]*?".join(map(re.escape, word)))
+        scores: Dict[int, int] = {}
+        if candidates is not None:
+            for row in candidates:
+                match = pattern.search(self.keys[row])
+                if match is not None:
+                    scores[row] = (match.end() - match.start() - len(word)) * 1000 + match.start()
+            return scores
+        match = pattern.search(self.haystack)
+        while match is not None:
+            row = self.row_at(match.start())
+            scores[row] = (match.end() - match.start() - len(word)) * 1000 + match.start() - self.starts[row]
+            match = pattern.search(self.haystack, self.next_row_start(row))
+        return scores
+
+    def rows_in_range(self, field: str, low: int, high: int, candidates: Optional[List[int]]) -> List[int]:
+        column = self.numbers[field]
+        rows = range(len(column)) if candidates is None else candidates
+        return [row for row in rows if low <= column[row] <= high]
+
+    def match(self, query: FilterQuery, fuzzy: bool, candidates: Optional[List[int]] = None) -> List[int]:
+        # Rows in model order, or best ranked first when fuzzy
+        rows = candidates
+        scores: Dict[int, int] = {}
+        for word in query.words:
+            if fuzzy:
+                word_scores = self.fuzzy_scores(word, rows)
+                rows = list(word_scores)
+                scores = {row: scores.get(row, 0) + score for row, score in word_scores.items()}
+            else:
+                rows = self.rows_containing(word, rows)
+        for field, low, high in query.ranges:
+            rows = self.rows_in_range(field, low, high, rows)
+        if rows is None:
+            rows = list(range(len(self.keys)))
+        if fuzzy:
+            rows.sort(key=lambda row: (scores.get(row, 0), row))
+        return rows
+
+
+class FilterResult:
+    def __init__(self, generation: int, query: FilterQuery, fuzzy: bool, index: FilterIndex, rows: List[int]):
+        self.generation = generation
+        self.query = query
+        self.fuzzy = fuzzy
+        self.index = index
+        self.rows = array("q", rows)
+        self.proxy_rows = {source_row: proxy_row for proxy_row, source_row in enumerate(rows)}
+
+
+class FilterJob(QtCore.QRunnable):
+    # Indexes the snapshot unless an index of the same source is given, then matches the text
+    def __init__(self, engine: "FilterEngine", generation: int, text: str, fuzzy: bool, snapshot: Optional[FilterSnapshot],
+                 index: Optional[FilterIndex], previous: Optional[FilterResult]):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.engine = engine
+        self.generation = generation
+        self.text = text
+        self.fuzzy = fuzzy
+        self.snapshot = snapshot
+        self.index = index
+        self.previous = previous
+
+    def run(self):
+        try:
+            index = self.index if self.index is not None else FilterIndex(self.snapshot)
+            query = FilterQuery(self.text, index)
+            candidates = None
+            previous = self.previous
+            if previous is not None and not self.fuzzy and not previous.fuzzy and query.narrows(previous.query):
+                candidates = previous.rows.tolist()
+            rows = index.match(query, self.fuzzy, candidates)
+        except Exception as e:
+            self.engine.job_finished.emit(self, e)
+        else:
+            self.engine.job_finished.emit(self, FilterResult(self.generation, query, self.fuzzy, index, rows))
+
+
+class FilterProxyModel(QtCore.QAbstractProxyModel):
+    # Shows the source rows listed by the last filter result, all of them when there is none.
+    # A result is swapped in at once, source changes are followed row by row until the next one.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.source_rows: Optional[array] = None
+        self.proxy_rows: Dict[int, int] = {}
+        self.saved_indexes: List[QtCore.QModelIndex] = []
+        self.saved_sources: List[QtCore.QPersistentModelIndex] = []
+        self.saved_rows: List[QtCore.QPersistentModelIndex] = []
+
+    def setSourceModel(self, source_model: QtCore.QAbstractItemModel):
+        self.beginResetModel()
+        super().setSourceModel(source_model)
+        source_model.modelAboutToBeReset.connect(self.on_source_about_to_be_reset)
+        source_model.modelReset.connect(self.on_source_reset)
+        source_model.rowsAboutToBeInserted.connect(self.on_rows_about_to_be_inserted)
+        source_model.rowsInserted.connect(self.on_rows_inserted)
+        source_model.rowsAboutToBeRemoved.connect(self.on_rows_about_to_be_removed)
+        source_model.rowsRemoved.connect(self.on_rows_removed)
+        source_model.dataChanged.connect(self.on_data_changed)
+        source_model.layoutAboutToBeChanged.connect(self.on_layout_about_to_be_changed)
+        source_model.layoutChanged.connect(self.on_layout_changed)
+        self.endResetModel()
+
+    def set_result(self, result: Optional[FilterResult]):
+        # A layout change rather than a reset, so that selected rows still shown stay selected
+        self.layoutAboutToBeChanged.emit()
+        persistent_indexes = self.persistentIndexList()
+        sources = [self.mapToSource(index) for index in persistent_indexes]
+        self.source_rows = None if result is None else result.rows
+        self.proxy_rows = {} if result is None else result.proxy_rows
+        self.changePersistentIndexList(persistent_indexes, [self.mapFromSource(source) for source in sources])
+        self.layoutChanged.emit()
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().rowCount() if self.source_rows is None else len(self.source_rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        # Lists only
+        return 0 if parent.isValid() else 1
+
+    def index(self, row: int, column: int, parent=QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QtCore.QModelIndex()) -> QtCore.QModelIndex:
+        return QtCore.QModelIndex()
+
+    def mapToSource(self, proxy_index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+        if not proxy_index.isValid():
+            return QtCore.QModelIndex()
+        row = proxy_index.row() if self.source_rows is None else self.source_rows[proxy_index.row()]
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index: QtCore.QModelIndex) -> QtCore.QModelIndex:
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+        row = source_index.row() if self.source_rows is None else self.proxy_rows.get(source_index.row())
+        return QtCore.QModelIndex() if row is None else self.index(row, source_index.column())
+
+    def shift_source_rows(self, first: int, count: int):
+        # Source rows from first on moved by count
+        self.source_rows = array("q", (row + count if row >= first else row for row in self.source_rows))
+        self.proxy_rows = {source_row: proxy_row for proxy_row, source_row in enumerate(self.source_rows)}
+
+    @QtCore.Slot()
+    def on_source_about_to_be_reset(self):
+        self.beginResetModel()
+
+    @QtCore.Slot()
+    def on_source_reset(self):
+        # Nothing matches until the next result
+        if self.source_rows is not None:
+            self.source_rows = array("q")
+            self.proxy_rows = {}
+        self.endResetModel()
+
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def on_rows_about_to_be_inserted(self, parent: QtCore.QModelIndex, first: int, last: int):
+        if self.source_rows is None:
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def on_rows_inserted(self, parent: QtCore.QModelIndex, first: int, last: int):
+        # New rows stay hidden until the next result
+        if self.source_rows is None:
+            self.endInsertRows()
+        elif first < self.sourceModel().rowCount() - (last - first + 1):
+            self.shift_source_rows(first, last - first + 1)
+
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def on_rows_about_to_be_removed(self, parent: QtCore.QModelIndex, first: int, last: int):
+        if self.source_rows is None:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            return
+        # The shown rows among the removed ones are rarely adjacent in the proxy when ranked
+        removed = sorted(self.proxy_rows[row] for row in range(first, last + 1) if row in self.proxy_rows)
+        for proxy_row in reversed(removed):
+            self.beginRemoveRows(QtCore.QModelIndex(), proxy_row, proxy_row)
+            del self.source_rows[proxy_row]
+            self.endRemoveRows()
+
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def on_rows_removed(self, parent: QtCore.QModelIndex, first: int, last: int):
+        if self.source_rows is None:
+            self.endRemoveRows()
+        else:
+            self.shift_source_rows(last + 1, first - last - 1)
+
+    def on_data_changed(self, top_left: QtCore.QModelIndex, bottom_right: QtCore.QModelIndex, roles: List[int] = []):
+        if self.source_rows is None:
+            self.dataChanged.emit(self.index(top_left.row(), 0), self.index(bottom_right.row(), 0), roles)
+            return
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            proxy_row = self.proxy_rows.get(row)
+            if proxy_row is not None:
+                self.dataChanged.emit(self.index(proxy_row, 0), self.index(proxy_row, 0), roles)
+
+    @QtCore.Slot()
+    def on_layout_about_to_be_changed(self):
+        # Persistent indexes of the source follow its rows, the proxy maps its own ones and its rows through them
+        self.layoutAboutToBeChanged.emit()
+        self.saved_indexes = self.persistentIndexList()
+        self.saved_sources = [QtCore.QPersistentModelIndex(self.mapToSource(index)) for index in self.saved_indexes]
+        if self.source_rows is not None:
+            self.saved_rows = [QtCore.QPersistentModelIndex(self.sourceModel().index(row, 0)) for row in self.source_rows]
+
+    @QtCore.Slot()
+    def on_layout_changed(self):
+        if self.source_rows is not None:
+            self.source_rows = array("q", (index.row() for index in self.saved_rows if index.isValid()))
+            self.proxy_rows = {source_row: proxy_row for proxy_row, source_row in enumerate(self.source_rows)}
+        source_model = self.sourceModel()
+        moved_indexes = [self.mapFromSource(source_model.index(source.row(), source.column()) if source.isValid()
+                                            else QtCore.QModelIndex()) for source in self.saved_sources]
+        self.changePersistentIndexList(self.saved_indexes, moved_indexes)
+        self.saved_indexes, self.saved_sources, self.saved_rows = [], [], []
+        self.layoutChanged.emit()
+
+
+class FilterEngine(QtCore.QObject):
+    # Filters the source of proxy on a worker once typing pauses, the index is built again only after the source changed
+    job_finished = QtCore.Signal(object, object)
+    failed = QtCore.Signal(object)
+
+    def __init__(self, proxy: FilterProxyModel, parent=None):
+        super().__init__(parent=parent)
+        self.proxy = proxy
+        self.text = ""
+        self.fuzzy = False
+        # Bumped on every change of the source, results and indexes of an older one are not used
+        self.generation = 0
+        self.index: Optional[FilterIndex] = None
+        self.last_result: Optional[FilterResult] = None
+        self.running: Optional[FilterJob] = None
+        # One job at a time, a newer query waits for the running one
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FILTER_DEBOUNCE_MS)
+        self.timer.timeout.connect(self.start_job)
+        self.job_finished.connect(self.on_job_finished)
+        source_model = proxy.sourceModel()
+        for signal in (source_model.modelReset, source_model.rowsInserted, source_model.rowsRemoved,
+                       source_model.layoutChanged, source_model.dataChanged):
+            signal.connect(self.on_source_changed)
+
+    def set_filter(self, text: str, fuzzy: Optional[bool] = None):
+        self.text = text.strip()
+        if fuzzy is not None:
+            self.fuzzy = fuzzy
+        self.timer.start()
+
+    def on_source_changed(self, *_args):
+        self.generation += 1
+        self.index = None
+        self.last_result = None
+        if self.text != "":
+            self.timer.start()
+
+    def snapshot(self) -> FilterSnapshot:
+        source_model = self.proxy.sourceModel()
+        if hasattr(source_model, "filter_snapshot"):
+            return source_model.filter_snapshot()
+        return FilterSnapshot.from_model(source_model)
+
+    @QtCore.Slot()
+    def start_job(self):
+        if self.text == "":
+            self.last_result = None
+            self.proxy.set_result(None)
+        elif self.running is None:
+            # Otherwise started again once the running job is done
+            snapshot = self.snapshot() if self.index is None else None
+            self.running = FilterJob(self, self.generation, self.text, self.fuzzy, snapshot, self.index, self.last_result)
+            self.thread_pool.start(self.running)
+
+    @QtCore.Slot(object, object)
+    def on_job_finished(self, job: FilterJob, result: Any):
+        self.running = None
+        if isinstance(result, Exception):
+            self.failed.emit(result)
+            return
+        if result.generation == self.generation:
+            self.index = result.index
+            if result.query.text == self.text and result.fuzzy == self.fuzzy:
+                self.last_result = result
+                self.proxy.set_result(result)
+                return
+        # The source or the filter changed meanwhile
+        if not self.timer.isActive():
+            self.start_job()
+
+    def wait(self, msecs: int = 30000) -> bool:
+        # Runs the pending filter now and blocks until it is shown, for tests
+        if self.timer.isActive():
+            self.timer.stop()
+            self.start_job()
+        deadline = QtCore.QDeadlineTimer(msecs)
+        while self.running is not None:
+            if deadline.hasExpired() or not self.thread_pool.waitForDone(max(deadline.remainingTime(), 0)):
+                return False
+            QtCore.QCoreApplication.processEvents()
+        return True
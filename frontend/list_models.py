@@ -0,0 +1,289 @@
+from array import array
+from bisect import bisect_left
+from PySide2 import QtCore
+from typing import List, Optional, Any, Dict, Tuple
+from models import Player, Game
+from globals import GameState, Role
+from access_api import AccessApi, ApiCall
+from filtering import FilterSnapshot
+
+# Rows asked to the API at once, its largest page
+PAGE_SIZE = 1000
+NO_PLAYER = -1
+# Inserted or removed ranges past which a refresh changes the layout at once rather than range by range
+LAYOUT_CHANGE_RUNS = 500
+
+
+def runs(positions: List[int]) -> List[Tuple[int, int]]:
+    # (first, last) of each run of consecutive positions, positions being sorted
+    result: List[Tuple[int, int]] = []
+    for position in positions:
+        if len(result) != 0 and result[-1][1] == position - 1:
+            result[-1] = (result[-1][0], position)
+        else:
+            result.append((position, position))
+    return result
+
+
+class PagedListModel(QtCore.QAbstractListModel):
+    # Rows are paged in from path with limit/after as the view scrolls, sorted by id like the API pages them.
+    # Each column is an array or a list attribute with one value per row, see empty_columns and row_values.
+    def __init__(self, api: AccessApi, path: str, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(parent=parent)
+        self.api = api
+        self.path = path
+        self.page_size = page_size
+        self.columns: Tuple[str, ...] = tuple(self.empty_columns())
+        self.clear_rows()
+        self.cursor: Optional[int] = None
+        self.exhausted = True
+        # Change version of the API the loaded rows are up to date with, None until the first page
+        self.version: Optional[int] = None
+        self.fetch_call: Optional[ApiCall] = None
+        self.changes_call: Optional[ApiCall] = None
+        self.refresh_pending = False
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.ids)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self.ids):
+            return None
+        row = index.row()
+        if role == QtCore.Qt.DisplayRole:
+            return self.display(row)
+        if role == Role.ID_ROLE.value:
+            return self.ids[row]
+        if role == Role.WHOLE_DATA_ROLE.value:
+            return self.materialize(row)
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.exhausted or self.fetch_call is not None or self.changes_call is not None:
+            return
+        self.fetch_call = self.api.run(self.api.get_page, self.path, self.page_size, self.cursor,
+                                       on_result=self.append_page, on_error=self.call_failed)
+
+    def reload(self):
+        # Forgets every row and pages them in again from the first one
+        for call in (self.fetch_call, self.changes_call):
+            if call is not None:
+                call.cancel()
+        self.fetch_call = None
+        self.changes_call = None
+        self.refresh_pending = False
+        self.beginResetModel()
+        self.clear_rows()
+        self.cursor = None
+        self.exhausted = False
+        self.version = None
+        self.endResetModel()
+        self.fetchMore()
+
+    def refresh(self):
+        # Applies what changed since the loaded version row by row, so the selection, sort and filter are kept
+        if self.version is None:
+            self.reload()
+        elif self.fetch_call is not None or self.changes_call is not None:
+            # A page landing after the changes were read could be older than them, so they wait for each other
+            self.refresh_pending = True
+        else:
+            self.changes_call = self.api.run(self.api.get_changes, self.path, self.version,
+                                             on_result=self.apply_changes, on_error=self.call_failed)
+
+    def call_finished(self):
+        if self.refresh_pending:
+            self.refresh_pending = False
+            self.refresh()
+
+    def append_page(self, page: Tuple[List[dict], Optional[int], Optional[int]]):
+        rows, cursor, version = page
+        self.fetch_call = None
+        self.cursor = cursor
+        self.exhausted = cursor is None
+        if self.version is None:
+            self.version = version
+        if len(rows) != 0:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.ids), len(self.ids) + len(rows) - 1)
+            self.insert_values(len(self.ids), [self.row_values(row) for row in rows])
+            self.endInsertRows()
+        self.call_finished()
+
+    def apply_changes(self, changes: dict):
+        self.changes_call = None
+        self.apply_diff(changes["upserted"], changes["deleted"])
+        self.version = changes["version"]
+        self.call_finished()
+
+    def apply_diff(self, upserted: List[dict], deleted: List[int]):
+        removed = runs(sorted(position for position in map(self.find, deleted) if position is not None))
+        # Rows past the last loaded page are left to fetchMore
+        loaded_until = None if self.exhausted else self.cursor
+        new_rows = [row for row in upserted
+                    if self.find(row["id"]) is None and (loaded_until is None or row["id"] <= loaded_until)]
+        changed_rows = [row for row in upserted if self.find(row["id"]) is not None]
+        insertion_points = len({bisect_left(self.ids, row["id"]) for row in new_rows})
+        if len(removed) + insertion_points > LAYOUT_CHANGE_RUNS:
+            self.apply_structure_in_layout_change(removed, new_rows)
+        else:
+            # Adjacent rows are removed and inserted with one signal each, from the end so that positions still hold
+            for first, last in reversed(removed):
+                self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+                self.remove_values(first, last)
+                self.endRemoveRows()
+            for position, rows_values in reversed(self.insertion_groups(new_rows)):
+                self.beginInsertRows(QtCore.QModelIndex(), position, position + len(rows_values) - 1)
+                self.insert_values(position, rows_values)
+                self.endInsertRows()
+        for row in changed_rows:
+            position = self.find(row["id"])
+            if self.replace_values(position, self.row_values(row)):
+                index = self.index(position)
+                self.dataChanged.emit(index, index)
+
+    def apply_structure_in_layout_change(self, removed: List[Tuple[int, int]], new_rows: List[dict]):
+        # A sort/filter proxy remaps every row for each inserted or removed range but filters them all again after a layout
+        # change, so the latter costs less past a few hundred ranges.
+        # Persistent indexes, and so the selection, follow the ids of their rows.
+        self.layoutAboutToBeChanged.emit()
+        persistent_indexes = self.persistentIndexList()
+        persistent_ids = [self.ids[index.row()] for index in persistent_indexes]
+        for first, last in reversed(removed):
+            self.remove_values(first, last)
+        for position, rows_values in reversed(self.insertion_groups(new_rows)):
+            self.insert_values(position, rows_values)
+        positions = map(self.find, persistent_ids)
+        self.changePersistentIndexList(persistent_indexes, [QtCore.QModelIndex() if position is None else self.index(position)
+                                                            for position in positions])
+        self.layoutChanged.emit()
+
+    def insertion_groups(self, new_rows: List[dict]) -> List[Tuple[int, List[tuple]]]:
+        # Values of the new rows grouped by the position they are inserted at, rows of a group being adjacent
+        groups: Dict[int, List[tuple]] = {}
+        for row in sorted(new_rows, key=lambda row: row["id"]):
+            groups.setdefault(bisect_left(self.ids, row["id"]), []).append(self.row_values(row))
+        return sorted(groups.items())
+
+    def call_failed(self, error: Exception):
+        # The next fetchMore or refresh asks again
+        self.fetch_call = None
+        self.changes_call = None
+        self.api.failed.emit(error)
+        self.call_finished()
+
+    def find(self, row_id: int) -> Optional[int]:
+        position = bisect_left(self.ids, row_id)
+        if position < len(self.ids) and self.ids[position] == row_id:
+            return position
+        return None
+
+    def clear_rows(self):
+        for name, column in self.empty_columns().items():
+            setattr(self, name, column)
+
+    def insert_values(self, position: int, rows_values: List[tuple]):
+        for name, values in zip(self.columns, zip(*rows_values)):
+            column = getattr(self, name)
+            column[position:position] = array(column.typecode, values) if isinstance(column, array) else list(values)
+
+    def remove_values(self, first: int, last: int):
+        for name in self.columns:
+            del getattr(self, name)[first:last + 1]
+
+    def replace_values(self, position: int, values: tuple) -> bool:
+        # False when the row did not actually change
+        if tuple(getattr(self, name)[position] for name in self.columns) == values:
+            return False
+        for name, value in zip(self.columns, values):
+            getattr(self, name)[position] = value
+        return True
+
+    def empty_columns(self) -> Dict[str, Any]:
+        return {"ids": array("q")}
+
+    def row_values(self, row: dict) -> tuple:
+        # One value per column, in the order of empty_columns
+        return row["id"],
+
+    def display(self, row: int) -> Any:
+        return self.ids[row]
+
+    def materialize(self, row: int) -> Any:
+        # Values of the row by column name, subclasses build their model object instead
+        return {name: getattr(self, name)[row] for name in self.columns}
+
+
+class PlayerListModel(PagedListModel):
+    def __init__(self, api: AccessApi, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(api, "/players", page_size, parent)
+
+    def empty_columns(self) -> Dict[str, Any]:
+        return {"ids": array("q"), "names": [], "elos": array("q")}
+
+    def row_values(self, row: dict) -> tuple:
+        return row["id"], row["name"], row["elo"]
+
+    def display(self, row: int) -> str:
+        return self.names[row]
+
+    def materialize(self, row: int) -> Player:
+        return Player(id=self.ids[row], name=self.names[row], elo=self.elos[row])
+
+    def player(self, row: int) -> Player:
+        return self.materialize(row)
+
+    def filter_snapshot(self) -> FilterSnapshot:
+        names = list(self.names)
+        return FilterSnapshot(lambda: names, {"id": array("q", self.ids), "elo": array("q", self.elos)})
+
+
+class GameListModel(PagedListModel):
+    # Games have two players but unplayed ones, the others are kept aside in other_player_ids, None for most games.
+    # The name and elo of players are stored once however many games they played.
+    def __init__(self, api: AccessApi, page_size: int = PAGE_SIZE, parent=None):
+        super().__init__(api, "/games", page_size, parent)
+
+    def empty_columns(self) -> Dict[str, Any]:
+        return {"ids": array("q"), "states": array("h"), "winner_ids": array("q"),
+                "first_player_ids": array("q"), "second_player_ids": array("q"), "other_player_ids": []}
+
+    def clear_rows(self):
+        super().clear_rows()
+        self.players: Dict[int, Tuple[str, int]] = {}
+
+    def row_values(self, row: dict) -> tuple:
+        player_ids = []
+        for player in row["players"]:
+            player_ids.append(player["id"])
+            self.players[player["id"]] = (player["name"], player["elo"])
+        player_ids += [NO_PLAYER] * (2 - len(player_ids))
+        winner = row["winner"]
+        return (row["id"], row["state"], NO_PLAYER if winner is None else winner["id"],
+                player_ids[0], player_ids[1], tuple(player_ids[2:]) or None)
+
+    def make_player(self, player_id: int) -> Player:
+        name, elo = self.players[player_id]
+        return Player(id=player_id, name=name, elo=elo)
+
+    def materialize(self, row: int) -> Game:
+        player_ids = [self.first_player_ids[row], self.second_player_ids[row], *(self.other_player_ids[row] or ())]
+        players = [self.make_player(player_id) for player_id in player_ids if player_id != NO_PLAYER]
+        winner = None if self.winner_ids[row] == NO_PLAYER else self.make_player(self.winner_ids[row])
+        return Game(id=self.ids[row], state=GameState(self.states[row]), players=players, winner=winner)
+
+    def filter_snapshot(self) -> FilterSnapshot:
+        # Games are found by id and by the names of their players
+        ids = array("q", self.ids)
+        columns = list(zip(self.first_player_ids, self.second_player_ids, self.other_player_ids))
+        players = dict(self.players)
+
+        def texts() -> List[str]:
+            return [" ".join([str(game_id), *(players[player_id][0] for player_id in (first, second, *(others or ()))
+                                                if player_id != NO_PLAYER)])
+                    for game_id, (first, second, others) in zip(ids, columns)]
+        return FilterSnapshot(texts, {"id": ids, "state": array("q", self.states)}, {"state": GameState})
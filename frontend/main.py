@@ -1,8 +1,9 @@
-from PySide2 import QtCore, QtGui, QtWidgets
-from typing import List, Optional, Any
+from PySide2 import QtCore, QtWidgets
+from typing import List, Any
 from models import Player, Game
 from globals import Role
 from access_api import AccessApi
+from list_models import PlayerListModel, GameListModel
 from filtered_list import FilteredListWidget
 from asset_creation import CreatePlayerDialog, CreateGameDialog
 
@@ -13,13 +14,14 @@ class MainWindow(QtWidgets.QMainWindow):
         super().__init__()
         self.setWindowTitle('API Testing tool')
 
-        self.api = AccessApi(host="http://127.0.0.1:8000")
+        self.api = AccessApi(host="http://127.0.0.1:8000", parent=self)
+        self.api.failed.connect(self.log_message)
 
         self.selected_players_id: List[int] = []
         self.selected_games_id: List[int] = []
 
-        self.player_list = FilteredListWidget()
-        self.game_list = FilteredListWidget()
+        self.player_list = FilteredListWidget(source_model=PlayerListModel(self.api))
+        self.game_list = FilteredListWidget(source_model=GameListModel(self.api))
         self.main_splitter = QtWidgets.QSplitter(parent=self)
         self.log = QtWidgets.QTextBrowser(parent=self)
 
@@ -32,9 +34,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.game_list.selection_changed.connect(self.on_game_selection_changed)
 
         self.create_player_dialog = CreatePlayerDialog(parent=self)
-        self.create_player_dialog.new_player.connect(self.api.create_player)
+        self.create_player_dialog.new_player.connect(self.create_player)
         self.create_game_dialog = CreateGameDialog(players_model=self.player_list.model, parent=self)
-        self.create_game_dialog.new_game.connect(self.api.create_game)
+        self.create_game_dialog.new_game.connect(self.create_game)
 
         self.setCentralWidget(self.create_ui())
         self.populate()
@@ -42,6 +44,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def closeEvent(self, event):
         self.save_settings()
+        self.api.close()
         super().closeEvent(event)
 
     def save_settings(self):
@@ -123,22 +126,44 @@ class MainWindow(QtWidgets.QMainWindow):
     @QtCore.Slot()
     def open_create_player_dialog(self):
         self.create_player_dialog.exec_()
-        self.update_players()
 
     @QtCore.Slot()
     def open_create_game_dialog(self):
         self.create_game_dialog.exec_()
+
+    @QtCore.Slot(dict)
+    def create_player(self, new_player: dict):
+        self.api.run(self.api.create_player, new_player, on_result=self.on_player_created)
+
+    @QtCore.Slot(dict)
+    def create_game(self, new_game: dict):
+        self.api.run(self.api.create_game, new_game, on_result=self.on_game_created)
+
+    def on_player_created(self, player: Player):
+        self.log_message(player)
+        self.update_players()
+
+    def on_game_created(self, game: Game):
+        self.log_message(game)
+        self.update_games()
+
+    def on_players_deleted(self, result: Any):
+        self.log_message(result)
+        self.update_players()
+
+    def on_games_deleted(self, result: Any):
+        self.log_message(result)
         self.update_games()
 
     @QtCore.Slot(list)
-    def on_player_selection_changed(self, selected_players: List[QtGui.QStandardItem]):
+    def on_player_selection_changed(self, selected_players: List[QtCore.QModelIndex]):
         self.selected_players_id = [selected_item.data(Role.ID_ROLE.value) for selected_item in selected_players]
 
     @QtCore.Slot(list)
-    def on_game_selection_changed(self, selected_games: List[QtGui.QStandardItem]):
+    def on_game_selection_changed(self, selected_games: List[QtCore.QModelIndex]):
         self.selected_games_id = [selected_item.data(Role.ID_ROLE.value) for selected_item in selected_games]
 
-    @QtCore.Slot(str)
+    @QtCore.Slot(object)
     def log_message(self, message: Any):
         self.log.append(str(message))
 
@@ -149,11 +174,9 @@ class MainWindow(QtWidgets.QMainWindow):
         try:
             match key_combination:
                 case [QtCore.Qt.Key_Delete, QtCore.Qt.NoModifier, True]:
-                    self.log_message(self.api.delete_players(self.selected_players_id))
-                    self.update_players()
+                    self.api.run(self.api.delete_players, list(self.selected_players_id), on_result=self.on_players_deleted)
                 case [QtCore.Qt.Key_Delete, QtCore.Qt.NoModifier, False]:
-                    self.log_message(self.api.delete_games(self.selected_games_id))
-                    self.update_games()
+                    self.api.run(self.api.delete_games, list(self.selected_games_id), on_result=self.on_games_deleted)
                 case [QtCore.Qt.Key_A, *_]:
                     print("Voila")
                 case _:
@@ -163,23 +186,10 @@ class MainWindow(QtWidgets.QMainWindow):
             self.log_message(e)
 
     def update_players(self):
-        self.player_list.model.clear()
-        for player in self.api.get_players():
-            item = QtGui.QStandardItem()
-            item.setData(player.name, QtCore.Qt.DisplayRole)
-            item.setData(player, Role.WHOLE_DATA_ROLE.value)
-            item.setData(player.id, Role.ID_ROLE.value)
-            self.player_list.model.appendRow([item])
+        self.player_list.model.refresh()
 
     def update_games(self):
-        self.game_list.model.clear()
-        for game in self.api.get_games():
-            game: Game
-            item = QtGui.QStandardItem()
-            item.setData(game.id, QtCore.Qt.DisplayRole)
-            item.setData(game, Role.WHOLE_DATA_ROLE.value)
-            item.setData(game.id, Role.ID_ROLE.value)
-            self.game_list.model.appendRow([item])
+        self.game_list.model.refresh()
 
 
 def main():
@@ -1,6 +1,7 @@
+import orjson
 from globals import GameState
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, TypeAdapter
+from typing import List, Optional, Dict
 
 
 class Player(BaseModel):
@@ -19,4 +20,36 @@ class Game(BaseModel):
     winner: Optional[Player] = None
 
     def __hash__(self):
-        return hash(self.id)
\ No newline at end of file
+        return hash(self.id)
+
+
+PLAYER_LIST = TypeAdapter(List[Player])
+GAME_LIST = TypeAdapter(List[Game])
+
+
+def parse_players(content: bytes, trusted: bool = False) -> List[Player]:
+    # The whole list is decoded and validated in one call, trusted payloads are only decoded
+    if not trusted:
+        return PLAYER_LIST.validate_json(content)
+    return [Player.model_construct(**player) for player in orjson.loads(content)]
+
+
+def parse_games(content: bytes, trusted: bool = False) -> List[Game]:
+    # Games share one Player object per id, built only once when trusted
+    players: Dict[int, Player] = {}
+    if not trusted:
+        games = GAME_LIST.validate_json(content)
+        for game in games:
+            game.players = [players.setdefault(player.id, player) for player in game.players]
+            if game.winner is not None:
+                game.winner = players.setdefault(game.winner.id, game.winner)
+        return games
+
+    def intern(player: dict) -> Player:
+        interned = players.get(player["id"])
+        if interned is None:
+            interned = players[player["id"]] = Player.model_construct(**player)
+        return interned
+    return [Game.model_construct(id=game["id"], state=GameState(game["state"]), players=[intern(player) for player in game["players"]],
+                                 winner=None if game["winner"] is None else intern(game["winner"]))
+            for game in orjson.loads(content)]
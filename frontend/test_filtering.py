@@ -0,0 +1,102 @@
+import unittest
+from array import array
+from typing import List, Optional
+from unittest import TestCase, mock
+from PySide2 import QtCore
+import list_models
+from list_models import PlayerListModel
+from filtering import FilterIndex, FilterQuery, FilterSnapshot, FilterResult, FilterProxyModel
+from globals import GameState, Role
+from test_list_models import ModelChecker, player_row
+
+
+class TestFilterIndex(TestCase):
+    def setUp(self):
+        names = ["Remy", "Éloïse", "Jérémy", "Rémi", "Marc"]
+        elos = array("q", [1200, 900, 1500, 1000, 1200])
+        states = array("q", [GameState.FINISHED, GameState.PLAYING, GameState.FINISHED, GameState.UNPLAYED, GameState.FINISHED])
+        self.index = FilterIndex(FilterSnapshot(lambda: names, {"elo": elos, "state": states}, {"state": GameState}))
+
+    def match(self, text: str, fuzzy: bool = False):
+        return self.index.match(FilterQuery(text, self.index), fuzzy)
+
+    def test_words_ignore_case_and_accents(self):
+        self.assertEqual(self.match("REM"), [0, 2, 3])
+        self.assertEqual(self.match("eloise"), [1])
+        self.assertEqual(self.match("rem my"), [0, 2])
+
+    def test_fields(self):
+        self.assertEqual(self.match("elo:1200"), [0, 4])
+        self.assertEqual(self.match("elo:1000-1500 rem"), [0, 2, 3])
+        self.assertEqual(self.match("elo:<1000"), [1])
+        self.assertEqual(self.match("state:finished elo:>=1200"), [0, 2, 4])
+        # Not a known field or value, searched as a word
+        self.assertEqual(self.match("elo:high"), [])
+
+    def test_fuzzy_ranks_closest_first(self):
+        self.assertEqual(self.match("rmy", fuzzy=True), [0, 2])
+        self.assertEqual(self.match("rem", fuzzy=True), [0, 3, 2])
+
+
+class TestFilterProxyModel(TestCase):
+    def setUp(self):
+        self.source = PlayerListModel(api=None)
+        self.source.append_page(([player_row(player_id) for player_id in range(2, 22, 2)], None, 1))
+        self.proxy = FilterProxyModel()
+        self.proxy.setSourceModel(self.source)
+        self.checker = ModelChecker(self.proxy)
+        self.selection = QtCore.QItemSelectionModel(self.proxy)
+
+    def tearDown(self):
+        self.assertEqual(self.checker.errors, [])
+
+    def filter(self, text: Optional[str]):
+        if text is None:
+            self.proxy.set_result(None)
+            return
+        index = FilterIndex(self.source.filter_snapshot())
+        query = FilterQuery(text, index)
+        self.proxy.set_result(FilterResult(0, query, False, index, index.match(query, False)))
+
+    def shown_ids(self) -> List[int]:
+        return [self.proxy.index(row, 0).data(Role.ID_ROLE.value) for row in range(self.proxy.rowCount())]
+
+    def select(self, *player_ids: int):
+        for row, player_id in enumerate(self.shown_ids()):
+            if player_id in player_ids:
+                self.selection.select(self.proxy.index(row, 0), QtCore.QItemSelectionModel.Select)
+
+    def selected_ids(self) -> List[int]:
+        return sorted(index.data(Role.ID_ROLE.value) for index in self.selection.selectedIndexes())
+
+    def test_unfiltered_follows_source(self):
+        self.source.apply_changes({"version": 2, "upserted": [player_row(1), player_row(9)], "deleted": [4, 20]})
+        self.assertEqual(self.shown_ids(), list(self.source.ids))
+        self.assertIn("inserted", self.checker.signals)
+        self.assertIn("removed", self.checker.signals)
+
+    def test_filtered_follows_source(self):
+        self.filter("player1")
+        self.assertEqual(self.shown_ids(), [10, 12, 14, 16, 18])
+        self.select(14, 18)
+        # New rows stay hidden until the next result, removed ones go away
+        self.source.apply_changes({"version": 2, "upserted": [player_row(1), player_row(11), player_row(13)], "deleted": [4, 12]})
+        self.assertEqual(self.shown_ids(), [10, 14, 16, 18])
+        with mock.patch.object(list_models, "LAYOUT_CHANGE_RUNS", 0):
+            self.source.apply_changes({"version": 3, "upserted": [player_row(3), player_row(15)], "deleted": [16, 18]})
+        self.assertEqual(self.shown_ids(), [10, 14])
+        self.assertEqual(self.selected_ids(), [14])
+
+    def test_results_keep_selection(self):
+        self.select(4, 10, 16)
+        self.filter("player1")
+        self.assertEqual(self.selected_ids(), [10, 16])
+        self.filter("player16")
+        self.assertEqual(self.selected_ids(), [16])
+        self.filter(None)
+        self.assertEqual(self.shown_ids(), list(self.source.ids))
+        self.assertEqual(self.selected_ids(), [16])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from unittest import TestCase, mock
+from typing import List, Optional
+from PySide2 import QtCore
+import list_models
+from list_models import PlayerListModel, runs
+from globals import Role
+
+app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+class ModelChecker:
+    # Checks the signals of a list model against its rows, like QAbstractItemModelTester which PySide2 does not bind:
+    # row counts change by the announced ranges, the rows around a range stay in place and every row answers its id
+    def __init__(self, model: QtCore.QAbstractItemModel):
+        self.model = model
+        self.errors: List[str] = []
+        self.signals: List[str] = []
+        self.expected: Optional[tuple] = None
+        model.rowsAboutToBeInserted.connect(lambda parent, first, last: self.about_to_change(first, last, last - first + 1))
+        model.rowsInserted.connect(lambda parent, first, last: self.changed("inserted", first, last))
+        model.rowsAboutToBeRemoved.connect(lambda parent, first, last: self.about_to_change(first, last, first - last - 1))
+        model.rowsRemoved.connect(lambda parent, first, last: self.changed("removed", first, last))
+        model.dataChanged.connect(self.data_changed)
+        model.layoutChanged.connect(lambda *args: self.check_rows("layout"))
+        model.modelReset.connect(lambda: self.check_rows("reset"))
+
+    def row_id(self, row: int):
+        return self.model.index(row, 0).data(Role.ID_ROLE.value) if 0 <= row < self.model.rowCount() else None
+
+    def about_to_change(self, first: int, last: int, delta: int):
+        # Ids of the rows before and after the range, the one after moves by delta
+        after = last + 1 if delta < 0 else first
+        self.expected = (self.model.rowCount() + delta, self.row_id(first - 1), self.row_id(after), delta)
+
+    def changed(self, kind: str, first: int, last: int):
+        count, before_id, after_id, delta = self.expected
+        if self.model.rowCount() != count:
+            self.errors.append(f"{kind} {first}-{last}: {self.model.rowCount()} rows instead of {count}")
+        after = first if delta < 0 else last + 1
+        if self.row_id(first - 1) != before_id or self.row_id(after) != after_id:
+            self.errors.append(f"{kind} {first}-{last}: the rows around the range moved")
+        self.check_rows(kind)
+
+    def data_changed(self, top_left: QtCore.QModelIndex, bottom_right: QtCore.QModelIndex, roles=()):
+        if not top_left.isValid() or not bottom_right.isValid() or top_left.row() > bottom_right.row():
+            self.errors.append(f"changed {top_left.row()}-{bottom_right.row()}: invalid range")
+        self.check_rows("changed")
+
+    def check_rows(self, kind: str):
+        self.signals.append(kind)
+        if self.model.index(self.model.rowCount(), 0).isValid():
+            self.errors.append(f"{kind}: the row past the last one is valid")
+        if any(self.row_id(row) is None for row in range(self.model.rowCount())):
+            self.errors.append(f"{kind}: a row has no id")
+
+
+def player_row(player_id: int, name: str = None) -> dict:
+    return {"id": player_id, "name": name or f"player{player_id}", "elo": player_id * 10}
+
+
+class TestRuns(TestCase):
+    def test_runs(self):
+        self.assertEqual(runs([]), [])
+        self.assertEqual(runs([1, 2, 3, 5, 7, 8]), [(1, 3), (5, 5), (7, 8)])
+
+
+class TestPagedListModel(TestCase):
+    def setUp(self):
+        self.model = PlayerListModel(api=None)
+        self.model.append_page(([player_row(player_id) for player_id in range(2, 22, 2)], None, 1))
+        self.checker = ModelChecker(self.model)
+        self.selection = QtCore.QItemSelectionModel(self.model)
+        for player_id in (8, 10, 16):
+            self.selection.select(self.model.index(self.model.find(player_id)), QtCore.QItemSelectionModel.Select)
+
+    def tearDown(self):
+        self.assertEqual(self.checker.errors, [])
+
+    def selected_ids(self) -> List[int]:
+        return sorted(self.model.ids[index.row()] for index in self.selection.selectedIndexes())
+
+    def test_upserted_and_deleted_rows(self):
+        upserted = [player_row(4, "renamed"), player_row(5), player_row(7), player_row(11), player_row(30), player_row(6)]
+        self.model.apply_changes({"version": 2, "upserted": upserted, "deleted": [8, 10, 18, 99]})
+        self.assertEqual(list(self.model.ids), [2, 4, 5, 6, 7, 11, 12, 14, 16, 20, 30])
+        self.assertEqual(self.model.display(1), "renamed")
+        self.assertEqual(self.model.version, 2)
+        # Removed and inserted in one signal per run of adjacent rows, the unchanged player 6 is not signalled
+        self.assertEqual(self.checker.signals, ["removed", "removed", "inserted", "inserted", "inserted", "changed"])
+        self.assertEqual(self.selected_ids(), [16])
+
+    def test_rows_past_the_cursor_are_left_to_fetch(self):
+        self.model.exhausted, self.model.cursor = False, 20
+        self.model.apply_changes({"version": 2, "upserted": [player_row(3), player_row(21)], "deleted": []})
+        self.assertEqual(list(self.model.ids), [2, 3, 4, 6, 8, 10, 12, 14, 16, 18, 20])
+
+    def test_many_runs_change_the_layout_at_once(self):
+        with mock.patch.object(list_models, "LAYOUT_CHANGE_RUNS", 2):
+            self.model.apply_changes({"version": 2, "upserted": [player_row(1), player_row(9), player_row(17)],
+                                      "deleted": [4, 10, 20]})
+        self.assertEqual(list(self.model.ids), [1, 2, 6, 8, 9, 12, 14, 16, 17, 18])
+        self.assertEqual(self.checker.signals, ["layout"])
+        self.assertEqual(self.selected_ids(), [8, 16])
+        self.assertEqual(self.model.player(self.model.find(9)).name, "player9")
+
+
+if __name__ == '__main__':
+    unittest.main()
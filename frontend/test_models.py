@@ -0,0 +1,48 @@
+import unittest
+from unittest import TestCase
+import orjson
+from pydantic import ValidationError
+from globals import GameState
+from models import Player, parse_players, parse_games
+
+
+def player_dict(player_id: int) -> dict:
+    return {"id": player_id, "name": f"player{player_id}", "elo": player_id * 10}
+
+
+GAMES = orjson.dumps([
+    {"id": 1, "state": GameState.FINISHED.value, "players": [player_dict(1), player_dict(2)], "winner": player_dict(2)},
+    {"id": 2, "state": GameState.PLAYING.value, "players": [player_dict(2), player_dict(3)], "winner": None},
+])
+
+
+class TestParsing(TestCase):
+    def test_players(self):
+        content = orjson.dumps([player_dict(1), player_dict(2)])
+        for trusted in (False, True):
+            players = parse_players(content, trusted)
+            self.assertEqual([(player.id, player.name, player.elo) for player in players], [(1, "player1", 10), (2, "player2", 20)])
+            self.assertTrue(all(isinstance(player, Player) for player in players))
+
+    def test_games_share_players(self):
+        for trusted in (False, True):
+            first, second = parse_games(GAMES, trusted)
+            self.assertEqual((first.state, second.state), (GameState.FINISHED, GameState.PLAYING))
+            self.assertIs(first.winner, first.players[1])
+            self.assertIs(first.players[1], second.players[0])
+            self.assertIsNone(second.winner)
+        self.assertEqual(parse_games(GAMES, trusted=True), parse_games(GAMES))
+
+    def test_untrusted_content_is_validated(self):
+        with self.assertRaises(ValidationError):
+            parse_players(orjson.dumps([{"id": "one", "name": "player1"}]))
+        with self.assertRaises(ValidationError):
+            parse_players(orjson.dumps([{"id": 1}]))
+        with self.assertRaises(ValidationError):
+            parse_games(orjson.dumps([{"id": 1, "state": 42, "players": [], "winner": None}]))
+        with self.assertRaises(ValidationError):
+            parse_games(b"not json")
+
+
+if __name__ == '__main__':
+    unittest.main()